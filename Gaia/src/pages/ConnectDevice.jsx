@@ -5,19 +5,16 @@ export default function ConnectDevice({ onNavigate }) {
   const [pairingCode, setPairingCode] = useState('');
   const [isConnected, setIsConnected] = useState(false);
   const [connectedDevice, setConnectedDevice] = useState(null);
+  // Bumped on disconnect to start waiting on a new code
+  const [session, setSession] = useState(0);
 
   useEffect(() => {
-    // Check if we already have a pairing code stored
+    // Reuse the stored code while the backend still knows it
     let code = localStorage.getItem('gaia:pairingCode');
-    
-    // If not, generate a new one
-    if (!code) {
-      code = Math.random().toString(36).substring(2, 8).toUpperCase();
-      localStorage.setItem('gaia:pairingCode', code);
+    if (code) {
+      setPairingCode(code);
     }
     
-    setPairingCode(code);
-    
     // Check if already connected locally
     const userId = localStorage.getItem('gaia:connectedUserId');
     if (userId) {
@@ -25,38 +22,82 @@ export default function ConnectDevice({ onNavigate }) {
       setConnectedDevice({ userId, deviceType: 'Android' });
     }
     
-    // Poll backend to check if mobile connected
-    const checkPairing = async () => {
-      try {
-        const response = await fetch(`http://localhost:5000/api/check-pairing?pairingCode=${code}`);
-        const data = await response.json();
-        
-        if (data.success && data.connected && data.userId) {
-          // Mobile has connected!
-          localStorage.setItem('gaia:connectedUserId', data.userId);
-          setIsConnected(true);
-          setConnectedDevice({ userId: data.userId, deviceType: 'Android' });
+    // Long-poll the backend: the request returns as soon as the phone
+    // confirms the code (or after ~25s with connected=false, then we ask again)
+    const controller = new AbortController();
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+    // Codes are issued by the backend, which only lets dashboards wait on its own codes
+    const requestPairingCode = async () => {
+      const response = await fetch('http://localhost:5000/api/pairing-code', {
+        method: 'POST',
+        signal: controller.signal
+      });
+      if (!response.ok) {
+        throw new Error(`Pairing code request failed (${response.status})`);
+      }
+      const data = await response.json();
+      localStorage.setItem('gaia:pairingCode', data.pairingCode);
+      setPairingCode(data.pairingCode);
+      return data.pairingCode;
+    };
+
+    const waitForPairing = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          if (!code) {
+            code = await requestPairingCode();
+          }
+
+          const response = await fetch(
+            `http://localhost:5000/api/wait-pairing?pairingCode=${code}&timeout=25`,
+            { signal: controller.signal }
+          );
+
+          if (response.status === 404) {
+            // Expired (or issued by another server): get a new code
+            localStorage.removeItem('gaia:pairingCode');
+            code = null;
+            continue;
+          }
+
+          if (response.status === 429) {
+            const retryAfter = Number(response.headers.get('Retry-After')) || 2;
+            await sleep(retryAfter * 1000);
+            continue;
+          }
+
+          const data = await response.json();
+
+          if (data.success && data.connected && data.userId) {
+            // Mobile has connected!
+            localStorage.setItem('gaia:connectedUserId', data.userId);
+            setIsConnected(true);
+            setConnectedDevice({ userId: data.userId, deviceType: 'Android' });
+            return;
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.log('Waiting for mobile connection...');
+          await sleep(2000);
         }
-      } catch (error) {
-        console.log('Waiting for mobile connection...');
       }
     };
-    
-    // Poll every 2 seconds
-    const interval = setInterval(checkPairing, 2000);
-    
-    return () => clearInterval(interval);
-  }, []);
+
+    waitForPairing();
+
+    return () => controller.abort();
+  }, [session]);
 
   const handleDisconnect = () => {
     localStorage.removeItem('gaia:connectedUserId');
     setIsConnected(false);
     setConnectedDevice(null);
     
-    // Generate new pairing code
-    const code = Math.random().toString(36).substring(2, 8).toUpperCase();
-    setPairingCode(code);
-    localStorage.setItem('gaia:pairingCode', code);
+    // Wait on a new pairing code
+    localStorage.removeItem('gaia:pairingCode');
+    setPairingCode('');
+    setSession((current) => current + 1);
   };
 
   return (
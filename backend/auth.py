@@ -0,0 +1,332 @@
+"""
+Authentication for GAIA Backend
+HS256 JWT access tokens (stdlib hmac, no extra dependency), a bounded
+cache of verified claims so repeat requests skip the signature and JSON
+work, and password hashing with a tunable KDF (scrypt, or PBKDF2-SHA256
+where OpenSSL lacks scrypt) run on a small worker pool.
+
+The request hook that uses these lives in server.py.
+
+Create a user (or print a hash for an existing row):
+    python auth.py create-user user@example.com
+    python auth.py hash
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from resilience import ConcurrencyLimiter
+from ttl_cache import TTLCache
+
+
+class InvalidToken(Exception):
+    """Malformed, wrongly signed or expired token"""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+_JWT_HEADER = _b64encode(json.dumps({'alg': 'HS256', 'typ': 'JWT'}, separators=(',', ':')).encode())
+
+
+# ==================== TOKENS ====================
+
+class TokenSigner:
+    """
+    Issues and verifies HS256 JWTs
+
+    Claims: sub (user id), iat, exp, iss. Only HS256 is accepted, whatever
+    the token header says, so a token cannot downgrade itself to "none".
+    """
+
+    def __init__(self, secret: bytes, ttl: int = 86400, issuer: str = 'gaia'):
+        if len(secret) < 32:
+            raise ValueError("token secret must be at least 32 bytes")
+        self._secret = secret
+        self.ttl = ttl
+        self.issuer = issuer
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        return hmac.new(self._secret, signing_input, hashlib.sha256).digest()
+
+    def issue(self, user_id: str, **claims) -> str:
+        now = int(time.time())
+        payload = {'sub': user_id, 'iat': now, 'exp': now + self.ttl, 'iss': self.issuer, **claims}
+        signing_input = f"{_JWT_HEADER}.{_b64encode(json.dumps(payload, separators=(',', ':')).encode())}"
+        return f"{signing_input}.{_b64encode(self._sign(signing_input.encode('ascii')))}"
+
+    def verify(self, token: str) -> Dict:
+        """
+        Claims of a valid token
+
+        Raises:
+            InvalidToken: if the token is malformed, its signature does not
+                match, it is expired or it was issued by someone else
+        """
+        try:
+            signing_input, _, signature = token.rpartition('.')
+            header, _, payload = signing_input.partition('.')
+            expected = self._sign(signing_input.encode('ascii'))
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise InvalidToken("bad signature")
+            if json.loads(_b64decode(header)).get('alg') != 'HS256':
+                raise InvalidToken("unsupported algorithm")
+            claims = json.loads(_b64decode(payload))
+        except InvalidToken:
+            raise
+        except (ValueError, UnicodeError) as e:
+            raise InvalidToken(f"malformed token: {e}") from e
+
+        if not isinstance(claims, dict) or not isinstance(claims.get('sub'), str):
+            raise InvalidToken("missing subject")
+        if claims.get('iss') != self.issuer:
+            raise InvalidToken("wrong issuer")
+        if not isinstance(claims.get('exp'), int) or claims['exp'] <= time.time():
+            raise InvalidToken("expired")
+        return claims
+
+
+class TokenVerifier:
+    """
+    TokenSigner.verify behind an LRU of verified claims
+
+    Entries are keyed by the SHA-256 digest of the token (tokens are never
+    stored) and live until the token expires or `cache_ttl` seconds,
+    whichever comes first. Failed verifications are not cached.
+    """
+
+    def __init__(self, signer: TokenSigner, maxsize: int = 10000, cache_ttl: float = 300.0):
+        self.signer = signer
+        self.cache = TTLCache(maxsize=maxsize, ttl=cache_ttl)
+
+    def verify(self, token: str) -> Dict:
+        key = hashlib.sha256(token.encode('utf-8', 'surrogatepass')).digest()
+        claims = self.cache.get(key)
+        if claims is not None:
+            if claims['exp'] > time.time():
+                return dict(claims)
+            self.cache.invalidate(key)
+
+        claims = self.signer.verify(token)
+        self.cache.set(key, claims, ttl=min(self.cache.ttl, claims['exp'] - time.time()))
+        return dict(claims)
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+def load_token_secret() -> bytes:
+    """
+    GAIA_JWT_SECRET, or a random per-process secret
+
+    Without GAIA_JWT_SECRET, tokens are only valid in the process that
+    issued them (and not across restarts or gunicorn workers).
+    """
+    secret = os.getenv('GAIA_JWT_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    return secrets.token_bytes(32)
+
+
+# ==================== PASSWORDS ====================
+
+# $2b$<cost>$<22 chars salt><31 chars hash>: bcrypt panics (not ValueError) on some truncated hashes
+_BCRYPT_HASH = re.compile(r'\$2[abxy]?\$\d\d\$[./A-Za-z0-9]{53}')
+
+
+def _scrypt_available() -> bool:
+    try:
+        hashlib.scrypt(b'', salt=b'', n=2, r=1, p=1)
+        return True
+    except (AttributeError, ValueError):
+        return False
+
+
+class PasswordHasher:
+    """
+    Password hashing with a memory-hard KDF on a bounded worker pool
+
+    Hashes are self-describing strings, so parameters can be raised later
+    without breaking stored hashes:
+
+        scrypt$<n>$<r>$<p>$<salt>$<hash>
+        pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+    scrypt is used when OpenSSL provides it, PBKDF2-SHA256 otherwise (or
+    with kdf='pbkdf2'). bcrypt hashes ($2b$...) from the sample data are
+    verified with the `bcrypt` package; without it they never match, after
+    the same dummy check as an unknown user.
+
+    KDF calls run on `workers` threads (hashlib releases the GIL), and at
+    most `max_pending` may be running or queued; beyond that callers wait
+    `queue_timeout` seconds, then get resilience.Overloaded, so a login
+    burst cannot occupy every request thread or exhaust memory
+    (scrypt uses 128 * n * r bytes per call).
+    """
+
+    def __init__(self,
+                 kdf: Optional[str] = None,
+                 scrypt_n: int = 2 ** 14,
+                 scrypt_r: int = 8,
+                 scrypt_p: int = 1,
+                 pbkdf2_iterations: int = 600000,
+                 workers: int = 2,
+                 max_pending: int = 8,
+                 queue_timeout: float = 2.0):
+        if kdf is None:
+            kdf = 'scrypt' if _scrypt_available() else 'pbkdf2'
+        if kdf not in ('scrypt', 'pbkdf2'):
+            raise ValueError(f"Unknown KDF {kdf!r} (expected 'scrypt' or 'pbkdf2')")
+        self.kdf = kdf
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gaia-kdf')
+        self._slots = ConcurrencyLimiter(max_pending)
+        self._dummy: Optional[str] = None
+
+    # ---- KDF (pool threads) ----
+
+    def _scrypt(self, password: bytes, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * n * r * p + 1024 * 1024, dklen=32)
+
+    def _hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        secret = password.encode('utf-8')
+        if self.kdf == 'scrypt':
+            n, r, p = self.scrypt_n, self.scrypt_r, self.scrypt_p
+            digest = self._scrypt(secret, salt, n, r, p)
+            return f"scrypt${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+        digest = hashlib.pbkdf2_hmac('sha256', secret, salt, self.pbkdf2_iterations)
+        return f"pbkdf2_sha256${self.pbkdf2_iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+    def _check_dummy(self, password: str) -> bool:
+        """Cost of a real check, for users without a usable hash; always False"""
+        if self._dummy is None:
+            self._dummy = self._hash(secrets.token_urlsafe(16))
+        self._verify(password, self._dummy)
+        return False
+
+    def _verify(self, password: str, encoded: str) -> bool:
+        secret = password.encode('utf-8')
+        if encoded.startswith('$2'):
+            try:
+                import bcrypt
+            except ImportError:
+                # Do not answer faster than for a real hash (timing oracle)
+                return self._check_dummy(password)
+            # Malformed or truncated hashes fail like unknown schemes
+            if not _BCRYPT_HASH.fullmatch(encoded):
+                return False
+            try:
+                return bcrypt.checkpw(secret, encoded.encode('ascii'))
+            except ValueError:
+                return False
+
+        scheme, _, rest = encoded.partition('$')
+        try:
+            if scheme == 'scrypt':
+                n, r, p, salt, expected = rest.split('$')
+                digest = self._scrypt(secret, _b64decode(salt), int(n), int(r), int(p))
+            elif scheme == 'pbkdf2_sha256':
+                iterations, salt, expected = rest.split('$')
+                digest = hashlib.pbkdf2_hmac('sha256', secret, _b64decode(salt), int(iterations))
+            else:
+                return False
+        except ValueError:
+            return False
+        return hmac.compare_digest(digest, _b64decode(expected))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        """True if the hash was made with other parameters than the current ones"""
+        if self.kdf == 'scrypt':
+            return not encoded.startswith(f"scrypt${self.scrypt_n}${self.scrypt_r}${self.scrypt_p}$")
+        return not encoded.startswith(f"pbkdf2_sha256${self.pbkdf2_iterations}$")
+
+    # ---- callers (request threads) ----
+
+    def _run(self, fn, *args):
+        with self._slots.slot(self.queue_timeout):
+            return self._executor.submit(fn, *args).result()
+
+    def hash(self, password: str) -> str:
+        """
+        Raises:
+            Overloaded: if the KDF pool stayed full for queue_timeout seconds
+        """
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, encoded: Optional[str]) -> bool:
+        """
+        Constant-time check of password against a stored hash
+
+        Without a stored hash (unknown user) a dummy hash is checked, so
+        the response time does not reveal whether the account exists.
+
+        Raises:
+            Overloaded: if the KDF pool stayed full for queue_timeout seconds
+        """
+        if not encoded:
+            return self._run(self._check_dummy, password)
+        return self._run(self._verify, password, encoded)
+
+    def stats(self) -> Dict:
+        return {'kdf': self.kdf, **self._slots.stats()}
+
+
+def create_password_hasher() -> PasswordHasher:
+    """PasswordHasher tuned from GAIA_KDF_* environment variables"""
+    return PasswordHasher(
+        kdf=os.getenv('GAIA_KDF') or None,
+        scrypt_n=int(os.getenv('GAIA_KDF_SCRYPT_N', str(2 ** 14))),
+        pbkdf2_iterations=int(os.getenv('GAIA_KDF_PBKDF2_ITERATIONS', '600000')),
+        workers=int(os.getenv('GAIA_KDF_WORKERS', '2')),
+        max_pending=int(os.getenv('GAIA_KDF_MAX_PENDING', '8')),
+        queue_timeout=float(os.getenv('GAIA_KDF_QUEUE_TIMEOUT', '2.0'))
+    )
+
+
+def _read_password() -> str:
+    password = getpass.getpass('Password: ')
+    if password != getpass.getpass('Password (again): '):
+        raise SystemExit("Passwords do not match")
+    if len(password) < 6:
+        raise SystemExit("Password too short")
+    return password
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GAIA password hashes')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('hash', help='print the hash of a password (users.password_hash)')
+    create = commands.add_parser('create-user', help='add a user to the GAIA_STORAGE backend')
+    create.add_argument('email')
+    args = parser.parse_args()
+
+    encoded = create_password_hasher().hash(_read_password())
+    if args.command == 'hash':
+        print(encoded)
+    else:
+        import supabase_client as db
+        user = db.create_user(args.email.strip(), encoded, {})
+        if not user:
+            raise SystemExit(f"Could not create {args.email} (already registered, or storage error)")
+        print(f"Created user {user['id']}")
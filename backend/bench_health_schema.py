@@ -0,0 +1,204 @@
+"""
+Health schema converter benchmark for GAIA Backend
+Checks that the schema-compiled converters (health_schema) produce exactly
+the same output as the hand-written versions they replaced, then times both.
+
+Usage:
+    python bench_health_schema.py [--iterations 100000]
+"""
+
+import argparse
+import random
+import time
+
+import health_schema
+
+FLAT_SAMPLE = {
+    'userId': 'user_4821',
+    'timestamp': 1729339200000,
+    'heartRate': 72,
+    'bloodPressureSystolic': 121,
+    'bloodPressureDiastolic': 79,
+    'bodyTemperature': 36.7,
+    'steps': 8543,
+    'sleepDuration': 7.25,
+    'oxygenSaturation': 98,
+    'stressLevel': 34,
+    'calories': 2140.5,
+    'distance': 6.42,
+    'weight': 72.4,
+    'height': 1.78
+}
+
+
+# ==================== REFERENCE IMPLEMENTATIONS ====================
+# Verbatim copies of the converters before the schema was introduced
+
+def legacy_flat_to_nested(data, timestamp):
+    health_data = {
+        'heartRate': {'value': data.get('heartRate'), 'unit': 'bpm', 'timestamp': timestamp} if data.get('heartRate') else None,
+        'bloodPressure': {
+            'systolic': data.get('bloodPressureSystolic'),
+            'diastolic': data.get('bloodPressureDiastolic'),
+            'unit': 'mmHg',
+            'timestamp': timestamp
+        } if data.get('bloodPressureSystolic') else None,
+        'temperature': {'value': data.get('bodyTemperature'), 'unit': 'celsius', 'timestamp': timestamp} if data.get('bodyTemperature') else None,
+        'steps': {'value': data.get('steps'), 'timestamp': timestamp} if data.get('steps') else None,
+        'sleep': {'duration': data.get('sleepDuration'), 'unit': 'hours', 'timestamp': timestamp} if data.get('sleepDuration') else None,
+        'oxygenSaturation': {'value': data.get('oxygenSaturation'), 'unit': 'percent', 'timestamp': timestamp} if data.get('oxygenSaturation') else None,
+        'stressLevel': {'value': data.get('stressLevel'), 'unit': 'percent', 'timestamp': timestamp} if data.get('stressLevel') else None,
+        'calories': {'value': data.get('calories'), 'unit': 'kcal', 'timestamp': timestamp} if data.get('calories') else None,
+        'distance': {'value': data.get('distance'), 'unit': 'km', 'timestamp': timestamp} if data.get('distance') else None,
+        'weight': {'value': data.get('weight'), 'unit': 'kg', 'timestamp': timestamp} if data.get('weight') else None,
+        'height': {'value': data.get('height'), 'unit': 'meters', 'timestamp': timestamp} if data.get('height') else None
+    }
+    return {k: v for k, v in health_data.items() if v is not None}
+
+
+def legacy_nested_to_db_row(health_data):
+    record = {
+        'heart_rate': health_data.get('heartRate', {}).get('value'),
+        'blood_pressure_systolic': health_data.get('bloodPressure', {}).get('systolic'),
+        'blood_pressure_diastolic': health_data.get('bloodPressure', {}).get('diastolic'),
+        'temperature': health_data.get('temperature', {}).get('value'),
+        'steps': health_data.get('steps', {}).get('value'),
+        'sleep_duration': health_data.get('sleep', {}).get('duration'),
+        'sleep_quality': health_data.get('sleep', {}).get('quality'),
+        'sleep_deep': health_data.get('sleep', {}).get('stages', {}).get('deep'),
+        'sleep_light': health_data.get('sleep', {}).get('stages', {}).get('light'),
+        'sleep_rem': health_data.get('sleep', {}).get('stages', {}).get('rem'),
+        'oxygen_saturation': health_data.get('oxygenSaturation', {}).get('value'),
+        'stress_level': health_data.get('stressLevel', {}).get('value'),
+        'fatigue': health_data.get('fatigue', {}).get('value'),
+        'respiratory_rate': health_data.get('respiratoryRate', {}).get('value'),
+        'ambient_noise': health_data.get('ambiance', {}).get('value'),
+    }
+    return {k: v for k, v in record.items() if v is not None}
+
+
+def legacy_nested_to_latest(health_data):
+    return {
+        'heartRate': health_data.get('heartRate', {}).get('value', 72),
+        'bloodPressureSystolic': health_data.get('bloodPressure', {}).get('systolic', 120),
+        'bloodPressureDiastolic': health_data.get('bloodPressure', {}).get('diastolic', 80),
+        'bodyTemperature': health_data.get('temperature', {}).get('value', 36.5),
+        'stressLevel': health_data.get('stressLevel', {}).get('value', 30),
+        'steps': health_data.get('steps', {}).get('value', 0),
+        'sleepDuration': health_data.get('sleep', {}).get('duration', 0),
+        'oxygenSaturation': health_data.get('oxygenSaturation', {}).get('value', 98),
+        'calories': health_data.get('calories', {}).get('value', 0),
+        'distance': health_data.get('distance', {}).get('value', 0),
+        'weight': health_data.get('weight', {}).get('value'),
+        'height': health_data.get('height', {}).get('value'),
+    }
+
+
+def legacy_db_row_to_frontend(db_record):
+    return {
+        'heartBeat': db_record.get('heart_rate', 72),
+        'tension': db_record.get('blood_pressure_systolic', 120),
+        'temperature': db_record.get('temperature', 36.5),
+        'fatigue': db_record.get('fatigue', 30),
+        'steps': db_record.get('steps', 0),
+        'sleep': {
+            'duration': db_record.get('sleep_duration', 0),
+            'quality': db_record.get('sleep_quality', 'unknown'),
+            'stages': {
+                'deep': db_record.get('sleep_deep', 0),
+                'light': db_record.get('sleep_light', 0),
+                'rem': db_record.get('sleep_rem', 0)
+            }
+        } if db_record.get('sleep_duration') else None,
+        'oxygenSaturation': db_record.get('oxygen_saturation', 98),
+        'stressLevel': db_record.get('stress_level', 30),
+        'respiratoryRate': db_record.get('respiratory_rate', 16),
+        'ambiance': db_record.get('ambient_noise', 45),
+        'lastUpdated': db_record.get('timestamp')
+    }
+
+
+# ==================== SAMPLES ====================
+
+def _random_samples(count, seed=7):
+    """Flat samples with random subsets of metrics (including zeros)"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        sample = {'userId': 'user_4821', 'timestamp': 1729339200000 + rng.randint(0, 10 ** 6)}
+        for key, value in FLAT_SAMPLE.items():
+            if key not in sample and rng.random() < 0.7:
+                sample[key] = 0 if rng.random() < 0.1 else value
+        samples.append(sample)
+    return samples
+
+
+def _enrich(health_data, rng):
+    """Add the nested-only metrics (sleep stages, fatigue...) the mobile app can send"""
+    health_data = dict(health_data)
+    if rng.random() < 0.5:
+        sleep = dict(health_data.get('sleep', {'duration': 6.5}))
+        sleep['quality'] = 'good'
+        sleep['stages'] = {'deep': 1.2, 'light': 3.9, 'rem': 1.4}
+        health_data['sleep'] = sleep
+    if rng.random() < 0.5:
+        health_data['fatigue'] = {'value': 41}
+        health_data['respiratoryRate'] = {'value': 15}
+        health_data['ambiance'] = {'value': 52}
+    return health_data
+
+
+def check_identical(samples):
+    rng = random.Random(11)
+    for sample in samples:
+        nested = health_schema.flat_to_nested(sample, sample['timestamp'])
+        assert nested == legacy_flat_to_nested(sample, sample['timestamp']), sample
+
+        nested = _enrich(nested, rng)
+        row = health_schema.nested_to_db_row(nested)
+        assert row == legacy_nested_to_db_row(nested), nested
+        assert health_schema.nested_to_latest(nested) == legacy_nested_to_latest(nested), nested
+
+        row['timestamp'] = sample['timestamp']
+        assert health_schema.db_row_to_frontend(row) == legacy_db_row_to_frontend(row), row
+    print(f"Outputs identical on {len(samples)} samples")
+
+
+def _time(label, convert, inputs, iterations):
+    rounds = max(1, iterations // len(inputs))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            convert(item)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (rounds * len(inputs)) * 1e6
+    print(f"  {label:<24} {per_call:6.2f} µs/call")
+    return per_call
+
+
+def run(iterations):
+    samples = _random_samples(1000)
+    check_identical(samples)
+
+    rng = random.Random(3)
+    nested = [_enrich(legacy_flat_to_nested(s, s['timestamp']), rng) for s in samples]
+    rows = [dict(legacy_nested_to_db_row(n), timestamp=1729339200000) for n in nested]
+
+    pairs = [
+        ('flat -> nested', lambda s: legacy_flat_to_nested(s, 0), lambda s: health_schema.flat_to_nested(s, 0), samples),
+        ('nested -> db row', legacy_nested_to_db_row, health_schema.nested_to_db_row, nested),
+        ('nested -> latest', legacy_nested_to_latest, health_schema.nested_to_latest, nested),
+        ('db row -> frontend', legacy_db_row_to_frontend, health_schema.db_row_to_frontend, rows),
+    ]
+    for label, legacy, compiled, inputs in pairs:
+        print(label)
+        before = _time('hand-written', legacy, inputs, iterations)
+        after = _time('schema-compiled', compiled, inputs, iterations)
+        print(f"  speedup                  {before / after:6.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Health schema converter benchmark')
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+    run(args.iterations)
@@ -0,0 +1,50 @@
+"""
+Import-time benchmark for GAIA Backend
+Measures how long a fresh interpreter takes to import each backend module
+(what every process start, test run and worker fork pays).
+
+Usage:
+    python bench_import_time.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ['supabase_client', 'recommandations', 'server']
+
+
+def time_import(module: str, runs: int) -> list:
+    """Wall-clock seconds for `python -c "import <module>"`, one sample per run"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', f'import {module}'],
+            cwd=backend_dir,
+            capture_output=True,
+            text=True
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+        samples.append(elapsed)
+    return samples
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark backend import time')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_import('os', args.runs))
+    print(f"{'module':<20}{'median ms':>12}{'min ms':>10}{'over bare python':>20}")
+    for module in MODULES:
+        samples = time_import(module, args.runs)
+        median = statistics.median(samples)
+        print(f"{module:<20}{median * 1000:>12.1f}{min(samples) * 1000:>10.1f}"
+              f"{(median - baseline) * 1000:>17.1f} ms")
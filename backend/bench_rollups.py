@@ -0,0 +1,112 @@
+"""
+Rollup benchmark for GAIA Backend
+Loads a synthetic 30-day history (one sample per minute) into SQLite and
+compares 7-day / 30-day stats and chart queries on raw rows against the
+health_rollups buckets (health_rollups.SQLiteRollupStore).
+
+Usage:
+    python bench_rollups.py [--days 30] [--interval 60]
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+
+from health_rollups import SQLiteRollupStore, cover_range
+
+DAY_MS = 24 * 3600 * 1000
+USER_ID = 'bench_user'
+METRICS = ('heart_rate', 'blood_pressure_systolic', 'oxygen_saturation', 'stress_level', 'steps')
+
+
+def synthetic_rows(days, interval_s, seed=5):
+    rng = random.Random(seed)
+    end = int(time.time() * 1000)
+    start = end - days * DAY_MS
+    rows = []
+    for timestamp in range(start, end, interval_s * 1000):
+        rows.append({
+            'user_id': USER_ID,
+            'timestamp': timestamp,
+            'heart_rate': rng.randint(55, 110),
+            'blood_pressure_systolic': rng.randint(105, 140),
+            'oxygen_saturation': rng.randint(94, 100),
+            'stress_level': rng.randint(10, 80),
+            'steps': rng.randint(0, 120),
+        })
+    return rows, end
+
+
+def load_raw(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.execute(
+        f"CREATE TABLE health_data (user_id TEXT, timestamp INTEGER, {', '.join(m + ' REAL' for m in METRICS)})"
+    )
+    conn.execute("CREATE INDEX idx_health_data_user_timestamp ON health_data(user_id, timestamp)")
+    conn.executemany(
+        f"INSERT INTO health_data VALUES (?, ?, {', '.join('?' * len(METRICS))})",
+        [(r['user_id'], r['timestamp'], *(r[m] for m in METRICS)) for r in rows]
+    )
+    return conn
+
+
+def raw_stats(conn, start, end):
+    """What the app does without rollups: fetch every row and aggregate"""
+    rows = conn.execute(
+        f"SELECT {', '.join(METRICS)} FROM health_data WHERE user_id = ? AND timestamp >= ? AND timestamp < ?",
+        (USER_ID, start, end)
+    ).fetchall()
+    stats = {}
+    for index, metric in enumerate(METRICS):
+        values = [row[index] for row in rows if row[index] is not None]
+        stats[metric] = {'avg': sum(values) / len(values), 'count': len(values),
+                         'min': min(values), 'max': max(values)}
+    return stats, len(rows)
+
+
+def _time(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def run(days, interval):
+    rows, now = synthetic_rows(days, interval)
+    print(f"{len(rows)} raw samples over {days} days")
+
+    conn = load_raw(rows)
+    store = SQLiteRollupStore()
+    _, load_ms = _time(lambda: store.add_rows(rows), repeat=1)
+    print(f"rollups built in {load_ms:.0f} ms")
+
+    for window in (7, 30):
+        if window > days:
+            continue
+        start = now - window * DAY_MS
+        (raw, raw_rows), raw_ms = _time(lambda: raw_stats(conn, start, now + 1))
+        rolled, rollup_ms = _time(lambda: store.stats(USER_ID, start, now + 1, METRICS))
+        rollup_rows = sum(
+            len(store.fetch(USER_ID, resolution, lo, hi, METRICS))
+            for resolution, lo, hi in cover_range(start, now + 1)
+        )
+        for metric in METRICS:
+            assert raw[metric]['count'] == rolled[metric]['count'], metric
+            assert abs(raw[metric]['avg'] - rolled[metric]['avg']) < 1e-6, metric
+
+        series, series_ms = _time(lambda: store.series(USER_ID, 'heart_rate', start, now + 1))
+        print(f"{window}-day stats:  raw {raw_rows:6d} rows {raw_ms:7.2f} ms | "
+              f"rollups {rollup_rows:4d} rows {rollup_ms:6.2f} ms")
+        print(f"{window}-day chart:  {len(series['timestamp'])} points at {series['resolution']} "
+              f"in {series_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rollup benchmark')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', type=int, default=60, help='seconds between samples')
+    args = parser.parse_args()
+    run(args.days, args.interval)
@@ -0,0 +1,112 @@
+"""
+Storage backend benchmark for GAIA Backend
+Runs the same workload against the local SQLite backend and, when
+SUPABASE_URL / SUPABASE_KEY are set, the hosted Supabase backend:
+
+    - bulk insert of synthetic health_data rows in write-buffer batches
+    - latest-row reads, 7-day range scans and 7-day stats
+
+Supabase rows go to --user-id (an existing users.id, health_data has a
+foreign key on it); SQLite uses a temporary file, removed afterwards.
+
+Usage:
+    python bench_storage.py [--samples 20000] [--batch 500] [--reads 200]
+    python bench_storage.py --supabase --user-id <uuid> --samples 2000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from storage import StorageBackend
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def synthetic_rows(user_id, count, seed=11):
+    rng = random.Random(seed)
+    end = int(time.time() * 1000)
+    step = 7 * DAY_MS // count
+    rows = []
+    for index in range(count):
+        timestamp = end - (count - index) * step
+        rows.append({
+            'user_id': user_id,
+            'timestamp': timestamp,
+            'idempotency_key': f"{user_id}:{timestamp}",
+            'heart_rate': rng.randint(55, 110),
+            'blood_pressure_systolic': rng.randint(105, 140),
+            'blood_pressure_diastolic': rng.randint(65, 90),
+            'oxygen_saturation': rng.randint(94, 100),
+            'stress_level': rng.randint(10, 80),
+            'steps': rng.randint(0, 120),
+        })
+    return rows, end
+
+
+def _time(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1000 / repeat
+
+
+def run(backend: StorageBackend, user_id, samples, batch, reads):
+    rows, now = synthetic_rows(user_id, samples)
+    since = now - 7 * DAY_MS
+
+    def insert_all():
+        for start in range(0, len(rows), batch):
+            backend.insert_rows('health_data', rows[start:start + batch])
+
+    _, insert_ms = _time(insert_all)
+    _, latest_ms = _time(lambda: backend.latest_health_row(user_id), repeat=reads)
+    scanned, scan_ms = _time(lambda: sum(1 for _ in backend.iter_health_rows(user_id, since, ['heart_rate'])), repeat=3)
+    _, stats_ms = _time(lambda: backend.health_stats(user_id, since), repeat=3)
+
+    print(f"[{backend.name}]")
+    print(f"  insert {samples} rows ({batch}/batch): {insert_ms:9.1f} ms  "
+          f"({samples / insert_ms * 1000:,.0f} rows/s)")
+    print(f"  latest row:                   {latest_ms:9.3f} ms")
+    print(f"  7-day scan ({scanned} rows):    {scan_ms:9.1f} ms")
+    print(f"  7-day stats:                  {stats_ms:9.2f} ms")
+
+
+def run_sqlite(args):
+    from storage_sqlite import SQLiteBackend
+
+    directory = tempfile.mkdtemp(prefix='gaia-bench-')
+    backend = SQLiteBackend(os.path.join(directory, 'gaia.db'))
+    try:
+        run(backend, args.user_id or 'bench_user', args.samples, args.batch, args.reads)
+    finally:
+        backend.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_supabase(args):
+    if not os.getenv('SUPABASE_URL') or not os.getenv('SUPABASE_KEY'):
+        print("[supabase] skipped: SUPABASE_URL / SUPABASE_KEY not set")
+        return
+    if not args.user_id:
+        print("[supabase] skipped: --user-id is required (health_data.user_id references users)")
+        return
+    from storage_supabase import SupabaseBackend
+    run(SupabaseBackend(), args.user_id, args.samples, args.batch, args.reads)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Storage backend benchmark')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500, help='rows per insert (GAIA_WRITE_BATCH_SIZE)')
+    parser.add_argument('--reads', type=int, default=200, help='latest-row reads')
+    parser.add_argument('--user-id', help='users.id to write under (required for Supabase)')
+    parser.add_argument('--supabase', action='store_true', help='also run against Supabase')
+    args = parser.parse_args()
+
+    run_sqlite(args)
+    if args.supabase:
+        run_supabase(args)
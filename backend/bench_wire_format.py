@@ -0,0 +1,87 @@
+"""
+Wire format benchmark for GAIA health syncs
+Compares payload size and decode+normalize time of the nested JSON body,
+the flat JSON body and the compact binary format (health_wire).
+
+Usage:
+    python bench_wire_format.py [--iterations 20000]
+"""
+
+import argparse
+import gzip
+import json
+import time
+
+import health_wire
+from health_payload import flat_to_nested, normalize_sync_payload
+
+FLAT_SAMPLE = {
+    'userId': 'user_4821',
+    'timestamp': 1729339200000,
+    'heartRate': 72,
+    'bloodPressureSystolic': 121,
+    'bloodPressureDiastolic': 79,
+    'bodyTemperature': 36.7,
+    'steps': 8543,
+    'sleepDuration': 7.25,
+    'oxygenSaturation': 98,
+    'stressLevel': 34,
+    'calories': 2140.5,
+    'distance': 6.42,
+    'weight': 72.4,
+    'height': 1.78
+}
+
+
+def _time(label, decode, payload, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(payload)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<14}{elapsed / iterations * 1e6:>10.2f} us/sample")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare JSON and binary sync payloads')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    nested = {
+        'userId': FLAT_SAMPLE['userId'],
+        'timestamp': FLAT_SAMPLE['timestamp'],
+        'healthData': flat_to_nested(FLAT_SAMPLE, FLAT_SAMPLE['timestamp'])
+    }
+    payloads = {
+        'nested JSON': json.dumps(nested).encode('utf-8'),
+        'flat JSON': json.dumps(FLAT_SAMPLE).encode('utf-8'),
+        'binary': health_wire.encode_sample(FLAT_SAMPLE),
+    }
+
+    # Round trip must give the same normalized structure as the flat JSON body
+    assert normalize_sync_payload(health_wire.decode_sample(payloads['binary'])[0]) == \
+        normalize_sync_payload(json.loads(payloads['flat JSON']))
+
+    # A realistic backlog: 100 samples five minutes apart with drifting values
+    backlog = [
+        dict(FLAT_SAMPLE, timestamp=FLAT_SAMPLE['timestamp'] + i * 300000,
+             heartRate=60 + i % 40, steps=FLAT_SAMPLE['steps'] + i * 37)
+        for i in range(100)
+    ]
+    batches = {
+        'nested JSON': json.dumps([
+            {'userId': s['userId'], 'timestamp': s['timestamp'],
+             'healthData': flat_to_nested(s, s['timestamp'])} for s in backlog
+        ]).encode('utf-8'),
+        'flat JSON': json.dumps(backlog).encode('utf-8'),
+        'binary': b''.join(health_wire.encode_sample(s) for s in backlog),
+    }
+
+    print("Payload size (one sample / backlog of 100, gzipped):")
+    for label, payload in payloads.items():
+        batch = gzip.compress(batches[label])
+        print(f"  {label:<14}{len(payload):>6} B {len(batch) / 100:>10.1f} B/sample")
+
+    print(f"Decode + normalize ({args.iterations} iterations):")
+    _time('nested JSON', lambda p: normalize_sync_payload(json.loads(p)), payloads['nested JSON'], args.iterations)
+    _time('flat JSON', lambda p: normalize_sync_payload(json.loads(p)), payloads['flat JSON'], args.iterations)
+    _time('binary', lambda p: normalize_sync_payload(health_wire.decode_sample(p)[0]), payloads['binary'], args.iterations)
@@ -0,0 +1,103 @@
+"""
+Rule-based recommendations for GAIA Backend
+Deterministic local fallback used when Gemini is slow or unreachable.
+Uses the same thresholds as the Gemini prompt and produces the same
+HEALTH / FITNESS / LIFESTYLE bullet format.
+"""
+
+from typing import Dict, List
+
+# Thresholds quoted in the Gemini prompt (recommandations.build_prompt)
+STEPS_TARGET = 10000
+SLEEP_MIN_HOURS = 7
+SLEEP_MAX_HOURS = 9
+HEART_RATE_MIN = 60
+HEART_RATE_MAX = 100
+
+
+def _health_bullets(features: Dict) -> List[str]:
+    bullets = []
+    heart_rate = features.get('heart_rate')
+    bmi = features.get('bmi')
+
+    if heart_rate and heart_rate > HEART_RATE_MAX:
+        bullets.append("Your resting heart rate is high; consider checking it with a doctor.")
+    elif heart_rate and heart_rate < HEART_RATE_MIN:
+        bullets.append("Your heart rate is low; mention it at your next check-up if unusual.")
+    elif heart_rate:
+        bullets.append("Your heart rate is in the normal range; keep monitoring it regularly.")
+
+    if bmi is not None and bmi >= 30:
+        bullets.append("Aim for gradual weight loss with balanced meals and portion control.")
+    elif bmi is not None and bmi >= 25:
+        bullets.append("Favor vegetables and lean protein to move toward a healthier weight.")
+    elif bmi is not None and bmi < 18.5:
+        bullets.append("Add nutrient-dense meals and snacks to reach a healthier weight.")
+
+    if features.get('gender') == 'female':
+        bullets.append("Include iron- and calcium-rich foods like leafy greens and dairy.")
+    else:
+        bullets.append("Support heart health with fish, nuts and less processed food.")
+
+    bullets.append("Drink water regularly, especially before and during long drives.")
+    return bullets[:3]
+
+
+def _fitness_bullets(features: Dict) -> List[str]:
+    steps = features.get('steps') or 0
+
+    if steps < STEPS_TARGET / 2:
+        bullets = [
+            "Add a 15-minute walk after lunch and dinner to raise your steps.",
+            "Park farther away and take stairs to build daily movement.",
+        ]
+    elif steps < STEPS_TARGET:
+        bullets = [
+            f"Add about {int(STEPS_TARGET - steps):,} steps to reach 10,000 today.",
+            "Try one brisk 20-minute walk to close your step gap.",
+        ]
+    else:
+        bullets = [
+            "Great activity level; keep reaching 10,000 steps daily.",
+            "Add two strength sessions per week to complement your walking.",
+        ]
+
+    if features.get('gender') == 'female':
+        bullets.append("Include weight-bearing exercise to support bone density.")
+    else:
+        bullets.append("Include resistance training to maintain muscle mass.")
+    return bullets
+
+
+def _lifestyle_bullets(features: Dict) -> List[str]:
+    sleep = features.get('sleep_duration') or 0
+    bullets = []
+
+    if sleep and sleep < SLEEP_MIN_HOURS:
+        bullets.append("Go to bed 30 minutes earlier to approach 7-9 hours of sleep.")
+    elif sleep > SLEEP_MAX_HOURS:
+        bullets.append("Keep a regular wake-up time; over 9 hours of sleep can cause grogginess.")
+    else:
+        bullets.append("Keep a consistent sleep schedule to protect your 7-9 hours of rest.")
+
+    bullets.append("Take a short break every two hours when driving long distances.")
+    bullets.append("Limit screens one hour before bed to improve sleep quality.")
+    return bullets
+
+
+def rule_based_recommendations(features: Dict) -> str:
+    """
+    Build recommendations text from recommandations.extract_features() output
+
+    Returns:
+        str: text in the exact HEALTH/FITNESS/LIFESTYLE format requested from Gemini
+    """
+    sections = (
+        ('HEALTH RECOMMENDATIONS:', _health_bullets(features)),
+        ('FITNESS RECOMMENDATIONS:', _fitness_bullets(features)),
+        ('LIFESTYLE RECOMMENDATIONS:', _lifestyle_bullets(features)),
+    )
+    return "\n\n".join(
+        header + "\n" + "\n".join(f"• {bullet}" for bullet in bullets)
+        for header, bullets in sections
+    )
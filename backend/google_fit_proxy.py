@@ -8,6 +8,11 @@ import requests
 import os
 from datetime import datetime, timedelta
 
+from rate_limit import Limit, RateLimiter, create_bucket_store, rate_limited, user_or_ip
+from structured_logging import get_logger
+
+logger = get_logger('google_fit_proxy')
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 CORS(app, supports_credentials=True, origins=['http://localhost:8080'])
@@ -33,11 +38,25 @@ SCOPES = [
 # In-memory token storage (use database in production)
 user_tokens = {}
 
+# Each /api/google-fit/data call fans out to ~8 Google Fit requests, so it is
+# limited per userId of the body (there are no access tokens here) to protect
+# the Fit API quota; unknown userIds get 401 before any Fit request
+# (GAIA_RATE_FIT_DATA, GAIA_RATE_OAUTH)
+rate_limiter = RateLimiter(create_bucket_store(), {
+    'fit_data': Limit.from_env('fit_data', 30, burst=10),
+    'oauth': Limit.from_env('oauth', 20, burst=5),
+})
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'service': 'Google Fit OAuth Proxy'}), 200
+    return jsonify({
+        'status': 'healthy',
+        'service': 'Google Fit OAuth Proxy',
+        'rateLimits': rate_limiter.stats()
+    }), 200
 
 @app.route('/oauth/start', methods=['GET'])
+@rate_limited(rate_limiter, 'oauth')
 def oauth_start():
     """
     Start OAuth flow - redirect to Google
@@ -63,6 +82,7 @@ def oauth_start():
     return redirect(auth_url)
 
 @app.route('/oauth/callback', methods=['GET'])
+@rate_limited(rate_limiter, 'oauth')
 def oauth_callback():
     """
     OAuth callback - exchange code for token
@@ -97,16 +117,17 @@ def oauth_callback():
             'expires_at': datetime.now() + timedelta(seconds=tokens.get('expires_in', 3600))
         }
         
-        print(f"✅ OAuth successful for user {user_id}")
+        logger.info("OAuth successful", extra={'fields': {'userId': user_id}})
         
         # Redirect back to web app
         return redirect(f'http://localhost:8080?oauth=success')
         
     except Exception as e:
-        print(f"❌ OAuth error: {str(e)}")
+        logger.error("OAuth error: %s", e)
         return redirect(f'http://localhost:8080?oauth=error')
 
 @app.route('/api/google-fit/data', methods=['POST'])
+@rate_limited(rate_limiter, 'fit_data', key=user_or_ip)
 def get_google_fit_data():
     """
     Fetch Google Fit data for a user
@@ -148,7 +169,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Heart rate data not available: {str(e)}")
+            logger.warning("Heart rate data not available: %s", e)
         
         try:
             steps_data = fetch_data_source(
@@ -158,7 +179,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Steps data not available: {str(e)}")
+            logger.warning("Steps data not available: %s", e)
         
         try:
             calories_data = fetch_data_source(
@@ -168,7 +189,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Calories data not available: {str(e)}")
+            logger.warning("Calories data not available: %s", e)
         
         try:
             distance_data = fetch_data_source(
@@ -178,7 +199,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Distance data not available: {str(e)}")
+            logger.warning("Distance data not available: %s", e)
         
         try:
             weight_data = fetch_data_source(
@@ -188,7 +209,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Weight data not available: {str(e)}")
+            logger.warning("Weight data not available: %s", e)
         
         try:
             height_data = fetch_data_source(
@@ -198,7 +219,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Height data not available: {str(e)}")
+            logger.warning("Height data not available: %s", e)
         
         try:
             oxygen_data = fetch_data_source(
@@ -208,7 +229,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Oxygen saturation data not available: {str(e)}")
+            logger.warning("Oxygen saturation data not available: %s", e)
         
         try:
             blood_pressure_data = fetch_data_source(
@@ -218,7 +239,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Blood pressure data not available: {str(e)}")
+            logger.warning("Blood pressure data not available: %s", e)
         
         try:
             sleep_data = fetch_data_source(
@@ -228,7 +249,7 @@ def get_google_fit_data():
                 headers
             )
         except Exception as e:
-            print(f"⚠️  Sleep data not available: {str(e)}")
+            logger.warning("Sleep data not available: %s", e)
         
         # Process data
         health_data = {
@@ -244,10 +265,14 @@ def get_google_fit_data():
             'sleepDuration': calculate_sleep_hours(sleep_data) if sleep_data else 0  # hours
         }
         
-        print(f"✅ Fetched Google Fit data for {user_id}")
-        print(f"   Steps: {health_data['steps']}, Calories: {health_data['calories']}, Distance: {health_data['distance']}km")
-        if health_data['weight']:
-            print(f"   Weight: {health_data['weight']}kg, Height: {health_data['height']}m")
+        logger.info("Fetched Google Fit data", extra={'fields': {
+            'userId': user_id,
+            'steps': health_data['steps'],
+            'calories': health_data['calories'],
+            'distance': health_data['distance'],
+            'weight': health_data['weight'],
+            'height': health_data['height']
+        }})
         
         return jsonify({
             'success': True,
@@ -255,7 +280,7 @@ def get_google_fit_data():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error fetching Google Fit data: {str(e)}")
+        logger.error("Error fetching Google Fit data: %s", e)
         return jsonify({'error': str(e)}), 500
 
 def fetch_data_source(data_source_id, start_time, end_time, headers):
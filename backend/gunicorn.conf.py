@@ -0,0 +1,50 @@
+"""
+Gunicorn configuration for GAIA Backend (production serving)
+
+Usage (Linux / macOS, from the backend directory):
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden with the matching GAIA_* environment
+variable. Gunicorn does not run on Windows; use `python server.py` there.
+"""
+
+import os
+import sys
+
+wsgi_app = 'server:create_app()'
+bind = os.getenv('GAIA_BIND', '0.0.0.0:5000')
+
+# Health history and pairing state live in process memory (health_store,
+# pairing_connections), so all requests must reach the same process: a
+# single worker with a thread pool. Raise GAIA_WORKERS only once that state
+# is moved to a shared store.
+workers = int(os.getenv('GAIA_WORKERS', '1'))
+worker_class = 'gthread'
+# Threads mostly wait on Gemini / Supabase I/O, and SSE streams hold one each
+threads = int(os.getenv('GAIA_THREADS', '32'))
+
+# Keep-alive lets a phone reuse its connection across syncs
+keepalive = int(os.getenv('GAIA_KEEPALIVE', '5'))
+# Above the recommendation deadline, so slow Gemini calls are not killed
+timeout = int(os.getenv('GAIA_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GAIA_GRACEFUL_TIMEOUT', '30'))
+
+# Request size limits (body size is capped by MAX_CONTENT_LENGTH in server.py)
+limit_request_line = 8190
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# Recycle workers periodically to bound memory growth from fragmentation
+max_requests = int(os.getenv('GAIA_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GAIA_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GAIA_LOG_LEVEL', 'info').lower()
+
+
+def worker_exit(server, worker):
+    """Flush buffered Supabase writes before the worker goes away"""
+    supabase_client = sys.modules.get('supabase_client')
+    if supabase_client is not None:
+        supabase_client.write_buffer.close()
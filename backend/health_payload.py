@@ -0,0 +1,149 @@
+"""
+Health payload normalization for GAIA Backend
+Turns mobile sync bodies (flat or nested) into the nested healthData format
+"""
+
+import json
+import math
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import health_wire
+from health_schema import flat_to_nested
+
+# Hard limits for batch bodies (decompressed size guards against gzip bombs)
+MAX_BATCH_ITEMS = 1000
+MAX_BATCH_BYTES = 10 * 1024 * 1024
+
+
+def parse_timestamp(value) -> Optional[int]:
+    """
+    Sync timestamp as Unix milliseconds (None if absent)
+
+    Numbers and digit strings are taken as milliseconds; ISO 8601 dates
+    (sent by older mobile builds) are converted, naive ones read as UTC.
+
+    Raises:
+        ValueError: for anything else, or a value outside int64 milliseconds
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError('timestamp must be Unix milliseconds or an ISO 8601 date')
+
+    if isinstance(value, int):
+        millis = value
+    elif isinstance(value, float) and math.isfinite(value):
+        millis = int(value)
+    elif isinstance(value, str) and value.strip().isdigit():
+        millis = int(value.strip())
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError('timestamp must be Unix milliseconds or an ISO 8601 date')
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        millis = int(parsed.timestamp() * 1000)
+    else:
+        raise ValueError('timestamp must be Unix milliseconds or an ISO 8601 date')
+
+    if not 0 <= millis < 2 ** 63:
+        raise ValueError('timestamp out of range')
+    return millis
+
+
+def normalize_sync_payload(data) -> Tuple[str, Optional[int], Dict]:
+    """
+    Validate one sync body and return (user_id, timestamp, health_data)
+
+    Accepts both formats:
+    1. Old format (flat): { userId, timestamp, heartRate, bloodPressureSystolic, ... }
+    2. New format (nested): { userId, timestamp, healthData: { heartRate: {...}, ... } }
+
+    The timestamp is returned as Unix milliseconds (see parse_timestamp).
+
+    Raises:
+        ValueError: if the body is not an object, its userId is missing or
+            not a non-empty string, or its timestamp is invalid
+    """
+    if not isinstance(data, dict) or 'userId' not in data:
+        raise ValueError('Please provide userId')
+    if not isinstance(data['userId'], str) or not data['userId']:
+        raise ValueError('userId must be a non-empty string')
+
+    timestamp = parse_timestamp(data.get('timestamp'))
+
+    # Check if data is in flat format (from mobile app) or nested format
+    if 'healthData' in data:
+        health_data = data['healthData']
+        if not isinstance(health_data, dict):
+            raise ValueError('healthData must be an object')
+    else:
+        health_data = flat_to_nested(data, timestamp)
+
+    return data['userId'], timestamp, health_data
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    """Inflate a gzip/deflate body, refusing anything over MAX_BATCH_BYTES"""
+    if encoding == 'gzip':
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        inflater = zlib.decompressobj()
+    else:
+        raise ValueError(f'Unsupported Content-Encoding: {encoding}')
+
+    try:
+        result = inflater.decompress(body, MAX_BATCH_BYTES + 1)
+    except zlib.error as e:
+        raise ValueError(f'Invalid {encoding} body: {e}')
+    if len(result) > MAX_BATCH_BYTES:
+        raise ValueError(f'Decompressed body exceeds {MAX_BATCH_BYTES} bytes')
+    return result
+
+
+def parse_batch_body(body: bytes, content_type: str = '', content_encoding: str = '') -> List:
+    """
+    Parse a batch sync body into a list of raw samples
+
+    Accepts a JSON array, a JSON object {"samples": [...]}, NDJSON
+    (one sample per line, Content-Type application/x-ndjson) or
+    concatenated binary samples (Content-Type application/x-gaia-health,
+    see health_wire), optionally gzip/deflate compressed (Content-Encoding).
+
+    Raises:
+        ValueError: on malformed, oversized or too long bodies
+    """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding and encoding != 'identity':
+        body = _decompress(body, encoding)
+    elif body[:2] == b'\x1f\x8b':
+        # gzip magic without header (some mobile HTTP stacks drop it)
+        body = _decompress(body, 'gzip')
+
+    if len(body) > MAX_BATCH_BYTES:
+        raise ValueError(f'Body exceeds {MAX_BATCH_BYTES} bytes')
+
+    if health_wire.CONTENT_TYPE in (content_type or ''):
+        samples = health_wire.decode_samples(body)
+        if len(samples) > MAX_BATCH_ITEMS:
+            raise ValueError(f'Batch exceeds {MAX_BATCH_ITEMS} samples')
+        return samples
+
+    try:
+        text = body.decode('utf-8')
+        if 'ndjson' in (content_type or '') or 'jsonl' in (content_type or ''):
+            samples = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            parsed = json.loads(text)
+            samples = parsed.get('samples') if isinstance(parsed, dict) else parsed
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'Invalid JSON: {e}')
+
+    if not isinstance(samples, list):
+        raise ValueError('Expected an array of samples')
+    if len(samples) > MAX_BATCH_ITEMS:
+        raise ValueError(f'Batch exceeds {MAX_BATCH_ITEMS} samples')
+    return samples
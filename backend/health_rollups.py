@@ -0,0 +1,295 @@
+"""
+Multi-resolution rollups of health_data for GAIA Backend
+Per user and metric, samples are folded into 1-minute, 1-hour and 1-day
+buckets (count, sum, min, max, last). Range queries read a few hundred
+bucket rows instead of every raw sample:
+
+    - stats over a range use the coarsest buckets that fit inside it and
+      finer ones only at the edges (exact to the minute)
+    - chart series use the finest resolution that fits in `max_points`
+
+In Supabase the buckets live in the health_rollups table, kept up to date
+by a trigger on health_data (see supabase_schema.sql). SQLiteRollupStore
+is the local stand-in with the same table, for tests and offline use;
+storage_sqlite.SQLiteBackend maintains it in the health_data transaction.
+"""
+
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from health_schema import METRICS
+
+# (name, bucket width in ms), finest first
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (
+    ('1m', 60 * 1000),
+    ('1h', 3600 * 1000),
+    ('1d', 24 * 3600 * 1000),
+)
+RESOLUTION_WIDTHS: Dict[str, int] = dict(RESOLUTIONS)
+
+# Numeric health_data columns that are rolled up
+ROLLUP_METRICS: Tuple[str, ...] = tuple(m.db for m in METRICS if m.db and m.numeric)
+
+ROLLUP_FIELDS = (
+    'metric', 'bucket_start', 'sample_count', 'value_sum',
+    'value_min', 'value_max', 'value_last', 'last_timestamp'
+)
+
+# fetch(user_id, resolution, start_ms, end_ms, metrics) -> rows with ROLLUP_FIELDS,
+# for buckets with start_ms <= bucket_start < end_ms
+RollupFetcher = Callable[[str, str, int, int, Optional[Sequence[str]]], Iterable[Dict]]
+
+
+def _floor(timestamp: int, width: int) -> int:
+    return timestamp - timestamp % width
+
+
+def _ceil(timestamp: int, width: int) -> int:
+    return -(-timestamp // width) * width
+
+
+# ==================== FOLDING ====================
+
+def fold_samples(rows: Iterable[Dict], metrics: Sequence[str] = ROLLUP_METRICS) -> Dict[Tuple, List]:
+    """
+    Fold raw health_data rows into buckets at every resolution
+
+    Returns {(user_id, metric, resolution, bucket_start):
+             [count, sum, min, max, last, last_timestamp]}
+    """
+    buckets: Dict[Tuple, List] = {}
+    for row in rows:
+        user_id = row['user_id']
+        timestamp = int(row['timestamp'])
+        for metric in metrics:
+            value = row.get(metric)
+            if value is None:
+                continue
+            value = float(value)
+            for resolution, width in RESOLUTIONS:
+                key = (user_id, metric, resolution, _floor(timestamp, width))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [1, value, value, value, value, timestamp]
+                    continue
+                bucket[0] += 1
+                bucket[1] += value
+                if value < bucket[2]:
+                    bucket[2] = value
+                if value > bucket[3]:
+                    bucket[3] = value
+                if timestamp >= bucket[5]:
+                    bucket[4] = value
+                    bucket[5] = timestamp
+    return buckets
+
+
+# ==================== QUERY PLANNING ====================
+
+def cover_range(start_ms: int, end_ms: int) -> List[Tuple[str, int, int]]:
+    """
+    Split [start_ms, end_ms) into spans of whole buckets
+
+    Whole days in the middle, whole hours around them, minutes at the
+    edges. Returns (resolution, span start, span end) tuples; the edges
+    are rounded outwards to the minute.
+    """
+    spans: List[Tuple[str, int, int]] = []
+
+    def cover(lo: int, hi: int, level: int) -> None:
+        if lo >= hi:
+            return
+        resolution, width = RESOLUTIONS[level]
+        if level == 0:
+            spans.append((resolution, lo, hi))
+            return
+        inner_lo, inner_hi = _ceil(lo, width), _floor(hi, width)
+        if inner_lo >= inner_hi:
+            cover(lo, hi, level - 1)
+            return
+        cover(lo, inner_lo, level - 1)
+        spans.append((resolution, inner_lo, inner_hi))
+        cover(inner_hi, hi, level - 1)
+
+    minute = RESOLUTIONS[0][1]
+    cover(_floor(start_ms, minute), _ceil(end_ms, minute), len(RESOLUTIONS) - 1)
+    return spans
+
+
+def choose_resolution(start_ms: int, end_ms: int, max_points: int = 500) -> str:
+    """Finest resolution with at most max_points buckets in the range (daily otherwise)"""
+    for resolution, width in RESOLUTIONS:
+        if _ceil(end_ms, width) - _floor(start_ms, width) <= max_points * width:
+            return resolution
+    return RESOLUTIONS[-1][0]
+
+
+def merge_buckets(rows: Iterable[Dict]) -> Dict[str, Dict]:
+    """Combine bucket rows into per-metric {avg, count, min, max, last}"""
+    merged: Dict[str, List] = {}
+    for row in rows:
+        metric = row['metric']
+        count = row['sample_count']
+        if not count:
+            continue
+        total = merged.get(metric)
+        if total is None:
+            merged[metric] = [count, row['value_sum'], row['value_min'], row['value_max'],
+                              row['value_last'], row['last_timestamp']]
+            continue
+        total[0] += count
+        total[1] += row['value_sum']
+        total[2] = min(total[2], row['value_min'])
+        total[3] = max(total[3], row['value_max'])
+        if row['last_timestamp'] >= total[5]:
+            total[4] = row['value_last']
+            total[5] = row['last_timestamp']
+
+    return {
+        metric: {'avg': total[1] / total[0], 'count': total[0],
+                 'min': total[2], 'max': total[3], 'last': total[4]}
+        for metric, total in merged.items()
+    }
+
+
+def rollup_stats(fetch: RollupFetcher,
+                 user_id: str,
+                 start_ms: int,
+                 end_ms: int,
+                 metrics: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+    """Per-metric {avg, count, min, max, last} over [start_ms, end_ms) from rollups"""
+    rows: List[Dict] = []
+    for resolution, span_start, span_end in cover_range(start_ms, end_ms):
+        rows.extend(fetch(user_id, resolution, span_start, span_end, metrics))
+    return merge_buckets(rows)
+
+
+def rollup_series(fetch: RollupFetcher,
+                  user_id: str,
+                  metric: str,
+                  start_ms: int,
+                  end_ms: int,
+                  max_points: int = 500) -> Dict:
+    """
+    Chart series of one metric as columns
+
+    Returns {resolution, timestamp, avg, min, max, count}; empty buckets
+    are omitted.
+    """
+    resolution = choose_resolution(start_ms, end_ms, max_points)
+    width = RESOLUTION_WIDTHS[resolution]
+    rows = sorted(
+        fetch(user_id, resolution, _floor(start_ms, width), end_ms, [metric]),
+        key=lambda row: row['bucket_start']
+    )
+    return {
+        'resolution': resolution,
+        'timestamp': [row['bucket_start'] for row in rows],
+        'avg': [row['value_sum'] / row['sample_count'] for row in rows],
+        'min': [row['value_min'] for row in rows],
+        'max': [row['value_max'] for row in rows],
+        'count': [row['sample_count'] for row in rows],
+    }
+
+
+# ==================== SQLITE STAND-IN ====================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS health_rollups (
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    sample_count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_min REAL NOT NULL,
+    value_max REAL NOT NULL,
+    value_last REAL NOT NULL,
+    last_timestamp INTEGER NOT NULL,
+    PRIMARY KEY (user_id, resolution, metric, bucket_start)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO health_rollups (user_id, metric, resolution, bucket_start, sample_count,
+                            value_sum, value_min, value_max, value_last, last_timestamp)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, resolution, metric, bucket_start) DO UPDATE SET
+    sample_count = sample_count + excluded.sample_count,
+    value_sum = value_sum + excluded.value_sum,
+    value_min = MIN(value_min, excluded.value_min),
+    value_max = MAX(value_max, excluded.value_max),
+    value_last = CASE WHEN excluded.last_timestamp >= last_timestamp
+                      THEN excluded.value_last ELSE value_last END,
+    last_timestamp = MAX(last_timestamp, excluded.last_timestamp)
+"""
+
+
+def sqlite_add_rows(conn: sqlite3.Connection, rows: Iterable[Dict]) -> int:
+    """Fold health_data rows into health_rollups on conn (caller commits)"""
+    buckets = fold_samples(rows)
+    conn.executemany(_UPSERT, [key + tuple(value) for key, value in buckets.items()])
+    return len(buckets)
+
+
+def sqlite_fetch(conn: sqlite3.Connection,
+                 user_id: str,
+                 resolution: str,
+                 start_ms: int,
+                 end_ms: int,
+                 metrics: Optional[Sequence[str]] = None) -> List[Dict]:
+    """health_rollups rows of one resolution with start_ms <= bucket_start < end_ms"""
+    sql = (
+        f"SELECT {', '.join(ROLLUP_FIELDS)} FROM health_rollups "
+        "WHERE user_id = ? AND resolution = ? AND bucket_start >= ? AND bucket_start < ?"
+    )
+    params: list = [user_id, resolution, start_ms, end_ms]
+    if metrics:
+        metrics = list(metrics)
+        sql += f" AND metric IN ({', '.join('?' * len(metrics))})"
+        params.extend(metrics)
+    cursor = conn.execute(sql + " ORDER BY bucket_start", params)
+    return [dict(zip(ROLLUP_FIELDS, row)) for row in cursor]
+
+
+class SQLiteRollupStore:
+    """
+    health_rollups in SQLite, same layout and semantics as the Supabase table
+
+    `add_rows` plays the role of the Postgres trigger: call it with the
+    health_data rows as they are inserted. Pass `connection` to share a
+    database (and its transactions) with other tables.
+    """
+
+    def __init__(self, path: str = ':memory:', connection: Optional[sqlite3.Connection] = None):
+        self._conn = connection or sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(SQLITE_SCHEMA)
+
+    def add_rows(self, rows: Iterable[Dict]) -> int:
+        """Fold health_data rows into the rollups; returns how many buckets changed"""
+        with self._lock, self._conn:
+            return sqlite_add_rows(self._conn, rows)
+
+    def fetch(self,
+              user_id: str,
+              resolution: str,
+              start_ms: int,
+              end_ms: int,
+              metrics: Optional[Sequence[str]] = None) -> List[Dict]:
+        with self._lock:
+            return sqlite_fetch(self._conn, user_id, resolution, start_ms, end_ms, metrics)
+
+    def stats(self, user_id: str, start_ms: int, end_ms: int,
+              metrics: Optional[Sequence[str]] = None) -> Dict[str, Dict]:
+        return rollup_stats(self.fetch, user_id, start_ms, end_ms, metrics)
+
+    def series(self, user_id: str, metric: str, start_ms: int, end_ms: int,
+               max_points: int = 500) -> Dict:
+        return rollup_series(self.fetch, user_id, metric, start_ms, end_ms, max_points)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,194 @@
+"""
+Declarative health metric schema for GAIA Backend
+Single description of every metric (names, units, source paths, defaults)
+from which the payload converters are generated once at import:
+
+    flat_to_nested        mobile flat body        -> nested healthData
+    nested_to_db_row      nested healthData       -> health_data table row
+    nested_to_latest      nested healthData       -> /api/health/latest response
+    db_row_to_frontend    health_data table row   -> dashboard format
+
+Each converter is compiled to straight-line Python (no loops over the
+schema, no repeated .get chains), so a payload is transformed in one pass.
+"""
+
+import math
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+_NO_DEFAULT = object()
+
+
+class Metric(NamedTuple):
+    path: Tuple[str, ...]                 # location in nested healthData, e.g. ('bloodPressure', 'systolic')
+    unit: Optional[str] = None            # unit written by flat_to_nested
+    flat: Optional[str] = None            # key in the flat mobile body
+    db: Optional[str] = None              # health_data column
+    latest: Optional[str] = None          # key in /api/health/latest data
+    latest_default: object = _NO_DEFAULT  # value when absent from healthData
+    frontend: Optional[str] = None        # key in format_health_data_for_frontend output
+    frontend_default: object = _NO_DEFAULT
+    numeric: bool = True                  # False for categorical values (not aggregated)
+
+
+METRICS: Tuple[Metric, ...] = (
+    Metric(('heartRate', 'value'), 'bpm', 'heartRate', 'heart_rate', 'heartRate', 72, 'heartBeat', 72),
+    Metric(('bloodPressure', 'systolic'), 'mmHg', 'bloodPressureSystolic', 'blood_pressure_systolic',
+           'bloodPressureSystolic', 120, 'tension', 120),
+    Metric(('bloodPressure', 'diastolic'), 'mmHg', 'bloodPressureDiastolic', 'blood_pressure_diastolic',
+           'bloodPressureDiastolic', 80),
+    Metric(('temperature', 'value'), 'celsius', 'bodyTemperature', 'temperature',
+           'bodyTemperature', 36.5, 'temperature', 36.5),
+    Metric(('steps', 'value'), None, 'steps', 'steps', 'steps', 0, 'steps', 0),
+    Metric(('sleep', 'duration'), 'hours', 'sleepDuration', 'sleep_duration', 'sleepDuration', 0),
+    Metric(('sleep', 'quality'), db='sleep_quality', numeric=False),
+    Metric(('sleep', 'stages', 'deep'), db='sleep_deep'),
+    Metric(('sleep', 'stages', 'light'), db='sleep_light'),
+    Metric(('sleep', 'stages', 'rem'), db='sleep_rem'),
+    Metric(('oxygenSaturation', 'value'), 'percent', 'oxygenSaturation', 'oxygen_saturation',
+           'oxygenSaturation', 98, 'oxygenSaturation', 98),
+    Metric(('stressLevel', 'value'), 'percent', 'stressLevel', 'stress_level', 'stressLevel', 30,
+           'stressLevel', 30),
+    Metric(('fatigue', 'value'), db='fatigue', frontend='fatigue', frontend_default=30),
+    Metric(('respiratoryRate', 'value'), db='respiratory_rate', frontend='respiratoryRate', frontend_default=16),
+    Metric(('ambiance', 'value'), db='ambient_noise', frontend='ambiance', frontend_default=45),
+    Metric(('calories', 'value'), 'kcal', 'calories', latest='calories', latest_default=0),
+    Metric(('distance', 'value'), 'km', 'distance', latest='distance', latest_default=0),
+    Metric(('weight', 'value'), 'kg', 'weight', latest='weight', latest_default=None),
+    Metric(('height', 'value'), 'meters', 'height', latest='height', latest_default=None),
+)
+
+# Sleep block of the dashboard format: (frontend key, db column, default)
+FRONTEND_SLEEP = (
+    ('duration', 'sleep_duration', 0),
+    ('quality', 'sleep_quality', 'unknown'),
+)
+FRONTEND_SLEEP_STAGES = (
+    ('deep', 'sleep_deep', 0),
+    ('light', 'sleep_light', 0),
+    ('rem', 'sleep_rem', 0),
+)
+
+
+# ==================== CODE GENERATION ====================
+
+def _compile(name: str, lines) -> Callable:
+    source = "\n".join(lines)
+    namespace = {}
+    exec(compile(source, f"<health_schema.{name}>", 'exec'), namespace)
+    function = namespace[name]
+    function.__source__ = source
+    return function
+
+
+def _build_flat_to_nested():
+    # Group flat metrics by their nested key; the first field decides presence
+    groups: Dict[str, list] = {}
+    for metric in METRICS:
+        if metric.flat:
+            groups.setdefault(metric.path[0], []).append(metric)
+
+    lines = ["def flat_to_nested(data, timestamp):", "    get = data.get", "    health_data = {}"]
+    for index, (key, members) in enumerate(groups.items()):
+        lines.append(f"    v{index} = get({members[0].flat!r})")
+        lines.append(f"    if v{index}:")
+        entries = [f"{members[0].path[1]!r}: v{index}"]
+        entries += [f"{m.path[1]!r}: get({m.flat!r})" for m in members[1:]]
+        if members[0].unit:
+            entries.append(f"'unit': {members[0].unit!r}")
+        entries.append("'timestamp': timestamp")
+        lines.append(f"        health_data[{key!r}] = {{{', '.join(entries)}}}")
+    lines.append("    return health_data")
+    return _compile('flat_to_nested', lines)
+
+
+def _build_nested_to_db_row():
+    lines = ["def nested_to_db_row(health_data):", "    row = {}"]
+    # Each parent dict (e.g. health_data['sleep']['stages']) is looked up once
+    parents = {(): 'health_data'}
+    for metric in METRICS:
+        if not metric.db:
+            continue
+        for depth in range(1, len(metric.path)):
+            prefix = metric.path[:depth]
+            if prefix not in parents:
+                name = parents[prefix] = f"p{len(parents)}"
+                parent = parents[prefix[:-1]]
+                guard = '' if depth == 1 else f" if {parent} else None"
+                lines.append(f"    {name} = {parent}.get({prefix[-1]!r}){guard}")
+                lines.append(f"    if type({name}) is not dict:")
+                lines.append(f"        {name} = None")
+        parent = parents[metric.path[:-1]]
+        lines.append(f"    v = {parent}.get({metric.path[-1]!r}) if {parent} else None")
+        lines.append("    if v is not None:")
+        lines.append(f"        row[{metric.db!r}] = v")
+    lines.append("    return row")
+    return _compile('nested_to_db_row', lines)
+
+
+def _build_nested_to_latest():
+    lines = ["def nested_to_latest(health_data):", "    get = health_data.get"]
+    parents = {}
+    entries = []
+    for metric in METRICS:
+        if metric.latest:
+            key, field = metric.path
+            if key not in parents:
+                parents[key] = f"p{len(parents)}"
+                lines.append(f"    {parents[key]} = get({key!r})")
+            name, default = parents[key], metric.latest_default
+            entries.append(
+                f"        {metric.latest!r}: {name}.get({field!r}, {default!r}) if {name} is not None else {default!r},"
+            )
+    lines += ["    return {", *entries, "    }"]
+    return _compile('nested_to_latest', lines)
+
+
+def _build_db_row_to_frontend():
+    lines = ["def db_row_to_frontend(db_record):", "    get = db_record.get", "    return {"]
+    for metric in METRICS:
+        if metric.frontend == 'oxygenSaturation':
+            # Sleep block (dashboard-specific layout) goes right before SpO2
+            lines.append("        'sleep': {")
+            for out, column, default in FRONTEND_SLEEP:
+                lines.append(f"            {out!r}: get({column!r}, {default!r}),")
+            lines.append("            'stages': {")
+            for out, column, default in FRONTEND_SLEEP_STAGES:
+                lines.append(f"                {out!r}: get({column!r}, {default!r}),")
+            lines.append("            }")
+            lines.append("        } if get('sleep_duration') else None,")
+        if metric.frontend:
+            lines.append(f"        {metric.frontend!r}: get({metric.db!r}, {metric.frontend_default!r}),")
+    lines.append("        'lastUpdated': get('timestamp')")
+    lines.append("    }")
+    return _compile('db_row_to_frontend', lines)
+
+
+flat_to_nested = _build_flat_to_nested()
+nested_to_db_row = _build_nested_to_db_row()
+nested_to_latest = _build_nested_to_latest()
+db_row_to_frontend = _build_db_row_to_frontend()
+
+flat_to_nested.__doc__ = "Convert the flat mobile format to the nested healthData format"
+nested_to_db_row.__doc__ = "Extract health_data columns from nested healthData (None values dropped)"
+nested_to_latest.__doc__ = "Format nested healthData for /api/health/latest (defaults filled in)"
+db_row_to_frontend.__doc__ = "Convert a health_data row to the dashboard format"
+
+# Columns of the in-memory HealthStore: latest key -> (nested key, field)
+STORE_COLUMNS: Dict[str, Tuple[str, str]] = {
+    metric.latest: metric.path for metric in METRICS if metric.latest
+}
+
+
+def metric_value(health_data: Dict, key: str, field: str) -> Optional[float]:
+    """health_data[key][field] as a float, None if missing, non-numeric, NaN or infinite"""
+    metric = health_data.get(key)
+    if not isinstance(metric, dict):
+        return None
+    value = metric.get(field)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
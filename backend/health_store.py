@@ -0,0 +1,196 @@
+"""
+In-memory time-series store for mobile health syncs
+Keeps a bounded per-user history in compact array-backed columns
+"""
+
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from health_schema import STORE_COLUMNS, metric_value
+
+# Column name -> (nested healthData key, field inside that metric)
+METRIC_COLUMNS: Dict[str, Tuple[str, str]] = STORE_COLUMNS
+
+_NAN = float('nan')
+
+
+def _column_value(health_data: Dict, key: str, field: str) -> float:
+    value = metric_value(health_data, key, field)
+    return _NAN if value is None else value
+
+
+class UserSeries:
+    """
+    One user's samples, sorted by timestamp
+
+    Timestamps live in an int64 array and each metric in a float64 array
+    (NaN = missing), about 100 bytes per sample. Old samples are dropped
+    from the front by advancing `start`; the arrays are compacted once
+    the dead prefix outgrows the live part.
+    """
+
+    __slots__ = ('timestamps', 'columns', 'start', 'latest_payload', 'latest_timestamp')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.columns = {name: array('d') for name in METRIC_COLUMNS}
+        self.start = 0
+        self.latest_payload: Optional[Dict] = None
+        self.latest_timestamp: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps) - self.start
+
+    def add(self, timestamp: int, health_data: Dict) -> None:
+        timestamps = self.timestamps
+        if len(timestamps) > self.start and timestamp < timestamps[-1]:
+            # Out-of-order sample (offline backlog): insert in place
+            position = bisect_right(timestamps, timestamp, self.start)
+            timestamps.insert(position, timestamp)
+            for name, (key, field) in METRIC_COLUMNS.items():
+                self.columns[name].insert(position, _column_value(health_data, key, field))
+        else:
+            timestamps.append(timestamp)
+            for name, (key, field) in METRIC_COLUMNS.items():
+                self.columns[name].append(_column_value(health_data, key, field))
+
+        if self.latest_timestamp is None or timestamp >= self.latest_timestamp:
+            self.latest_timestamp = timestamp
+            self.latest_payload = health_data
+
+    def drop_oldest(self, count: int) -> int:
+        count = min(count, len(self))
+        self.start += count
+        if self.start > len(self):
+            del self.timestamps[:self.start]
+            for column in self.columns.values():
+                del column[:self.start]
+            self.start = 0
+        return count
+
+    def drop_before(self, cutoff: int) -> int:
+        position = bisect_left(self.timestamps, cutoff, self.start)
+        return self.drop_oldest(position - self.start)
+
+    def range(self, start_ms: int, end_ms: int, metrics: Iterable[str]) -> Dict:
+        lo = bisect_left(self.timestamps, start_ms, self.start)
+        hi = bisect_right(self.timestamps, end_ms, lo)
+        result = {'timestamp': self.timestamps[lo:hi].tolist()}
+        for name in metrics:
+            result[name] = [None if math.isnan(v) else v for v in self.columns[name][lo:hi]]
+        return result
+
+
+class HealthStore:
+    """
+    Bounded store of per-user health time series
+
+    - `retention_ms`: samples older than the user's latest sample minus
+      this window are dropped
+    - `max_samples_per_user`: oldest samples are dropped beyond this
+    - `max_total_samples`: global cap; the least recently synced users
+      lose their oldest samples first
+    """
+
+    def __init__(self,
+                 retention_ms: int = 7 * 24 * 3600 * 1000,
+                 max_samples_per_user: int = 10000,
+                 max_total_samples: int = 500000):
+        self.retention_ms = retention_ms
+        self.max_samples_per_user = max_samples_per_user
+        self.max_total_samples = max_total_samples
+        self._users: "OrderedDict[str, UserSeries]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def add(self, user_id: str, timestamp: Optional[int], health_data: Dict) -> None:
+        self.add_many([(user_id, timestamp, health_data)])
+
+    def add_many(self, samples: Iterable[Tuple[str, Optional[int], Dict]]) -> None:
+        """
+        Store (user_id, timestamp, health_data) samples under one lock
+
+        Samples are sorted per user first so a replayed backlog appends
+        instead of inserting out of order.
+        """
+        now = int(time.time() * 1000)
+        by_user: Dict[str, list] = {}
+        for user_id, timestamp, health_data in samples:
+            timestamp = now if timestamp is None else int(timestamp)
+            by_user.setdefault(user_id, []).append((timestamp, health_data))
+
+        with self._lock:
+            for user_id, user_samples in by_user.items():
+                series = self._users.get(user_id)
+                if series is None:
+                    series = self._users[user_id] = UserSeries()
+                self._users.move_to_end(user_id)
+
+                user_samples.sort(key=lambda sample: sample[0])
+                for timestamp, health_data in user_samples:
+                    series.add(timestamp, health_data)
+                self._total += len(user_samples)
+
+                dropped = series.drop_before(series.latest_timestamp - self.retention_ms)
+                if len(series) > self.max_samples_per_user:
+                    dropped += series.drop_oldest(len(series) - self.max_samples_per_user)
+                self._total -= dropped
+
+            self._enforce_global_cap()
+
+    def _enforce_global_cap(self) -> None:
+        while self._total > self.max_total_samples and self._users:
+            user_id, series = next(iter(self._users.items()))
+            excess = self._total - self.max_total_samples
+            self._total -= series.drop_oldest(excess)
+            if len(series) == 0:
+                del self._users[user_id]
+
+    def latest(self, user_id: str) -> Optional[Dict]:
+        """Latest synced payload in O(1): {healthData, lastUpdated, syncTimestamp}"""
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is None or series.latest_payload is None:
+                return None
+            return {
+                'healthData': series.latest_payload,
+                'lastUpdated': series.latest_timestamp,
+                'syncTimestamp': series.latest_timestamp
+            }
+
+    def range(self,
+              user_id: str,
+              start_ms: int = 0,
+              end_ms: Optional[int] = None,
+              metrics: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """
+        Samples with start_ms <= timestamp <= end_ms, as columns
+
+        Binary search on the timestamp column makes this O(log n) plus the
+        size of the result. Missing values are returned as None.
+        """
+        if end_ms is None:
+            end_ms = 2 ** 63 - 1
+        names = list(metrics) if metrics else list(METRIC_COLUMNS)
+        unknown = [name for name in names if name not in METRIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is None:
+                return None
+            return series.range(start_ms, end_ms, names)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'samples': self._total,
+                'maxSamples': self.max_total_samples
+            }
@@ -0,0 +1,210 @@
+"""
+Incremental health trends for GAIA Backend
+Per-user exponentially weighted mean/variance, rolling percentiles and
+z-score anomaly flags, updated in O(1) on every sync and served without
+touching the sample history
+"""
+
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional, Tuple
+
+from health_schema import STORE_COLUMNS, metric_value
+
+# Vital signs tracked (flat names, see health_schema.STORE_COLUMNS) and the
+# smallest standard deviation used for z-scores, about one sensor step, so a
+# perfectly flat series still flags a jump instead of dividing by zero
+TREND_METRICS: Dict[str, float] = {
+    'heartRate': 1.0,               # bpm
+    'bloodPressureSystolic': 2.0,   # mmHg
+    'bloodPressureDiastolic': 2.0,  # mmHg
+    'oxygenSaturation': 0.5,        # percent
+    'bodyTemperature': 0.1,         # celsius
+    'stressLevel': 2.0,             # percent
+}
+
+PERCENTILES = (5, 50, 95)
+
+
+class MetricTrend:
+    """
+    Running statistics of one metric for one user
+
+    Mean and variance are exponentially weighted (weight `alpha` on the
+    newest sample). The z-score of a sample is taken against the mean and
+    variance *before* it is folded in, so a spike is measured against the
+    user's baseline (the deviation is floored at `min_std`). The last
+    `window` values are kept in a ring buffer (arrival order) and in a
+    sorted copy, updated by bisection, so percentiles are read directly.
+    """
+
+    __slots__ = ('min_std', 'mean', 'variance', 'count', 'last', 'z_score', 'window', 'ordered',
+                 'position')
+
+    def __init__(self, window: int, min_std: float):
+        self.min_std = min_std
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.last: Optional[float] = None
+        self.z_score: Optional[float] = None
+        self.window = array('d', bytes(8 * window))
+        self.ordered = array('d')
+        self.position = 0
+
+    def update(self, value: float, alpha: float) -> Optional[float]:
+        if self.count == 0:
+            self.mean = value
+            self.z_score = None
+        else:
+            self.z_score = (value - self.mean) / max(math.sqrt(self.variance), self.min_std)
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+
+        slot = self.position % len(self.window)
+        if self.position >= len(self.window):
+            # Evict the value this slot held from the sorted copy
+            del self.ordered[bisect_left(self.ordered, self.window[slot])]
+        self.window[slot] = value
+        insort(self.ordered, value)
+        self.position += 1
+        self.count += 1
+        self.last = value
+        return self.z_score
+
+    def percentiles(self) -> Dict[str, float]:
+        values = self.ordered
+        size = len(values)
+        if size == 0:
+            return {}
+        return {
+            f"p{p}": round(values[min(size - 1, int(round(p / 100 * (size - 1))))], 2)
+            for p in PERCENTILES
+        }
+
+
+class UserTrends:
+    __slots__ = ('metrics', 'anomalies', 'last_timestamp')
+
+    def __init__(self, window: int, max_anomalies: int):
+        self.metrics = {name: MetricTrend(window, min_std) for name, min_std in TREND_METRICS.items()}
+        self.anomalies: deque = deque(maxlen=max_anomalies)
+        self.last_timestamp: Optional[int] = None
+
+
+class TrendEngine:
+    """
+    Per-user trend statistics for the TREND_METRICS vitals
+
+    - `alpha`: EWMA weight of the newest sample
+    - `window`: samples kept per metric for percentiles
+    - `z_threshold`: |z| at or above which a sample is flagged
+    - `min_samples`: no flags until a metric has this many samples
+    - `max_users`: least recently synced users are dropped beyond this
+      (each user costs about 6 * window * 16 bytes)
+
+    Samples older than the user's last processed sample are ignored (the
+    history store keeps them; the running statistics assume time order).
+    """
+
+    def __init__(self,
+                 alpha: float = 0.1,
+                 window: int = 128,
+                 z_threshold: float = 3.0,
+                 min_samples: int = 20,
+                 max_anomalies: int = 20,
+                 max_users: int = 10000):
+        self.alpha = alpha
+        self.window = window
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.max_anomalies = max_anomalies
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserTrends]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, user_id: str, timestamp: Optional[int], health_data: Dict) -> None:
+        self.update_many([(user_id, timestamp, health_data)])
+
+    def update_many(self, samples: Iterable[Tuple[str, Optional[int], Dict]]) -> None:
+        """
+        Fold (user_id, timestamp, health_data) samples in, oldest first
+
+        Samples are the output of health_payload.normalize_sync_payload
+        (str user id, int milliseconds or None for now), the same validated
+        tuples the history store receives.
+        """
+        now = int(time.time() * 1000)
+        ordered = sorted(
+            ((user_id, now if timestamp is None else timestamp, health_data)
+             for user_id, timestamp, health_data in samples),
+            key=lambda sample: sample[1]
+        )
+
+        with self._lock:
+            for user_id, timestamp, health_data in ordered:
+                user = self._users.get(user_id)
+                if user is None:
+                    user = self._users[user_id] = UserTrends(self.window, self.max_anomalies)
+                    if len(self._users) > self.max_users:
+                        self._users.popitem(last=False)
+                self._users.move_to_end(user_id)
+
+                if user.last_timestamp is not None and timestamp < user.last_timestamp:
+                    continue
+                user.last_timestamp = timestamp
+
+                for name, trend in user.metrics.items():
+                    key, field = STORE_COLUMNS[name]
+                    value = metric_value(health_data, key, field)
+                    if value is None:
+                        continue
+                    z_score = trend.update(value, self.alpha)
+                    if (z_score is not None and trend.count > self.min_samples
+                            and abs(z_score) >= self.z_threshold):
+                        user.anomalies.append({
+                            'metric': name,
+                            'value': value,
+                            'zScore': round(z_score, 2),
+                            'timestamp': timestamp
+                        })
+
+    def trends(self, user_id: str) -> Optional[Dict]:
+        """Current statistics for user_id, or None if it never synced"""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+
+            metrics = {}
+            for name, trend in user.metrics.items():
+                if trend.count == 0:
+                    continue
+                std = math.sqrt(trend.variance)
+                anomaly = (trend.z_score is not None and trend.count > self.min_samples
+                           and abs(trend.z_score) >= self.z_threshold)
+                metrics[name] = {
+                    'mean': round(trend.mean, 2),
+                    'std': round(std, 2),
+                    'last': trend.last,
+                    'zScore': None if trend.z_score is None else round(trend.z_score, 2),
+                    'anomaly': anomaly,
+                    'count': trend.count,
+                    **trend.percentiles()
+                }
+
+            return {
+                'metrics': metrics,
+                'anomalies': list(user.anomalies),
+                'lastUpdated': user.last_timestamp
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'users': len(self._users)}
@@ -0,0 +1,119 @@
+"""
+Compact binary wire format for health syncs
+Optional alternative to JSON for /api/sync-health and /api/sync-health/batch,
+selected with `Content-Type: application/x-gaia-health`.
+
+One sample, all integers little-endian:
+
+    offset  size  field
+    0       2     magic b'GH'
+    2       1     version (1)
+    3       1     user id length N (bytes, UTF-8)
+    4       N     user id
+    4+N     8     timestamp, int64 milliseconds
+    12+N    2     metric bitmap, uint16 (bit i set = metric i present)
+    14+N    ...   present metrics in METRICS order, each in its own format
+
+Batch bodies are samples concatenated back to back. Decoding yields the
+flat mobile format ({userId, timestamp, heartRate, ...}), which then goes
+through the same normalization as JSON bodies.
+"""
+
+import struct
+from typing import Dict, List, Tuple
+
+CONTENT_TYPE = 'application/x-gaia-health'
+MAGIC = b'GH'
+VERSION = 1
+
+# (flat field name, struct format, scale): value on the wire = round(value * scale)
+METRICS: Tuple[Tuple[str, str, int], ...] = (
+    ('heartRate', 'H', 1),                # bpm
+    ('bloodPressureSystolic', 'H', 1),    # mmHg
+    ('bloodPressureDiastolic', 'H', 1),   # mmHg
+    ('bodyTemperature', 'h', 100),        # 0.01 celsius
+    ('steps', 'I', 1),
+    ('sleepDuration', 'H', 100),          # 0.01 hour
+    ('oxygenSaturation', 'H', 10),        # 0.1 percent
+    ('stressLevel', 'B', 1),              # percent
+    ('calories', 'I', 10),                # 0.1 kcal
+    ('distance', 'I', 1000),              # metres (value in km)
+    ('weight', 'H', 10),                  # 0.1 kg
+    ('height', 'H', 1000),                # millimetres (value in metres)
+)
+
+_HEADER = struct.Struct('<2sBB')
+_TIMESTAMP_BITMAP = struct.Struct('<qH')
+# Precompiled struct per metric
+_METRIC_STRUCTS = [(name, struct.Struct('<' + fmt), scale) for name, fmt, scale in METRICS]
+
+
+def encode_sample(sample: Dict) -> bytes:
+    """Encode a flat-format sample (the mobile JSON body) to bytes"""
+    user_id = str(sample['userId']).encode('utf-8')
+    if len(user_id) > 255:
+        raise ValueError('userId longer than 255 bytes')
+
+    bitmap = 0
+    fields = []
+    for bit, (name, packer, scale) in enumerate(_METRIC_STRUCTS):
+        value = sample.get(name)
+        if value is None:
+            continue
+        bitmap |= 1 << bit
+        fields.append(packer.pack(int(round(value * scale))))
+
+    return b''.join([
+        _HEADER.pack(MAGIC, VERSION, len(user_id)),
+        user_id,
+        _TIMESTAMP_BITMAP.pack(int(sample.get('timestamp') or 0), bitmap),
+        *fields
+    ])
+
+
+def decode_sample(buffer: bytes, offset: int = 0) -> Tuple[Dict, int]:
+    """
+    Decode one sample starting at `offset`
+
+    Returns:
+        (flat-format dict, offset of the next sample)
+
+    Raises:
+        ValueError: on a bad magic/version or truncated input
+    """
+    try:
+        magic, version, user_len = _HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a GAIA health sample (bad magic or version)')
+        offset += _HEADER.size
+
+        raw_user_id = bytes(buffer[offset:offset + user_len])
+        if len(raw_user_id) != user_len:
+            raise ValueError('Truncated sample')
+        user_id = raw_user_id.decode('utf-8')
+        offset += user_len
+
+        timestamp, bitmap = _TIMESTAMP_BITMAP.unpack_from(buffer, offset)
+        offset += _TIMESTAMP_BITMAP.size
+
+        sample = {'userId': user_id, 'timestamp': timestamp or None}
+        for bit, (name, packer, scale) in enumerate(_METRIC_STRUCTS):
+            if bitmap & (1 << bit):
+                (raw,) = packer.unpack_from(buffer, offset)
+                offset += packer.size
+                sample[name] = raw if scale == 1 else raw / scale
+    except (struct.error, UnicodeDecodeError):
+        raise ValueError('Truncated or malformed sample')
+
+    return sample, offset
+
+
+def decode_samples(buffer: bytes) -> List[Dict]:
+    """Decode a batch body of concatenated samples"""
+    samples = []
+    offset = 0
+    view = memoryview(buffer)
+    while offset < len(buffer):
+        sample, offset = decode_sample(view, offset)
+        samples.append(sample)
+    return samples
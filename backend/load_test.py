@@ -0,0 +1,137 @@
+"""
+Load test for GAIA Backend
+Hammers one endpoint with concurrent clients and reports requests/second
+and latency percentiles. Run it once against the dev server and once
+against gunicorn to compare:
+
+    python server.py                              # terminal 1
+    python load_test.py --url http://localhost:5000
+
+    gunicorn -c gunicorn.conf.py                  # terminal 1
+    python load_test.py --url http://localhost:5000
+
+Every client shares one address, so with the default rate limits nearly
+all requests get 429. Raise the limits of the server under test:
+
+    GAIA_RATE_IP="1000000/100000" GAIA_RATE_SYNC="1000000/100000" python server.py
+
+429 responses are counted separately and the run fails (exit status 1)
+when they exceed --max-limited of all responses.
+
+Only the standard library is used, so it runs anywhere the backend runs.
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+SYNC_PAYLOAD = {
+    'userId': 'load_test_user',
+    'heartRate': 72,
+    'bloodPressureSystolic': 120,
+    'bloodPressureDiastolic': 80,
+    'steps': 8543,
+    'oxygenSaturation': 98
+}
+
+
+def _worker(url, path, method, body, stop_at, latencies, errors, limited, lock):
+    parsed = urlparse(url)
+    # One keep-alive connection per client, like a phone or dashboard
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=10)
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    local_latencies = []
+    local_errors = 0
+    local_limited = 0
+
+    while time.monotonic() < stop_at:
+        payload = body
+        if method == 'POST' and path == '/api/sync-health':
+            payload = json.dumps(dict(SYNC_PAYLOAD, timestamp=int(time.time() * 1000)))
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 429:
+                local_limited += 1
+            elif response.status >= 400:
+                local_errors += 1
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=10)
+            continue
+        local_latencies.append(time.perf_counter() - start)
+
+    conn.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors[0] += local_errors
+        limited[0] += local_limited
+
+
+def run(url, path, method, concurrency, duration, max_limited=0.5):
+    """Run the test and print the report; False if 429s exceed max_limited"""
+    body = json.dumps(SYNC_PAYLOAD) if method == 'POST' else None
+    latencies = []
+    errors = [0]
+    limited = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    threads = [
+        threading.Thread(target=_worker, args=(url, path, method, body, stop_at, latencies, errors, limited,
+                                                 lock))
+        for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    limited_ratio = limited[0] / len(latencies) if latencies else 1.0
+    if limited_ratio > max_limited:
+        print(f"{limited[0]} of {len(latencies)} responses were 429 (rate limited): the run measures "
+              f"the limiter, not the endpoint. Restart the server with higher limits, e.g. "
+              f'GAIA_RATE_IP="1000000/100000" GAIA_RATE_SYNC="1000000/100000"')
+        return False
+
+    if not latencies:
+        print("No successful requests")
+        return False
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{method} {url}{path}  concurrency={concurrency}  duration={elapsed:.1f}s")
+    print(f"  requests:  {len(latencies)}  errors: {errors[0]}  rate limited: {limited[0]}")
+    print(f"  req/s:     {len(latencies) / elapsed:.1f}")
+    print(f"  latency:   mean {statistics.mean(latencies) * 1000:.1f} ms, "
+          f"p50 {percentile(0.50):.1f} ms, p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GAIA backend load test')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--path', default='/api/sync-health',
+                        help='endpoint to hit (POST for /api/sync-health, GET otherwise)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--max-limited', type=float, default=0.5,
+                        help='fail when more than this fraction of responses are 429')
+    args = parser.parse_args()
+
+    method = 'POST' if args.path == '/api/sync-health' else 'GET'
+    if not run(args.url.rstrip('/'), args.path, method, args.concurrency, args.duration, args.max_limited):
+        sys.exit(1)
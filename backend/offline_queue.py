@@ -0,0 +1,559 @@
+"""
+Store-and-forward queue for GAIA Backend
+Durable local spool for health_data / sync_history rows, so a sync never
+waits on (or is lost to) an unreachable database:
+
+    - SegmentLog: append-only segment files of length + CRC32 framed
+      records, with a persisted read cursor; a torn tail left by a crash
+      or power cut is detected by its checksum and truncated on restart
+    - StoreAndForward: appends rows locally (dedup by idempotency key) and
+      drains the log to the database in batches from a background thread,
+      with exponential backoff while the database is unreachable
+
+Rows are forwarded strictly in append order and a batch is only
+acknowledged once written, so each user's samples arrive in order and
+nothing is skipped. A crash between a write and its acknowledgement
+resends the batch, which the idempotency_key upsert makes harmless.
+"""
+
+import atexit
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+# Record framing: payload length, CRC32 of the payload
+_HEADER = struct.Struct('<II')
+_SUFFIX = '.seg'
+_CURSOR = 'cursor'
+
+Position = Tuple[int, int]   # (segment index, byte offset)
+
+
+def claim_directory(root: str, max_slots: int = 64) -> str:
+    """
+    Exclusive spool directory under root, one per process
+
+    Each gunicorn worker locks the first free `slot-<n>` subdirectory, so
+    workers never share segment files and a restarted worker picks up the
+    backlog a previous one left behind. The lock is released when the
+    process exits.
+    """
+    if fcntl is None:
+        os.makedirs(root, exist_ok=True)
+        return root
+    for slot in range(max_slots):
+        directory = os.path.join(root, f"slot-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        handle = open(os.path.join(directory, 'lock'), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        # Keep the handle (and the lock) for the life of the process
+        _claimed_locks.append(handle)
+        return directory
+    raise RuntimeError(f"No free spool slot under {root} ({max_slots} in use)")
+
+
+_claimed_locks: List = []
+
+
+class SegmentLog:
+    """
+    Append-only log of byte records in fixed-size segment files
+
+    `append_many` writes records to the active segment (a new one is
+    started past `segment_bytes`); `read_batch` reads from the cursor
+    through a kept-open read handle, record by record, and `ack` moves
+    the cursor and deletes fully consumed segments. Appends
+    are rejected once `max_bytes` are pending. With `fsync` every append
+    reaches the disk before returning; without it, only a process crash
+    is survived.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_bytes: int = 4 * 1024 * 1024,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 fsync: bool = True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.corrupted = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._sizes: Dict[int, int] = {}   # valid bytes per live segment
+        self.pending = 0
+        # Consumer side only (one reader at a time)
+        self._reader = None
+        self._reader_index: Optional[int] = None
+        self._recover()
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{index:012d}{_SUFFIX}")
+
+    # ---- recovery ----
+
+    def _recover(self) -> None:
+        indexes = sorted(
+            int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit()
+        )
+        cursor = self._load_cursor()
+        if cursor is None:
+            cursor = (indexes[0], 0) if indexes else (0, 0)
+        self._cursor = cursor
+
+        for index in indexes:
+            if index < cursor[0]:
+                os.remove(self._path(index))
+        indexes = [index for index in indexes if index >= cursor[0]]
+
+        for index in indexes:
+            start = cursor[1] if index == cursor[0] else 0
+            end = start
+            for end, _ in self._scan(index, start):
+                self.pending += 1
+            size = os.path.getsize(self._path(index))
+            if end < size:
+                # Torn or corrupted tail: the rest of the segment is unreadable
+                self.corrupted += 1
+                if index == indexes[-1]:
+                    with open(self._path(index), 'r+b') as handle:
+                        handle.truncate(end)
+            self._sizes[index] = end
+
+        self._active = indexes[-1] if indexes else cursor[0]
+        self._file = open(self._path(self._active), 'ab')
+        self._sizes[self._active] = self._file.tell()
+
+    def _load_cursor(self) -> Optional[Position]:
+        try:
+            with open(os.path.join(self.directory, _CURSOR)) as handle:
+                index, offset = handle.read().split()
+            return int(index), int(offset)
+        except (OSError, ValueError):
+            return None
+
+    def _scan(self, index: int, offset: int, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """Yield (offset after record, payload) for valid records from offset"""
+        with open(self._path(index), 'rb') as handle:
+            handle.seek(offset)
+            data = handle.read() if end is None else handle.read(end - offset)
+        position = 0
+        while position + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, position)
+            start = position + _HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            position = start + length
+            yield offset + position, payload
+
+    # ---- producer ----
+
+    def append_many(self, payloads: List[bytes]) -> bool:
+        """Append records durably; False if the log is full"""
+        frames = b''.join(_HEADER.pack(len(p), zlib.crc32(p)) + p for p in payloads)
+        with self._lock:
+            # Pending bytes: the cursor segment's acknowledged prefix is not counted
+            pending_bytes = sum(self._sizes.values()) - self._cursor[1]
+            if pending_bytes + len(frames) > self.max_bytes:
+                return False
+            if self._sizes[self._active] >= self.segment_bytes:
+                self._rotate()
+            self._file.write(frames)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._sizes[self._active] += len(frames)
+            self.pending += len(payloads)
+        return True
+
+    def _rotate(self) -> None:
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._active += 1
+        self._file = open(self._path(self._active), 'ab')
+        self._sizes[self._active] = 0
+
+    # ---- consumer ----
+
+    def _reader_at(self, index: int, offset: int):
+        if self._reader_index != index:
+            self._close_reader()
+            self._reader = open(self._path(index), 'rb')
+            self._reader_index = index
+        if self._reader.tell() != offset:
+            self._reader.seek(offset)
+        return self._reader
+
+    def _close_reader(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = None
+        self._reader_index = None
+
+    def read_batch(self, max_records: int) -> Tuple[List[bytes], Position]:
+        """
+        Up to max_records payloads from the cursor, and the position after them
+
+        Only the records returned are read: the handle stays open at the
+        end of the batch, so draining a segment costs one pass over it.
+        """
+        index, offset = self._cursor
+        payloads: List[bytes] = []
+        while len(payloads) < max_records:
+            with self._lock:
+                end = self._sizes.get(index)
+                active = self._active
+            if end is None:
+                break
+            reader = self._reader_at(index, offset)
+            while offset + _HEADER.size <= end and len(payloads) < max_records:
+                header = reader.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, checksum = _HEADER.unpack(header)
+                payload = reader.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                offset += _HEADER.size + length
+                payloads.append(payload)
+            if len(payloads) >= max_records or index >= active:
+                break
+            index, offset = index + 1, 0
+        return payloads, (index, offset)
+
+    def ack(self, position: Position, count: int) -> None:
+        """Mark everything before position consumed"""
+        temporary = os.path.join(self.directory, _CURSOR + '.tmp')
+        with open(temporary, 'w') as handle:
+            handle.write(f"{position[0]} {position[1]}")
+            handle.flush()
+            if self.fsync:
+                os.fsync(handle.fileno())
+        os.replace(temporary, os.path.join(self.directory, _CURSOR))
+
+        with self._lock:
+            self._cursor = position
+            self.pending -= count
+            consumed = [index for index in self._sizes if index < position[0]]
+            for index in consumed:
+                del self._sizes[index]
+        if self._reader_index is not None and self._reader_index < position[0]:
+            self._close_reader()
+        for index in consumed:
+            try:
+                os.remove(self._path(index))
+            except OSError:
+                pass
+
+    def iter_pending(self) -> Iterator[bytes]:
+        """Every unconsumed payload, oldest first (reads from disk)"""
+        index, offset = self._cursor
+        with self._lock:
+            indexes = sorted(i for i in self._sizes if i >= index)
+            sizes = dict(self._sizes)
+        for segment in indexes:
+            start = offset if segment == index else 0
+            for _, payload in self._scan(segment, start, sizes[segment]):
+                yield payload
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'bytes': sum(self._sizes.values()),
+                'segments': len(self._sizes),
+                'corrupted': self.corrupted
+            }
+
+    def close(self) -> None:
+        self._close_reader()
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def _encode(table: str, row: Dict) -> bytes:
+    return json.dumps([table, row], separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _decode(payload: bytes) -> Tuple[str, Dict]:
+    table, row = json.loads(payload)
+    return table, row
+
+
+class StoreAndForward:
+    """
+    Durable drop-in for WriteBuffer
+
+    `enqueue` appends to a SegmentLog (local disk only, so request latency
+    never depends on the database) and a background thread hands the
+    rows to `send_fn(table, rows)` in batches of `batch_size`, oldest
+    first. On failure the same batch is retried after an exponential
+    backoff (`base_delay` doubling up to `max_delay`, with jitter);
+    nothing is dropped while the database is unreachable.
+
+    A batch that keeps failing while `probe()` (a cheap query) succeeds is
+    bad data rather than an outage: after `poison_after` failures its rows
+    are sent one by one and the ones still rejected are moved to the
+    `dead-letter` log next to the spool, so one bad row cannot block the
+    queue.
+
+    Rows whose idempotency_key was already queued (a retried sync) are
+    acknowledged without being stored again; the last `dedup_window` keys
+    are remembered.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 send_fn: Callable[[str, List[Dict]], None],
+                 probe: Optional[Callable[[], None]] = None,
+                 batch_size: int = 500,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 poison_after: int = 3,
+                 dedup_window: int = 100000,
+                 idle_interval: float = 1.0,
+                 **log_options):
+        self.send_fn = send_fn
+        self.probe = probe
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poison_after = poison_after
+        self.dedup_window = dedup_window
+        self.idle_interval = idle_interval
+
+        self.log = SegmentLog(directory, **log_options)
+        self._dead_letter: Optional[SegmentLog] = None
+        self._dead_letter_dir = os.path.join(directory, 'dead-letter')
+
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        for payload in self.log.iter_pending():
+            self._remember(_decode(payload)[1].get('idempotency_key'))
+
+        self._lock = threading.Lock()          # enqueue: dedup + append
+        self._space = threading.Condition(self._lock)  # notified when a batch is acknowledged
+        self._forward_lock = threading.Lock()  # one drain at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+        self.last_error: Optional[str] = None
+
+        self.stats = {
+            'enqueued': 0,
+            'duplicates': 0,
+            'rejected': 0,
+            'written': 0,
+            'batches': 0,
+            'retries': 0,
+            'deadLettered': 0
+        }
+
+    def _remember(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.dedup_window:
+            self._recent.popitem(last=False)
+
+    # ==================== PRODUCER SIDE ====================
+
+    def enqueue(self, table: str, row: Dict, timeout: float = 0.05) -> bool:
+        """Append a row to the spool; False only if the spool stayed full for `timeout` seconds"""
+        return self.enqueue_many([(table, row)], timeout)
+
+    def _fresh(self, items: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+        """Items whose idempotency_key is neither queued already nor repeated"""
+        fresh = []
+        keys = set()
+        for table, row in items:
+            key = row['idempotency_key']
+            if key in self._recent or key in keys:
+                continue
+            keys.add(key)
+            fresh.append((table, row))
+        return fresh
+
+    def enqueue_many(self, items: Iterable[Tuple[str, Dict]], timeout: float = 0.05) -> bool:
+        """
+        Append rows in one write (and one fsync)
+
+        When the spool is full, waits at most `timeout` seconds for the
+        forwarder to free space (backpressure, as WriteBuffer), then
+        returns False.
+        """
+        items = list(items)
+        for _, row in items:
+            if 'idempotency_key' not in row:
+                raise ValueError("row must carry an idempotency_key")
+
+        self._ensure_started()
+        deadline = time.monotonic() + timeout
+
+        with self._space:
+            while True:
+                fresh = self._fresh(items)
+                if not fresh or self.log.append_many([_encode(table, row) for table, row in fresh]):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['rejected'] += len(fresh)
+                    return False
+                self._wake.set()
+                self._space.wait(remaining)
+            self.stats['duplicates'] += len(items) - len(fresh)
+            if not fresh:
+                return True
+            for table, row in fresh:
+                self._remember(row['idempotency_key'])
+            self.stats['enqueued'] += len(fresh)
+
+        self._wake.set()
+        return True
+
+    def pending(self) -> int:
+        """Number of rows waiting to be forwarded"""
+        return self.log.pending
+
+    # ==================== CONSUMER SIDE ====================
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='gaia-store-and-forward', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            forwarded = self._forward_once()
+            if forwarded is None:
+                self._stop.wait(self._backoff())
+            elif forwarded == 0:
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
+
+    def _backoff(self) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (self._failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _forward_once(self) -> Optional[int]:
+        """Forward one batch; rows forwarded, 0 if idle, None on failure"""
+        with self._forward_lock:
+            payloads, position = self.log.read_batch(self.batch_size)
+            if not payloads:
+                return 0
+            records = [_decode(payload) for payload in payloads]
+
+            try:
+                self._send(records)
+            except Exception as e:
+                self._failures += 1
+                self.stats['retries'] += 1
+                self.last_error = str(e)
+                if self._failures < self.poison_after or not self._reachable():
+                    return None
+                try:
+                    self._isolate(records)
+                except Exception as e:
+                    self.last_error = str(e)
+                    return None
+
+            self.log.ack(position, len(records))
+            with self._space:
+                self._space.notify_all()
+            self._failures = 0
+            self.last_error = None
+            self.stats['written'] += len(records)
+            self.stats['batches'] += 1
+            return len(records)
+
+    def _send(self, records: List[Tuple[str, Dict]]) -> None:
+        # One bulk write per table; rows keep their append order
+        tables: Dict[str, List[Dict]] = {}
+        for table, row in records:
+            tables.setdefault(table, []).append(row)
+        for table, rows in tables.items():
+            self.send_fn(table, rows)
+
+    def _reachable(self) -> bool:
+        if self.probe is None:
+            return False
+        try:
+            self.probe()
+            return True
+        except Exception:
+            return False
+
+    def _isolate(self, records: List[Tuple[str, Dict]]) -> None:
+        """Send rows one by one; dead-letter the ones that still fail"""
+        rejected = []
+        for table, row in records:
+            try:
+                self.send_fn(table, [row])
+            except Exception:
+                rejected.append((table, row))
+        if not rejected:
+            return
+        if self._dead_letter is None:
+            self._dead_letter = SegmentLog(self._dead_letter_dir, fsync=self.log.fsync)
+        if not self._dead_letter.append_many([_encode(table, row) for table, row in rejected]):
+            raise RuntimeError("dead-letter log full")
+        self.stats['deadLettered'] += len(rejected)
+
+    def flush(self) -> bool:
+        """Forward everything now; False if the database could not be reached"""
+        while True:
+            forwarded = self._forward_once()
+            if forwarded is None:
+                return False
+            if forwarded == 0:
+                return True
+
+    def close(self, timeout: float = 10.0):
+        """Stop the forwarder; unsent rows stay on disk for the next start"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.log.close()
+        if self._dead_letter is not None:
+            self._dead_letter.close()
+
+    def register_shutdown_flush(self):
+        """Close the spool cleanly when the interpreter exits"""
+        atexit.register(self.close)
+
+    def status(self) -> Dict:
+        return {
+            **self.stats,
+            **self.log.stats(),
+            'consecutiveFailures': self._failures,
+            'lastError': self.last_error
+        }
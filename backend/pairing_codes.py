@@ -0,0 +1,233 @@
+"""
+Pairing code helpers for GAIA Backend
+Code generation, an in-memory store with the same consume-once semantics
+as the Supabase pairing_codes table (used for tests and local runs), and
+the waiter registry behind the long-poll pairing endpoint
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+PAIRING_CODE_LENGTH = 6
+PAIRING_CODE_TTL = timedelta(minutes=10)
+
+
+def generate_pairing_code() -> str:
+    """Random 6-digit code, zero padded"""
+    return f"{secrets.randbelow(10 ** PAIRING_CODE_LENGTH):0{PAIRING_CODE_LENGTH}d}"
+
+
+class InMemoryPairingCodeStore:
+    """
+    Thread-safe local stand-in for the pairing_codes table
+
+    `consume` validates and marks a code used under one lock, mirroring
+    the single conditional UPDATE used by supabase_client, so only one of
+    several concurrent callers can redeem a given code.
+    """
+
+    def __init__(self, ttl: timedelta = PAIRING_CODE_TTL):
+        self.ttl = ttl
+        self._codes: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: str, max_attempts: int = 5) -> Optional[str]:
+        """Create a fresh code for user_id; None if no free code was found"""
+        now = datetime.utcnow()
+        with self._lock:
+            for _ in range(max_attempts):
+                code = generate_pairing_code()
+                existing = self._codes.get(code)
+                # Expired or used codes can be recycled
+                if existing and not existing['used'] and existing['expires_at'] > now:
+                    continue
+                self._codes[code] = {
+                    'user_id': user_id,
+                    'used': False,
+                    'created_at': now,
+                    'expires_at': now + self.ttl
+                }
+                return code
+        return None
+
+    def consume(self, code: str) -> Optional[str]:
+        """Atomically validate and mark a code used; returns its user_id"""
+        now = datetime.utcnow()
+        with self._lock:
+            pairing = self._codes.get(code)
+            if not pairing or pairing['used'] or pairing['expires_at'] <= now:
+                return None
+            pairing['used'] = True
+            return pairing['user_id']
+
+    def purge_expired(self) -> int:
+        """Drop used and expired codes; returns how many were removed"""
+        now = datetime.utcnow()
+        with self._lock:
+            stale = [
+                code for code, pairing in self._codes.items()
+                if pairing['used'] or pairing['expires_at'] <= now
+            ]
+            for code in stale:
+                del self._codes[code]
+            return len(stale)
+
+
+class TooManyWaiters(Exception):
+    """
+    The per-code (scope 'code') or server-wide (scope 'server') waiter
+    limit is reached; retry after `retry_after` seconds
+    """
+
+    def __init__(self, message: str, scope: str, retry_after: float):
+        super().__init__(message)
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class _CodeWaiters:
+    __slots__ = ('event', 'user_id', 'waiters', 'rejections', 'expires_at')
+
+    def __init__(self, expires_at: float):
+        self.event = threading.Event()
+        self.user_id: Optional[str] = None
+        self.waiters = 0
+        self.rejections = 0   # consecutive, for the Retry-After backoff
+        self.expires_at = expires_at
+
+
+class PairingWaiters:
+    """
+    Parks "wait for pairing" requests on a per-code event
+
+    Only codes issued by the server (`register`) can be waited on, so
+    made-up codes cannot push real ones out. The dashboard waits on its
+    code; `notify` (called when the phone confirms) wakes every waiter at
+    once with the paired user_id. A code stays registered until its own
+    expiry (`ttl` after issue by default), so a waiter arriving just after
+    the confirmation returns immediately, and waiters of an expired code
+    are released. Waiters are bounded per code and overall, since each one
+    holds a server thread, and at most `max_codes` codes are tracked
+    (oldest dropped first).
+
+    Rejected waiters are told when to retry: `retry_after` doubles with
+    each consecutive rejection (of the code, or server-wide) up to
+    `max_retry_after`, so refused dashboards spread out instead of
+    retrying in step.
+    """
+
+    def __init__(self,
+                 max_waiters_per_code: int = 4,
+                 max_total_waiters: int = 16,
+                 max_codes: int = 10000,
+                 ttl: timedelta = PAIRING_CODE_TTL,
+                 retry_after: float = 1.0,
+                 max_retry_after: float = 30.0):
+        self.max_waiters_per_code = max_waiters_per_code
+        self.max_total_waiters = max_total_waiters
+        self.max_codes = max_codes
+        self.ttl = ttl.total_seconds()
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self._codes: "OrderedDict[str, _CodeWaiters]" = OrderedDict()
+        self._total = 0
+        self._overflows = 0   # consecutive server-wide rejections
+        self._lock = threading.Lock()
+
+    def _backoff(self, rejections: int) -> float:
+        return min(self.max_retry_after, self.retry_after * 2 ** min(rejections - 1, 16))
+
+    def _entry(self, code: str, now: float) -> Optional[_CodeWaiters]:
+        """Live entry for code; None if it was never issued or has expired (lock held)"""
+        entry = self._codes.get(code)
+        if entry is not None and entry.expires_at <= now:
+            del self._codes[code]
+            entry.event.set()
+            return None
+        return entry
+
+    def register(self, code: str, expires_in: Optional[float] = None) -> bool:
+        """
+        Track an issued code until it expires (`expires_in` seconds from
+        now, default `ttl`); False if the code is already live
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._entry(code, now) is not None:
+                return False
+            self._codes[code] = _CodeWaiters(now + (self.ttl if expires_in is None else expires_in))
+            if len(self._codes) > self.max_codes:
+                _, oldest = self._codes.popitem(last=False)
+                oldest.event.set()
+            return True
+
+    def known(self, code: str) -> bool:
+        """True if code was issued and has not expired"""
+        with self._lock:
+            return self._entry(code, time.monotonic()) is not None
+
+    def wait(self, code: str, timeout: float) -> Optional[str]:
+        """
+        Block until `code` is paired or `timeout` seconds pass
+
+        Returns the paired user_id, or None on timeout / expiry (and at
+        once for codes that were never registered).
+
+        Raises:
+            TooManyWaiters: if the code or the server already has the
+                maximum number of parked requests (see its scope)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry(code, now)
+            if entry is None:
+                return None
+            if entry.user_id is not None:
+                return entry.user_id
+            if entry.waiters >= self.max_waiters_per_code:
+                entry.rejections += 1
+                raise TooManyWaiters(f"waiter limit reached for code {code}", 'code',
+                                     self._backoff(entry.rejections))
+            if self._total >= self.max_total_waiters:
+                self._overflows += 1
+                raise TooManyWaiters("server-wide waiter limit reached", 'server',
+                                     self._backoff(self._overflows))
+            entry.rejections = 0
+            self._overflows = 0
+            entry.waiters += 1
+            self._total += 1
+
+        try:
+            entry.event.wait(min(timeout, max(0.0, entry.expires_at - now)))
+            return entry.user_id
+        finally:
+            with self._lock:
+                entry.waiters -= 1
+                self._total -= 1
+
+    def notify(self, code: str, user_id: str) -> int:
+        """Record the pairing and wake every waiter; returns how many were waiting"""
+        with self._lock:
+            entry = self._entry(code, time.monotonic())
+            if entry is None:
+                return 0
+            entry.user_id = user_id
+            entry.event.set()
+            return entry.waiters
+
+    def purge_expired(self) -> int:
+        """Drop expired codes and release their waiters; returns how many were dropped"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [code for code, entry in self._codes.items() if entry.expires_at <= now]
+            for code in expired:
+                self._codes.pop(code).event.set()
+        return len(expired)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'codes': len(self._codes), 'waiters': self._total}
@@ -0,0 +1,242 @@
+"""
+Rate limiting for GAIA Backend
+Token buckets per (rule, client) with an in-memory or shared (Redis)
+store, and a Flask decorator answering 429 with Retry-After. The cap on
+concurrent LLM calls lives in resilience.ConcurrencyLimiter.
+
+Usage:
+    limiter = RateLimiter(create_bucket_store(), {'sync': Limit.per_minute(120, burst=30)})
+
+    @app.route('/api/sync-health', methods=['POST'])
+    @rate_limited(limiter, 'sync', key=user_or_ip)
+    def sync_health(): ...
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional
+
+from flask import g, jsonify, request
+
+from structured_logging import get_logger
+
+logger = get_logger('rate_limit')
+
+# Only trust X-Forwarded-For when a reverse proxy sets it; otherwise any
+# client could pick its own rate-limit key
+TRUST_PROXY = os.getenv('GAIA_TRUST_PROXY', '0') == '1'
+
+
+class Limit(NamedTuple):
+    rate: float    # tokens refilled per second
+    burst: int     # bucket capacity
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: int) -> 'Limit':
+        return cls(requests / 60.0, burst)
+
+    @classmethod
+    def from_env(cls, name: str, requests_per_minute: float, burst: int) -> 'Limit':
+        """Read `GAIA_RATE_<NAME>` as "<requests per minute>/<burst>", e.g. "120/30" """
+        raw = os.getenv(f"GAIA_RATE_{name.upper()}")
+        if raw:
+            per_minute, _, raw_burst = raw.partition('/')
+            requests_per_minute = float(per_minute)
+            burst = int(raw_burst) if raw_burst else burst
+        return cls.per_minute(requests_per_minute, burst)
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    retry_after: float   # seconds until `cost` tokens are available (0 if allowed)
+    remaining: float     # tokens left in the bucket
+
+
+# ==================== BUCKET STORES ====================
+
+class InMemoryBucketStore:
+    """
+    Token buckets in a dict, for a single process
+
+    At most `max_keys` buckets are kept; the least recently used ones are
+    evicted (an evicted client simply starts again with a full bucket).
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: Limit, cost: float = 1) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(limit.burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return Decision(True, 0.0, bucket[0])
+            return Decision(False, (cost - bucket[0]) / limit.rate, bucket[0])
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Refill + take in one round trip; uses the Redis clock so all workers agree
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry), tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets shared by every worker and host through Redis
+
+    Any client exposing `register_script` (redis-py) works. If Redis is
+    unreachable the request is allowed (fail open) and counted in
+    `errors`, so an outage of the limiter never takes the API down.
+    """
+
+    def __init__(self, client, prefix: str = 'gaia:rl:'):
+        self.prefix = prefix
+        self.errors = 0
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def consume(self, key: str, limit: Limit, cost: float = 1) -> Decision:
+        try:
+            allowed, retry_after, remaining = self._script(
+                keys=[self.prefix + key],
+                args=[limit.rate, limit.burst, cost]
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            return Decision(True, 0.0, float(limit.burst))
+        return Decision(bool(int(allowed)), float(retry_after), float(remaining))
+
+
+def create_bucket_store():
+    """Redis store when GAIA_RATE_LIMIT_REDIS_URL is set, in-memory otherwise"""
+    url = os.getenv('GAIA_RATE_LIMIT_REDIS_URL')
+    if not url:
+        return InMemoryBucketStore(max_keys=int(os.getenv('GAIA_RATE_LIMIT_MAX_KEYS', '100000')))
+    import redis
+    return RedisBucketStore(redis.Redis.from_url(url, socket_timeout=0.05))
+
+
+# ==================== LIMITERS ====================
+
+class RateLimiter:
+    """Named token-bucket rules applied per client key, with counters"""
+
+    def __init__(self, store, rules: Dict[str, Limit]):
+        self.store = store
+        self.rules = dict(rules)
+        self._stats = {name: {'allowed': 0, 'limited': 0} for name in self.rules}
+        self._stats_lock = threading.Lock()
+
+    def check(self, rule: str, key: str, cost: float = 1) -> Decision:
+        decision = self.store.consume(f"{rule}:{key}", self.rules[rule], cost)
+        with self._stats_lock:
+            self._stats[rule]['allowed' if decision.allowed else 'limited'] += 1
+        return decision
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = {name: dict(counts) for name, counts in self._stats.items()}
+        if isinstance(self.store, RedisBucketStore):
+            stats['storeErrors'] = self.store.errors
+        return stats
+
+
+# ==================== FLASK ====================
+
+def client_ip() -> str:
+    """Client address (first X-Forwarded-For hop when GAIA_TRUST_PROXY=1)"""
+    if TRUST_PROXY:
+        forwarded = request.headers.get('X-Forwarded-For', '').split(',')[0].strip()
+        if forwarded:
+            return forwarded
+    return request.remote_addr or 'unknown'
+
+
+def _request_user_id() -> Optional[str]:
+    """userId of the query string or JSON object body, if any"""
+    user_id = request.args.get('userId')
+    if not user_id and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            user_id = body.get('userId')
+    if user_id is None or isinstance(user_id, (dict, list)):
+        return None
+    return str(user_id)[:128] or None
+
+
+def user_or_ip() -> str:
+    """Authenticated user (token subject), else the request's userId, else the client address
+
+    Tokens are optional unless GAIA_AUTH_REQUIRED=1, and phones behind one
+    NAT or proxy share an address, so unauthenticated requests are keyed
+    on their userId. A client rotating it gets a fresh bucket each time:
+    the API-wide per-address rule (`ip`) still caps it.
+    """
+    claims = g.get('auth')
+    if claims:
+        return f"user:{claims['sub']}"
+    user_id = _request_user_id()
+    return f"anon:{user_id}" if user_id else f"ip:{client_ip()}"
+
+
+def too_many_requests(decision: Decision):
+    retry_after = max(1, math.ceil(decision.retry_after))
+    response = jsonify({
+        'success': False,
+        'error': 'Too many requests',
+        'retryAfter': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(limiter: RateLimiter, rule: str, key: Callable[[], str] = client_ip):
+    """Decorator: answer 429 with Retry-After when the client's bucket is empty"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            decision = limiter.check(rule, key())
+            if not decision.allowed:
+                return too_many_requests(decision)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,30 +1,80 @@
 import os
-from google import genai
-from google.genai import types
+import queue
+import threading
+import time
+
 from dotenv import load_dotenv
 
+from fallback_recommendations import rule_based_recommendations
+from recommendation_cache import RecommendationCache, profile_key
+from resilience import (BoundedExecutor, CircuitBreaker, CircuitOpen, ConcurrencyLimiter,
+                        DeadlineExceeded, Overloaded, call_with_deadline)
+from structured_logging import get_logger
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Gemini client with API key from environment
-api_key = os.getenv('GOOGLE_API_KEY')
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found in environment variables. Please create a .env file with your API key.")
+logger = get_logger('recommendations')
+
+# Gemini client is built on first use: importing google-genai and creating
+# the client is the bulk of this module's cost, and most processes that
+# import it (tests, workers serving other endpoints) never call the model
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Shared Gemini client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv('GOOGLE_API_KEY')
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not found in environment variables. Please create a .env file with your API key.")
+                from google import genai
+                _client = genai.Client(api_key=api_key)
+    return _client
+
+MODEL_NAME = "gemini-2.0-flash-exp"
+
+# Responses are cached per bucketed profile (see recommendation_cache.profile_key)
+recommendation_cache = RecommendationCache(
+    maxsize=int(os.getenv('GAIA_RECO_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('GAIA_RECO_CACHE_TTL', str(6 * 3600))),
+    disk_dir=os.getenv('GAIA_RECO_CACHE_DIR') or None
+)
+
+# Latency budget for one recommendation request (seconds) and retry policy;
+# past the deadline the rule-based engine answers instead of Gemini
+GENERATION_DEADLINE = float(os.getenv('GAIA_RECO_DEADLINE', '4.0'))
+GENERATION_ATTEMPTS = int(os.getenv('GAIA_RECO_ATTEMPTS', '3'))
+
+model_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('GAIA_RECO_BREAKER_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('GAIA_RECO_BREAKER_RESET', '30'))
+)
+# Attempts abandoned at their deadline keep a worker until Gemini answers;
+# past 16 outstanding calls new attempts are refused (Overloaded)
+_model_executor = BoundedExecutor(max_workers=8, max_pending=16, thread_name_prefix='gemini')
+
+# Streams must produce their first chunk within STREAM_FIRST_TOKEN_DEADLINE
+# seconds and finish within STREAM_DEADLINE seconds
+STREAM_FIRST_TOKEN_DEADLINE = float(os.getenv('GAIA_STREAM_FIRST_TOKEN_DEADLINE', str(GENERATION_DEADLINE)))
+STREAM_DEADLINE = float(os.getenv('GAIA_STREAM_DEADLINE', '30'))
 
-client = genai.Client(api_key=api_key)
+# Global cap on concurrent Gemini requests (generation and streams); a caller
+# waits at most LLM_QUEUE_TIMEOUT seconds for a slot before falling back.
+# A slot stays taken until Gemini answers, even if the caller gave up.
+llm_slots = ConcurrencyLimiter(int(os.getenv('GAIA_LLM_MAX_CONCURRENCY', '4')))
+LLM_QUEUE_TIMEOUT = float(os.getenv('GAIA_LLM_QUEUE_TIMEOUT', '0.5'))
 
-def generate_recommendations(user_data):
+def extract_features(user_data):
     """
-    Generate AI recommendations based on user data
-    
-    Args:
-        user_data (dict): Dictionary containing:
-            - personal: {age, height, weight} (optional)
-            - healthAverages: {steps, calories, distance, sleepDuration, heartBeat}
-            - googleFitData: {steps, calories, distance, sleepDuration, heartRate}
+    Pull the metrics used by the prompt out of a request body
     
     Returns:
-        str: AI-generated recommendations
+        dict: gender, age, height, weight, bmi, steps, calories, distance,
+              sleep_duration, heart_rate
     """
     # Extract data
     personal = user_data.get('personal', {})
@@ -49,6 +99,32 @@ def generate_recommendations(user_data):
         height_m = height / 100
         bmi = weight / (height_m ** 2)
     
+    return {
+        'gender': gender,
+        'age': age,
+        'height': height,
+        'weight': weight,
+        'bmi': bmi,
+        'steps': steps,
+        'calories': calories,
+        'distance': distance,
+        'sleep_duration': sleep_duration,
+        'heart_rate': heart_rate
+    }
+
+def build_prompt(features):
+    """Build the Gemini prompt from extract_features() output"""
+    gender = features['gender']
+    age = features['age']
+    height = features['height']
+    weight = features['weight']
+    bmi = features['bmi']
+    steps = features['steps']
+    calories = features['calories']
+    distance = features['distance']
+    sleep_duration = features['sleep_duration']
+    heart_rate = features['heart_rate']
+    
     # Gender-specific normal ranges
     gender_label = "Male" if gender == 'male' else "Female"
     
@@ -119,13 +195,264 @@ LIFESTYLE RECOMMENDATIONS:
 
 Keep it concise and impactful. No extra text."""
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-exp",
-        contents=prompt
+    return prompt
+
+def _call_model(features):
+    response = get_client().models.generate_content(
+        model=MODEL_NAME,
+        contents=build_prompt(features)
     )
-    
     return response.text
 
+def generate_recommendations(user_data, deadline=None, allow_fallback=True):
+    """
+    Generate AI recommendations based on user data
+    
+    Equivalent profiles are served from recommendation_cache; concurrent
+    requests for the same profile share a single Gemini call. Gemini gets
+    `deadline` seconds (retries included); if it misses the deadline, fails,
+    the circuit breaker is open or every LLM slot is busy, rule-based
+    recommendations are returned instead and are not cached.
+    
+    Args:
+        user_data (dict): Dictionary containing:
+            - personal: {age, height, weight} (optional)
+            - healthAverages: {steps, calories, distance, sleepDuration, heartBeat}
+            - googleFitData: {steps, calories, distance, sleepDuration, heartRate}
+        deadline (float): latency budget in seconds (default GENERATION_DEADLINE)
+        allow_fallback (bool): if False, model errors are raised instead of
+            answered by the rule-based engine
+    
+    Returns:
+        str: AI-generated recommendations
+    """
+    features = extract_features(user_data)
+    budget = GENERATION_DEADLINE if deadline is None else deadline
+    deadline_at = time.monotonic() + budget
+
+    def generate():
+        return call_with_deadline(
+            lambda: _call_model(features),
+            _model_executor,
+            deadline_at,
+            max_attempts=GENERATION_ATTEMPTS,
+            breaker=model_breaker,
+            slots=llm_slots,
+            slot_timeout=LLM_QUEUE_TIMEOUT
+        )
+
+    try:
+        # Joining another request's call waits no longer than our own deadline
+        return recommendation_cache.get_or_compute(
+            profile_key(features), generate, timeout=max(0.0, deadline_at - time.monotonic())
+        )
+    except Exception as e:
+        if not allow_fallback:
+            raise
+        logger.warning("Gemini unavailable (%s: %s), using rule-based recommendations", type(e).__name__, e)
+        return rule_based_recommendations(features)
+
+def generate_uncached(user_data, deadline, executor, slots=None, slot_timeout=0.0):
+    """
+    Gemini recommendations for user_data, bypassing recommendation_cache
+    
+    For callers that bring their own capacity (the batch job): attempts run
+    on `executor`, bounded by `slots` if given, instead of the pool and LLM
+    slots sized for interactive requests. The circuit breaker is shared.
+    Errors are raised, never answered by the rule-based engine.
+    
+    Args:
+        user_data (dict): same as generate_recommendations
+        deadline (float): latency budget in seconds (retries included)
+        executor (BoundedExecutor): runs the Gemini calls
+    """
+    features = extract_features(user_data)
+    return call_with_deadline(
+        lambda: _call_model(features),
+        executor,
+        time.monotonic() + deadline,
+        max_attempts=GENERATION_ATTEMPTS,
+        breaker=model_breaker,
+        slots=slots,
+        slot_timeout=slot_timeout
+    )
+
+# ==================== STREAMING ====================
+
+SECTION_HEADERS = {
+    'HEALTH RECOMMENDATIONS': 'health',
+    'FITNESS RECOMMENDATIONS': 'fitness',
+    'LIFESTYLE RECOMMENDATIONS': 'lifestyle'
+}
+
+class SectionStreamParser:
+    """
+    Incremental parser for the HEALTH/FITNESS/LIFESTYLE response format
+    
+    Feed text chunks as they arrive; each call returns the events completed
+    so far, so a bullet is emitted as soon as its line ends:
+        {'type': 'section', 'section': 'health'}
+        {'type': 'bullet', 'section': 'health', 'text': '...'}
+    """
+    
+    def __init__(self):
+        self._buffer = ''
+        self.section = None
+        self.text = ''
+    
+    def feed(self, chunk):
+        self.text += chunk
+        self._buffer += chunk
+        events = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            events.extend(self._parse_line(line))
+        return events
+    
+    def close(self):
+        """Flush a trailing line that had no newline"""
+        line, self._buffer = self._buffer, ''
+        return self._parse_line(line)
+    
+    def _parse_line(self, line):
+        line = line.strip()
+        if not line:
+            return []
+        
+        title = line.strip('*').strip().rstrip(':').strip('*').strip()
+        header = SECTION_HEADERS.get(title.upper())
+        if header:
+            self.section = header
+            return [{'type': 'section', 'section': header}]
+        
+        if line[0] in '•-*' and self.section:
+            return [{'type': 'bullet', 'section': self.section, 'text': line[1:].strip()}]
+        
+        return []
+
+_STREAM_END = object()
+
+def _open_stream(features):
+    """
+    Start a Gemini stream on _model_executor and return its text chunks
+
+    Takes an LLM slot (Overloaded if none frees up within LLM_QUEUE_TIMEOUT),
+    held by the reading thread until Gemini is done with the stream. Waiting
+    for a chunk is bounded: DeadlineExceeded if the first chunk misses
+    STREAM_FIRST_TOKEN_DEADLINE or the stream STREAM_DEADLINE. A stream left
+    behind stops reading at its next chunk.
+    """
+    llm_slots.acquire(LLM_QUEUE_TIMEOUT)
+    started = time.monotonic()
+    chunks = queue.Queue()
+    stop = threading.Event()
+
+    def read_stream():
+        try:
+            for chunk in get_client().models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=build_prompt(features)
+            ):
+                if stop.is_set():
+                    return
+                if chunk.text:
+                    chunks.put(chunk.text)
+            chunks.put(_STREAM_END)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            llm_slots.release()
+
+    try:
+        future = _model_executor.submit(read_stream)
+    except BaseException:
+        llm_slots.release()
+        raise
+    return _read_chunks(future, chunks, stop,
+                        started + STREAM_FIRST_TOKEN_DEADLINE, started + STREAM_DEADLINE)
+
+def _read_chunks(future, chunks, stop, first_chunk_at, end_at):
+    first = True
+    try:
+        while True:
+            deadline = min(first_chunk_at, end_at) if first else end_at
+            try:
+                item = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise DeadlineExceeded("no first chunk within deadline" if first
+                                       else "stream did not finish within deadline")
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            first = False
+            yield item
+    finally:
+        stop.set()
+        if future.cancel():
+            # Never started: read_stream will not release the slot
+            llm_slots.release()
+
+def stream_recommendations(user_data):
+    """
+    Generate recommendations as a stream of parsed events
+    
+    Yields the SectionStreamParser events while Gemini generates, then a
+    final {'type': 'done', 'recommendations': full_text}. A cached response
+    is replayed immediately; a completed stream fills the cache. If Gemini
+    fails before producing any text (or the circuit breaker is open, no
+    LLM slot frees up in time, or the first chunk misses
+    STREAM_FIRST_TOKEN_DEADLINE), the rule-based recommendations are
+    replayed instead. The whole stream is bounded by STREAM_DEADLINE.
+    """
+    features = extract_features(user_data)
+    key = profile_key(features)
+    parser = SectionStreamParser()
+    
+    cached = recommendation_cache.get(key)
+    if cached is not None:
+        yield from parser.feed(cached)
+        yield from parser.close()
+        yield {'type': 'done', 'recommendations': cached, 'cached': True}
+        return
+    
+    try:
+        if not model_breaker.allow():
+            raise CircuitOpen("circuit breaker is open")
+        outcome = None
+        try:
+            for text in _open_stream(features):
+                yield from parser.feed(text)
+            outcome = 'success'
+        except Overloaded:
+            raise
+        except Exception:
+            outcome = 'failure'
+            raise
+        finally:
+            # No slot, or a client that disconnects mid-stream (GeneratorExit),
+            # says nothing about Gemini: free the half-open trial only
+            if outcome == 'success':
+                model_breaker.record_success()
+            elif outcome == 'failure':
+                model_breaker.record_failure()
+            else:
+                model_breaker.record_abandoned()
+    except Exception as e:
+        # Bullets already sent cannot be retracted; let the endpoint report it
+        if parser.text:
+            raise
+        logger.warning("Gemini stream unavailable (%s: %s), using rule-based recommendations", type(e).__name__, e)
+        fallback = rule_based_recommendations(features)
+        yield from parser.feed(fallback)
+        yield from parser.close()
+        yield {'type': 'done', 'recommendations': fallback, 'cached': False, 'fallback': True}
+        return
+    yield from parser.close()
+    
+    recommendation_cache.set(key, parser.text)
+    yield {'type': 'done', 'recommendations': parser.text, 'cached': False}
+
 
 # Example usage / test
 if __name__ == "__main__":
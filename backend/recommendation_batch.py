@@ -0,0 +1,137 @@
+"""
+Nightly recommendation batch for GAIA Backend
+Precomputes recommendations for every user with new health data so that
+/api/recommendations can serve them without calling Gemini.
+
+Run from cron / a scheduler:
+    python recommendation_batch.py --workers 4 --rpm 60
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional
+
+import supabase_client as db
+from recommandations import generate_uncached
+from resilience import BoundedExecutor
+
+# Timeout for a single Gemini call in the batch; there is no user waiting
+BATCH_DEADLINE = 60.0
+
+
+class RequestPacer:
+    """Spaces calls at least 60 / requests_per_minute seconds apart"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def build_user_payload(user: Dict, averages: Dict) -> Dict:
+    """Map a users row and get_health_averages() output to the /api/recommendations body"""
+    return {
+        'personal': {
+            'age': user.get('age'),
+            'height': user.get('height'),
+            'weight': user.get('weight'),
+            'gender': user.get('gender') or 'male'
+        },
+        'healthAverages': {
+            'heartBeat': averages.get('heart_rate'),
+            'tension': averages.get('blood_pressure_systolic'),
+            'temperature': averages.get('temperature'),
+            'fatigue': averages.get('fatigue'),
+            'steps': int(averages.get('steps') or 0),
+            'sleepDuration': averages.get('sleep_duration', 0)
+        }
+    }
+
+
+def _process_user(entry: Dict, pacer: RequestPacer, model_executor: BoundedExecutor) -> bool:
+    user_id = entry['user_id']
+    user = db.get_user_by_id(user_id)
+    if not user:
+        return False
+
+    payload = build_user_payload(user, db.get_health_averages(user_id))
+
+    pacer.wait()
+    text = generate_uncached(payload, BATCH_DEADLINE, model_executor)
+    return db.save_recommendation(user_id, entry['data_version'], text)
+
+
+def run_batch(workers: int = 4, requests_per_minute: float = 60) -> Dict:
+    """
+    Generate and store recommendations for every user with newer health data
+
+    Gemini calls run on the job's own pool, sized to `workers`: the batch
+    neither takes the LLM slots of interactive requests nor reads or fills
+    the bucketed-profile cache (each user gets their own recommendations).
+    """
+    pending = db.get_users_needing_recommendations()
+    pacer = RequestPacer(requests_per_minute)
+    # Room for one attempt per worker plus one abandoned at its deadline
+    model_executor = BoundedExecutor(max_workers=2 * workers, max_pending=2 * workers,
+                                     thread_name_prefix='gemini-batch')
+    summary = {'users': len(pending), 'stored': 0, 'failed': 0}
+
+    print(f"Generating recommendations for {len(pending)} users...")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_process_user, entry, pacer, model_executor): entry['user_id']
+            for entry in pending
+        }
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"Error generating recommendations for {futures[future]}: {e}")
+                ok = False
+            summary['stored' if ok else 'failed'] += 1
+    model_executor.shutdown(wait=False)
+
+    print(f"Done: {summary['stored']} stored, {summary['failed']} failed")
+    return summary
+
+
+def get_precomputed_recommendations(user_id: str, data_version: Optional[int] = None) -> Optional[str]:
+    """
+    Stored recommendations for user_id, if still current
+
+    Returns None when nothing is stored or the user has synced health data
+    newer than the version the recommendations were generated from. With
+    `data_version`, also None unless they were generated from exactly that
+    version.
+    """
+    stored = db.get_recommendation(user_id)
+    if not stored:
+        return None
+    if data_version is not None and data_version != stored['data_version']:
+        return None
+
+    latest = db.get_latest_health_data(user_id)
+    if latest and latest.get('timestamp', 0) > stored['data_version']:
+        return None
+
+    return stored['recommendations']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute GAIA recommendations')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent Gemini calls')
+    parser.add_argument('--rpm', type=float, default=60, help='max Gemini requests per minute')
+    args = parser.parse_args()
+
+    run_batch(workers=args.workers, requests_per_minute=args.rpm)
@@ -0,0 +1,191 @@
+"""
+Recommendation cache for GAIA Backend
+Serves Gemini output for equivalent health profiles without a new LLM call
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from resilience import DeadlineExceeded
+from structured_logging import get_logger
+from ttl_cache import TTLCache
+
+logger = get_logger('recommendation_cache')
+
+
+def _band(value, width):
+    """Lower bound of the `width`-wide band containing value (None stays None)"""
+    if value is None:
+        return None
+    return int(value // width * width)
+
+
+def _bmi_band(bmi: Optional[float]) -> Optional[str]:
+    if bmi is None:
+        return None
+    if bmi < 18.5:
+        return 'underweight'
+    if bmi < 25:
+        return 'normal'
+    if bmi < 30:
+        return 'overweight'
+    return 'obese'
+
+
+def profile_key(features: Dict) -> Tuple:
+    """
+    Normalized, bucketed feature vector used as cache key
+
+    Profiles falling in the same age / BMI / steps / sleep / heart-rate
+    bands get the same recommendations.
+    """
+    return (
+        features.get('gender') or 'male',
+        _band(features.get('age'), 10),
+        _bmi_band(features.get('bmi')),
+        _band(features.get('steps') or 0, 2000),
+        _band(features.get('sleep_duration') or 0, 1),
+        _band(features.get('heart_rate'), 10),
+    )
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution"""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "SingleFlight._Call"] = {}
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable, timeout: Optional[float] = None):
+        """
+        Run fn() for key, or wait for the call already running
+
+        A caller that joins a running call waits at most `timeout` seconds
+        for it (the leader may have a longer deadline), then gets
+        DeadlineExceeded; the leader's call goes on.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise DeadlineExceeded(f"shared call still running after {timeout:.2f}s")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class RecommendationCache:
+    """
+    Two-tier (memory, optional disk) TTL cache with single-flight fills
+
+    The disk tier is enabled by passing `disk_dir`; entries are one JSON
+    file per key and survive restarts until their TTL runs out.
+    """
+
+    def __init__(self,
+                 maxsize: int = 512,
+                 ttl: float = 6 * 3600,
+                 disk_dir: Optional[str] = None):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk_dir = disk_dir
+        self.flight = SingleFlight()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: Tuple) -> str:
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _disk_get(self, key: Tuple) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) <= time.time():
+            return None
+        return entry.get('text')
+
+    def _disk_set(self, key: Tuple, text: str) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': time.time() + self.ttl, 'text': text}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write recommendation cache entry: %s", e)
+
+    def get(self, key: Tuple) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+        text = self._disk_get(key)
+        if text is not None:
+            self.memory.set(key, text)
+        return text
+
+    def set(self, key: Tuple, text: str) -> None:
+        self.memory.set(key, text)
+        self._disk_set(key, text)
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], str],
+                       timeout: Optional[float] = None) -> str:
+        """
+        Return cached text, or run `compute` once for all concurrent callers
+
+        Callers joining a running computation wait at most `timeout`
+        seconds (DeadlineExceeded).
+        """
+        text = self.get(key)
+        if text is not None:
+            return text
+
+        def fill():
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            fresh = compute()
+            self.set(key, fresh)
+            return fresh
+
+        return self.flight.do(key, fill, timeout)
+
+    def stats(self) -> Dict:
+        stats = self.memory.stats()
+        stats['coalesced'] = self.flight.shared
+        stats['disk'] = bool(self.disk_dir)
+        return stats
@@ -0,0 +1,238 @@
+"""
+Resilience helpers for GAIA Backend
+Deadline-bounded calls with jittered retries, a circuit breaker, a
+concurrency limiter and a bounded executor
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    """The call did not complete before its deadline"""
+
+
+class CircuitOpen(Exception):
+    """The circuit breaker is open; the call was not attempted"""
+
+
+class Overloaded(Exception):
+    """No concurrency slot became free in time; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds, then lets a single trial
+    call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self) -> None:
+        """The allowed call never reached the dependency (or its outcome is
+        unknown): free the half-open trial without judging the dependency"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of concurrent calls to an expensive dependency
+
+    Callers wait at most `timeout` seconds for a slot, then get Overloaded,
+    so a burst queues briefly instead of piling up on the dependency. Work
+    that outlives its caller (a call abandoned at its deadline) keeps the
+    slot: acquire() it, then release() when the work itself finishes.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def acquire(self, timeout: float = 0.0) -> None:
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self._rejected += 1
+            raise Overloaded(f"all {self.max_concurrent} slots busy")
+        with self._lock:
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self, timeout: float = 0.0):
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'inFlight': self._in_flight,
+                'maxConcurrent': self.max_concurrent,
+                'rejected': self._rejected
+            }
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a cap on outstanding (queued + running) calls
+
+    An attempt abandoned at its deadline keeps its worker until the
+    dependency answers; without a cap, retries of a slow dependency pile up
+    in the pool queue. Past `max_pending` outstanding calls, submit()
+    raises Overloaded instead of queueing.
+    """
+
+    def __init__(self, max_workers: int, max_pending: Optional[int] = None,
+                 thread_name_prefix: str = ''):
+        self.max_pending = max_pending or max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=thread_name_prefix)
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if not self._pending.acquire(blocking=False):
+            raise Overloaded(f"{self.max_pending} calls already outstanding")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._pending.release()
+            raise
+        # Also runs when a queued future is cancelled
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def call_with_deadline(fn: Callable,
+                       executor: BoundedExecutor,
+                       deadline: float,
+                       max_attempts: int = 3,
+                       base_delay: float = 0.25,
+                       breaker: Optional[CircuitBreaker] = None,
+                       slots: Optional[ConcurrencyLimiter] = None,
+                       slot_timeout: float = 0.0):
+    """
+    Run `fn()` until it succeeds, attempts run out or `deadline` passes
+
+    `deadline` is an absolute time.monotonic() value. Each attempt runs on
+    `executor` and is abandoned when the deadline passes: it is cancelled if
+    it has not started yet, otherwise the worker thread finishes in the
+    background (the executor bounds how many may do so). Retries back off
+    exponentially with full jitter and never sleep past the deadline.
+
+    With `slots`, each attempt waits at most `slot_timeout` seconds for a
+    slot (else Overloaded) and holds it until the attempt itself finishes,
+    not just until this call gives up on it.
+
+    Every call the breaker allows gets exactly one outcome, whatever
+    interrupts it; Overloaded from the executor leaves the breaker as is.
+    """
+    last_error: Optional[BaseException] = None
+
+    for attempt in range(max_attempts):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpen("circuit breaker is open")
+
+        outcome = None
+        try:
+            if slots is not None:
+                slots.acquire(min(slot_timeout, remaining))
+                try:
+                    future = executor.submit(fn)
+                except BaseException:
+                    slots.release()
+                    raise
+                future.add_done_callback(lambda _: slots.release())
+            else:
+                future = executor.submit(fn)
+            try:
+                result = future.result(timeout=remaining)
+            except FutureTimeout:
+                future.cancel()
+                outcome = 'failure'
+                raise DeadlineExceeded(f"no response within deadline (attempt {attempt + 1})")
+            except Exception as e:
+                last_error = e
+                outcome = 'failure'
+            else:
+                outcome = 'success'
+                return result
+        finally:
+            if breaker is not None:
+                if outcome == 'success':
+                    breaker.record_success()
+                elif outcome == 'failure':
+                    breaker.record_failure()
+                else:
+                    breaker.record_abandoned()
+
+        delay = random.uniform(0, base_delay * (2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            break
+        time.sleep(delay)
+
+    if last_error is not None:
+        raise last_error
+    raise DeadlineExceeded("deadline passed before the call could complete")
@@ -1,17 +1,137 @@
-from flask import Flask, request, jsonify
+import hashlib
+import json
+import logging
+import math
+import os
+
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from recommandations import generate_recommendations
+from auth import InvalidToken, TokenSigner, TokenVerifier, create_password_hasher, load_token_secret
+from recommandations import generate_recommendations, llm_slots, stream_recommendations
+from health_payload import normalize_sync_payload, parse_batch_body
+from health_schema import nested_to_latest
+from health_store import HealthStore
+from health_trends import TrendEngine
+import health_wire
+from pairing_codes import PAIRING_CODE_TTL, PairingWaiters, TooManyWaiters, generate_pairing_code
+from resilience import Overloaded
+from storage import StorageUnavailable, storage_configured
+from rate_limit import (
+    Decision, Limit, RateLimiter, client_ip, create_bucket_store, rate_limited, too_many_requests, user_or_ip
+)
+from ttl_cache import TTLCache
+from structured_logging import get_log_stats, get_logger, sampled
+
+logger = get_logger('server')
+
+# Fraction of successful syncs logged at INFO (every sync at DEBUG)
+SYNC_LOG_SAMPLE_RATE = float(os.getenv('GAIA_SYNC_LOG_SAMPLE_RATE', '0.01'))
+
+# Largest accepted request body (batch syncs are the biggest payloads)
+MAX_CONTENT_LENGTH = int(os.getenv('GAIA_MAX_CONTENT_LENGTH', str(10 * 1024 * 1024)))
+
+api = Blueprint('api', __name__)
+
+# Token buckets per client: "ip" covers every API call from one address,
+# the others apply per endpoint (keyed by the token's user, else the request's userId).
+# Override with GAIA_RATE_<RULE>="<requests per minute>/<burst>".
+rate_limiter = RateLimiter(create_bucket_store(), {
+    'ip': Limit.from_env('ip', 600, burst=120),
+    'sync': Limit.from_env('sync', 120, burst=30),
+    'sync_batch': Limit.from_env('sync_batch', 30, burst=10),
+    'recommendations': Limit.from_env('recommendations', 20, burst=5),
+    'health_read': Limit.from_env('health_read', 240, burst=60),
+    'pairing': Limit.from_env('pairing', 30, burst=10),
+    'pairing_check': Limit.from_env('pairing_check', 120, burst=30),
+    'login': Limit.from_env('login', 10, burst=5),
+})
+
+@api.before_request
+def limit_client_rate():
+    """Per-address cap on all API calls (health checks exempt)"""
+    if request.endpoint == 'api.health_check':
+        return None
+    decision = rate_limiter.check('ip', client_ip())
+    if not decision.allowed:
+        return too_many_requests(decision)
+    return None
+
+# Signed access tokens (see auth.py). Verified claims are cached by token
+# digest, so checking a token on every sync costs about a microsecond.
+token_signer = TokenSigner(
+    load_token_secret(),
+    ttl=int(os.getenv('GAIA_TOKEN_TTL', '86400'))
+)
+if not os.getenv('GAIA_JWT_SECRET'):
+    logger.warning("GAIA_JWT_SECRET not set: tokens are only valid in this process")
+token_verifier = TokenVerifier(
+    token_signer,
+    maxsize=int(os.getenv('GAIA_TOKEN_CACHE_SIZE', '10000')),
+    cache_ttl=float(os.getenv('GAIA_TOKEN_CACHE_TTL', '300'))
+)
+password_hasher = create_password_hasher()
+
+# With GAIA_AUTH_REQUIRED=1 these endpoints reject requests without a token;
+# otherwise a token is optional but, when sent, must match the userId
+AUTHENTICATED_ENDPOINTS = {
+    'api.sync_health_data', 'api.sync_health_data_batch', 'api.get_latest_health_data',
+    'api.get_health_trends', 'api.get_health_history',
+    'api.get_recommendations', 'api.stream_recommendations_endpoint',
+}
+AUTH_REQUIRED = os.getenv('GAIA_AUTH_REQUIRED', '0') == '1'
+# Development only: accept any email/password and derive a stable userId
+AUTH_DEV_LOGIN = os.getenv('GAIA_AUTH_DEV_LOGIN', '0') == '1'
+
+def _auth_error(status: int, error: str, message: str = None):
+    body = {'success': False, 'error': error}
+    if message:
+        body['message'] = message
+    response = jsonify(body)
+    response.status_code = status
+    if status == 401:
+        response.headers['WWW-Authenticate'] = 'Bearer'
+    return response
+
+def forbidden_user(user_id) -> bool:
+    """True if the request carries a token for another user than user_id"""
+    claims = g.get('auth')
+    return claims is not None and user_id is not None and str(user_id) != claims['sub']
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend communication
+@api.before_request
+def authenticate_request():
+    """Verify the bearer token, if any, and bind the request to its user"""
+    header = request.headers.get('Authorization', '')
+    if header[:7].lower() == 'bearer ':
+        try:
+            g.auth = token_verifier.verify(header[7:].strip())
+        except InvalidToken as e:
+            return _auth_error(401, 'Invalid token', str(e))
 
-@app.route('/api/recommendations', methods=['POST'])
+        user_id = request.args.get('userId')
+        if user_id is None and request.is_json:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                user_id = body.get('userId')
+        if forbidden_user(user_id):
+            return _auth_error(403, 'Token does not match userId')
+        return None
+
+    if AUTH_REQUIRED and request.endpoint in AUTHENTICATED_ENDPOINTS:
+        return _auth_error(401, 'Authentication required')
+    return None
+
+@api.route('/api/recommendations', methods=['POST'])
+@rate_limited(rate_limiter, 'recommendations', key=user_or_ip)
 def get_recommendations():
     """
     Endpoint to generate AI recommendations
     
-    Expected JSON body:
+    Expected JSON body ("userId" optional: enables precomputed results, for
+    the token's user or, without a token, when "dataVersion" - timestamp of
+    the latest synced sample - matches the one they were generated from):
     {
+        "userId": "uuid",
+        "dataVersion": 1700000000000,
         "personal": {
             "age": 30,
             "height": 175,
@@ -37,8 +157,24 @@ def get_recommendations():
                 'message': 'Please provide both personal and healthAverages data'
             }), 400
         
+        # Serve the nightly precomputed result when it is still current
+        # (a token for another user was already rejected with 403)
+        recommendations_text = None
+        user_id = data.get('userId')
+        data_version = data.get('dataVersion')
+        authenticated = g.get('auth') is not None
+        if isinstance(data_version, bool) or not isinstance(data_version, int):
+            data_version = None
+        if user_id and (authenticated or data_version is not None) and storage_configured():
+            # Imported here: the batch store needs the storage backend, the live path does not
+            from recommendation_batch import get_precomputed_recommendations
+            recommendations_text = get_precomputed_recommendations(
+                str(user_id), None if authenticated else data_version
+            )
+        
         # Generate recommendations
-        recommendations_text = generate_recommendations(data)
+        if recommendations_text is None:
+            recommendations_text = generate_recommendations(data)
         
         return jsonify({
             'success': True,
@@ -47,27 +183,131 @@ def get_recommendations():
         }), 200
         
     except Exception as e:
-        print(f"Error generating recommendations: {str(e)}")
+        logger.error("Error generating recommendations: %s", e)
         return jsonify({
             'error': 'Failed to generate recommendations',
             'message': str(e)
         }), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/recommendations/stream', methods=['POST'])
+@rate_limited(rate_limiter, 'recommendations', key=user_or_ip)
+def stream_recommendations_endpoint():
+    """
+    Streaming variant of /api/recommendations (Server-Sent Events)
+    
+    Same JSON body as /api/recommendations. Emits, as Gemini generates:
+        event: section  data: {"section": "health"}
+        event: bullet   data: {"section": "health", "text": "..."}
+        event: done     data: {"recommendations": "...", "cached": false}
+        event: error    data: {"message": "..."}
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or 'personal' not in data or 'healthAverages' not in data:
+        return jsonify({
+            'error': 'Missing required data',
+            'message': 'Please provide both personal and healthAverages data'
+        }), 400
+    
+    def event_stream():
+        try:
+            for event in stream_recommendations(data):
+                event_type = event.pop('type')
+                yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error("Error streaming recommendations: %s", e)
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'service': 'GAIA AI Recommendations API'
+        'service': 'GAIA AI Recommendations API',
+        'logging': get_log_stats(),
+        'rateLimits': rate_limiter.stats(),
+        'llm': llm_slots.stats(),
+        'pairingWaiters': pairing_waiters.stats(),
+        'writes': db.get_write_stats() if PERSIST_SYNCS else None,
+        'auth': {'tokenCache': token_verifier.stats(), 'passwords': password_hasher.stats()}
     }), 200
 
 # ==================== MOBILE APP ENDPOINTS ====================
 
-# In-memory storage for health data (replace with database in production)
-health_data_store = {}
-pairing_connections = {}  # Maps pairing codes to userIds
+# Bounded in-memory history of synced health data; with GAIA_PERSIST_SYNCS=1
+# syncs are also written to the storage backend (GAIA_STORAGE, see storage.py)
+PERSIST_SYNCS = os.getenv('GAIA_PERSIST_SYNCS', '0') == '1'
+if PERSIST_SYNCS:
+    import supabase_client as db
+
+health_store = HealthStore(
+    retention_ms=int(float(os.getenv('GAIA_STORE_RETENTION_HOURS', '168')) * 3600 * 1000),
+    max_samples_per_user=int(os.getenv('GAIA_STORE_MAX_PER_USER', '10000')),
+    max_total_samples=int(os.getenv('GAIA_STORE_MAX_SAMPLES', '500000'))
+)
+# Running per-user trends of the vitals, updated on every sync
+trend_engine = TrendEngine(
+    alpha=float(os.getenv('GAIA_TREND_ALPHA', '0.1')),
+    window=int(os.getenv('GAIA_TREND_WINDOW', '128')),
+    z_threshold=float(os.getenv('GAIA_TREND_Z_THRESHOLD', '3.0')),
+    min_samples=int(os.getenv('GAIA_TREND_MIN_SAMPLES', '20')),
+    max_users=int(os.getenv('GAIA_TREND_MAX_USERS', '10000'))
+)
+# Maps pairing codes to userIds; codes expire like Supabase pairing codes
+pairing_connections = TTLCache(
+    maxsize=int(os.getenv('GAIA_MAX_PAIRING_CODES', '10000')),
+    ttl=PAIRING_CODE_TTL.total_seconds()
+)
+# Dashboards parked on /api/wait-pairing; each waiter holds a server thread,
+# so by default at most half of the worker threads (GAIA_THREADS) wait
+pairing_waiters = PairingWaiters(
+    max_waiters_per_code=int(os.getenv('GAIA_PAIRING_WAITERS_PER_CODE', '4')),
+    max_total_waiters=int(os.getenv('GAIA_PAIRING_MAX_WAITERS',
+                                    str(max(1, int(os.getenv('GAIA_THREADS', '32')) // 2)))),
+    max_codes=int(os.getenv('GAIA_MAX_PAIRING_CODES', '10000'))
+)
+PAIRING_WAIT_MAX = float(os.getenv('GAIA_PAIRING_WAIT_MAX', '25'))
 
-@app.route('/api/verify-pairing', methods=['POST'])
+@api.route('/api/pairing-code', methods=['POST'])
+@rate_limited(rate_limiter, 'pairing')
+def issue_pairing_code():
+    """
+    Issue a pairing code for a dashboard to display and wait on
+    Returns: { "pairingCode": "123456", "expiresIn": 600 }
+    """
+    try:
+        ttl = PAIRING_CODE_TTL.total_seconds()
+        for _ in range(5):
+            code = generate_pairing_code()
+            if pairing_waiters.register(code, ttl):
+                # A recycled code must not report the previous pairing
+                pairing_connections.pop(code)
+                return jsonify({
+                    'success': True,
+                    'pairingCode': code,
+                    'expiresIn': int(ttl)
+                }), 200
+        
+        response = jsonify({'success': False, 'message': 'No free pairing code, retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+        
+    except Exception as e:
+        logger.error("Error issuing pairing code: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/verify-pairing', methods=['POST'])
+@rate_limited(rate_limiter, 'pairing')
 def verify_pairing():
     """
     Verify pairing code and establish connection
@@ -81,10 +321,11 @@ def verify_pairing():
         if not pairing_code or not user_id:
             return jsonify({'success': False, 'message': 'Missing pairing code or user ID'}), 400
         
-        # Store the connection
-        pairing_connections[pairing_code] = user_id
+        # Store the connection and wake dashboards waiting on this code
+        pairing_connections.set(pairing_code, user_id)
+        pairing_waiters.notify(pairing_code, user_id)
         
-        print(f"✅ Pairing established: {pairing_code} → {user_id}")
+        logger.info("Pairing established", extra={'fields': {'pairingCode': pairing_code, 'userId': user_id}})
         
         return jsonify({
             'success': True,
@@ -93,10 +334,11 @@ def verify_pairing():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error verifying pairing: {str(e)}")
+        logger.error("Error verifying pairing: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/check-pairing', methods=['GET'])
+@api.route('/api/check-pairing', methods=['GET'])
+@rate_limited(rate_limiter, 'pairing_check')
 def check_pairing():
     """
     Check if a device has paired with this code
@@ -123,10 +365,70 @@ def check_pairing():
             }), 200
             
     except Exception as e:
-        print(f"❌ Error checking pairing: {str(e)}")
+        logger.error("Error checking pairing: %s", e)
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@api.route('/api/wait-pairing', methods=['GET'])
+@rate_limited(rate_limiter, 'pairing_check')
+def wait_pairing():
+    """
+    Long-poll variant of /api/check-pairing
+    Query parameters: pairingCode, timeout (seconds, optional, max GAIA_PAIRING_WAIT_MAX)
+    
+    The code must come from /api/pairing-code (404 once unknown or
+    expired: the dashboard asks for a new one). Answers as soon as the phone confirms the code, or with connected=false
+    once the timeout passes; the dashboard then simply calls again. When
+    every server-wide waiter slot is taken, answers connected=false at
+    once with Retry-After (a plain check); too many waiters on the same
+    code get 429. Retry-After grows with consecutive refusals.
+    """
+    try:
+        pairing_code = request.args.get('pairingCode')
+        
+        if not pairing_code:
+            return jsonify({'success': False, 'message': 'Missing pairing code'}), 400
+        
+        try:
+            timeout = min(float(request.args.get('timeout', PAIRING_WAIT_MAX)), PAIRING_WAIT_MAX)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid timeout'}), 400
+        
+        user_id = pairing_connections.get(pairing_code)
+        if not user_id and not pairing_waiters.known(pairing_code):
+            return jsonify({
+                'success': False,
+                'connected': False,
+                'message': 'Unknown or expired pairing code'
+            }), 404
+        if not user_id:
+            try:
+                user_id = pairing_waiters.wait(pairing_code, max(0.0, timeout))
+            except TooManyWaiters as e:
+                if e.scope == 'code':
+                    return too_many_requests(Decision(False, e.retry_after, 0.0))
+                # Server busy: do not fail the dashboard, just poll later
+                response = jsonify({'success': True, 'connected': False, 'retryAfter': math.ceil(e.retry_after)})
+                response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+                return response
+        
+        if user_id:
+            return jsonify({
+                'success': True,
+                'connected': True,
+                'userId': user_id
+            }), 200
+        else:
+            return jsonify({
+                'success': True,
+                'connected': False
+            }), 200
+            
+    except Exception as e:
+        logger.error("Error waiting for pairing: %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/sync-health', methods=['POST'])
+@api.route('/api/sync-health', methods=['POST'])
+@rate_limited(rate_limiter, 'sync', key=user_or_ip)
 def sync_health_data():
     """
     Endpoint to receive health data from GAIA Mobile app
@@ -134,67 +436,63 @@ def sync_health_data():
     Accepts both formats:
     1. Old format (flat): { userId, timestamp, heartRate, bloodPressureSystolic, ... }
     2. New format (nested): { userId, timestamp, healthData: { heartRate: {...}, ... } }
+    or the flat format as a compact binary body (Content-Type: application/x-gaia-health)
     """
     try:
-        data = request.get_json()
+        if request.mimetype == health_wire.CONTENT_TYPE:
+            # Compact binary body (see health_wire.py), decodes to the flat format
+            try:
+                data, _ = health_wire.decode_sample(request.get_data())
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid binary payload',
+                    'message': str(e)
+                }), 400
+        else:
+            data = request.get_json()
         
-        print(f"📥 Received sync request: {data}")
+        # Lazy %s formatting: the payload is only rendered when DEBUG is on
+        logger.debug("Received sync request: %s", data)
         
-        # Validate userId
-        if not data or 'userId' not in data:
+        # Validate userId and normalize flat/nested formats
+        try:
+            user_id, timestamp, health_data = normalize_sync_payload(data)
+        except ValueError as e:
             return jsonify({
                 'success': False,
                 'error': 'Missing required data',
-                'message': 'Please provide userId'
+                'message': str(e)
             }), 400
         
-        user_id = data['userId']
-        timestamp = data.get('timestamp')
+        if forbidden_user(user_id):
+            return _auth_error(403, 'Token does not match userId')
         
-        # Check if data is in flat format (from mobile app) or nested format
-        if 'healthData' in data:
-            # New nested format
-            health_data = data['healthData']
-        else:
-            # Flat format from mobile - convert to nested format
-            health_data = {
-                'heartRate': {'value': data.get('heartRate'), 'unit': 'bpm', 'timestamp': timestamp} if data.get('heartRate') else None,
-                'bloodPressure': {
-                    'systolic': data.get('bloodPressureSystolic'),
-                    'diastolic': data.get('bloodPressureDiastolic'),
-                    'unit': 'mmHg',
-                    'timestamp': timestamp
-                } if data.get('bloodPressureSystolic') else None,
-                'temperature': {'value': data.get('bodyTemperature'), 'unit': 'celsius', 'timestamp': timestamp} if data.get('bodyTemperature') else None,
-                'steps': {'value': data.get('steps'), 'timestamp': timestamp} if data.get('steps') else None,
-                'sleep': {'duration': data.get('sleepDuration'), 'unit': 'hours', 'timestamp': timestamp} if data.get('sleepDuration') else None,
-                'oxygenSaturation': {'value': data.get('oxygenSaturation'), 'unit': 'percent', 'timestamp': timestamp} if data.get('oxygenSaturation') else None,
-                'stressLevel': {'value': data.get('stressLevel'), 'unit': 'percent', 'timestamp': timestamp} if data.get('stressLevel') else None,
-                'calories': {'value': data.get('calories'), 'unit': 'kcal', 'timestamp': timestamp} if data.get('calories') else None,
-                'distance': {'value': data.get('distance'), 'unit': 'km', 'timestamp': timestamp} if data.get('distance') else None,
-                'weight': {'value': data.get('weight'), 'unit': 'kg', 'timestamp': timestamp} if data.get('weight') else None,
-                'height': {'value': data.get('height'), 'unit': 'meters', 'timestamp': timestamp} if data.get('height') else None
-            }
+        # Queued on the write buffer, never waits on the database; a full
+        # buffer is not acknowledged, so the phone keeps the sample and resends it
+        if PERSIST_SYNCS and not db.save_health_data(user_id, health_data, timestamp):
+            response = jsonify({
+                'success': False,
+                'error': 'Storage busy',
+                'message': 'Health data not stored, retry shortly'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        health_store.add(user_id, timestamp, health_data)
+        trend_engine.update(user_id, timestamp, health_data)
+        
+        # Log health metrics (sampled: one record per sync would flood the log)
+        if logger.isEnabledFor(logging.INFO):
+            hr = health_data.get('heartRate', {}).get('value') if isinstance(health_data.get('heartRate'), dict) else None
+            bp_sys = health_data.get('bloodPressure', {}).get('systolic') if isinstance(health_data.get('bloodPressure'), dict) else None
+            bp_dia = health_data.get('bloodPressure', {}).get('diastolic') if isinstance(health_data.get('bloodPressure'), dict) else None
+            steps = health_data.get('steps', {}).get('value') if isinstance(health_data.get('steps'), dict) else None
             
-            # Remove None values
-            health_data = {k: v for k, v in health_data.items() if v is not None}
-        
-        # Store health data (in production, save to database)
-        health_data_store[user_id] = {
-            'healthData': health_data,
-            'lastUpdated': timestamp,
-            'syncTimestamp': timestamp
-        }
-        
-        print(f"✅ Health data synced for user: {user_id}")
-        
-        # Log health metrics
-        hr = health_data.get('heartRate', {}).get('value') if isinstance(health_data.get('heartRate'), dict) else None
-        bp_sys = health_data.get('bloodPressure', {}).get('systolic') if isinstance(health_data.get('bloodPressure'), dict) else None
-        bp_dia = health_data.get('bloodPressure', {}).get('diastolic') if isinstance(health_data.get('bloodPressure'), dict) else None
-        steps = health_data.get('steps', {}).get('value') if isinstance(health_data.get('steps'), dict) else None
-        
-        print(f"📊 Data: HR={hr} bpm, BP={bp_sys}/{bp_dia} mmHg, Steps={steps}")
+            logger.info("Health data synced", extra=sampled(
+                SYNC_LOG_SAMPLE_RATE,
+                userId=user_id, hr=hr, bpSystolic=bp_sys, bpDiastolic=bp_dia, steps=steps
+            ))
         
         return jsonify({
             'success': True,
@@ -204,14 +502,102 @@ def sync_health_data():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error syncing health data: {str(e)}")
+        logger.error("Error syncing health data: %s", e)
         return jsonify({
             'success': False,
             'error': 'Failed to sync health data',
             'message': str(e)
         }), 500
 
-@app.route('/api/health/latest', methods=['GET'])
+@api.route('/api/sync-health/batch', methods=['POST'])
+@rate_limited(rate_limiter, 'sync_batch')
+def sync_health_data_batch():
+    """
+    Endpoint to receive many health samples in one request (offline backlog replay)
+    
+    Body: JSON array of /api/sync-health payloads, {"samples": [...]}, or
+    NDJSON (Content-Type: application/x-ndjson). May be gzip-compressed
+    (Content-Encoding: gzip). Valid samples are stored in one bulk
+    operation; invalid ones are reported per item, and those the write
+    buffer could not queue are marked retryable (with Retry-After).
+    """
+    try:
+        try:
+            samples = parse_batch_body(
+                request.get_data(cache=False),
+                request.content_type or '',
+                request.headers.get('Content-Encoding', '')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid batch body',
+                'message': str(e)
+            }), 400
+        
+        results = []
+        accepted = []
+        for index, sample in enumerate(samples):
+            try:
+                user_id, timestamp, health_data = normalize_sync_payload(sample)
+            except ValueError as e:
+                results.append({'index': index, 'success': False, 'message': str(e)})
+                continue
+            if forbidden_user(user_id):
+                results.append({'index': index, 'success': False, 'message': 'userId does not match token'})
+                continue
+            accepted.append((user_id, timestamp, health_data))
+            results.append({
+                'index': index,
+                'success': True,
+                'syncId': f"sync_{user_id}_{timestamp}"
+            })
+        
+        # Only samples the write buffer queued are acknowledged; the others
+        # stay on the phone and are resent
+        if PERSIST_SYNCS and accepted:
+            queued = db.save_health_data_many(accepted)
+            stored = []
+            accepted_results = (result for result in results if result['success'])
+            for sample, result, ok in zip(accepted, accepted_results, queued):
+                if ok:
+                    stored.append(sample)
+                    continue
+                result.pop('syncId')
+                result.update(success=False, retryable=True, message='Storage busy, retry shortly')
+            retryable = len(accepted) - len(stored)
+            accepted = stored
+        else:
+            retryable = 0
+        
+        health_store.add_many(accepted)
+        trend_engine.update_many(accepted)
+        
+        logger.info("Batch sync stored", extra={'fields': {
+            'accepted': len(accepted), 'retryable': retryable, 'total': len(samples)
+        }})
+        
+        response = jsonify({
+            'success': len(accepted) == len(samples),
+            'accepted': len(accepted),
+            'rejected': len(samples) - len(accepted) - retryable,
+            'retryable': retryable,
+            'results': results
+        })
+        if retryable:
+            response.headers['Retry-After'] = '1'
+        return response, 200
+        
+    except Exception as e:
+        logger.error("Error syncing health data batch: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'Failed to sync health data batch',
+            'message': str(e)
+        }), 500
+
+@api.route('/api/health/latest', methods=['GET'])
+@rate_limited(rate_limiter, 'health_read', key=user_or_ip)
 def get_latest_health_data():
     """
     Endpoint to retrieve latest health data for a user
@@ -227,7 +613,7 @@ def get_latest_health_data():
             }), 400
         
         # Retrieve data from store
-        user_data = health_data_store.get(user_id)
+        user_data = health_store.latest(user_id)
         
         if not user_data:
             return jsonify({
@@ -239,21 +625,8 @@ def get_latest_health_data():
         health_data = user_data['healthData']
         
         # Format response for frontend
-        formatted_data = {
-            'heartRate': health_data.get('heartRate', {}).get('value', 72),
-            'bloodPressureSystolic': health_data.get('bloodPressure', {}).get('systolic', 120),
-            'bloodPressureDiastolic': health_data.get('bloodPressure', {}).get('diastolic', 80),
-            'bodyTemperature': health_data.get('temperature', {}).get('value', 36.5),
-            'stressLevel': health_data.get('stressLevel', {}).get('value', 30),
-            'steps': health_data.get('steps', {}).get('value', 0),
-            'sleepDuration': health_data.get('sleep', {}).get('duration', 0),
-            'oxygenSaturation': health_data.get('oxygenSaturation', {}).get('value', 98),
-            'calories': health_data.get('calories', {}).get('value', 0),
-            'distance': health_data.get('distance', {}).get('value', 0),
-            'weight': health_data.get('weight', {}).get('value'),
-            'height': health_data.get('height', {}).get('value'),
-            'lastUpdated': user_data.get('lastUpdated')
-        }
+        formatted_data = nested_to_latest(health_data)
+        formatted_data['lastUpdated'] = user_data.get('lastUpdated')
         
         return jsonify({
             'success': True,
@@ -261,23 +634,117 @@ def get_latest_health_data():
         }), 200
         
     except Exception as e:
-        print(f"❌ Error retrieving health data: {str(e)}")
+        logger.error("Error retrieving health data: %s", e)
         return jsonify({
             'success': False,
             'error': 'Failed to retrieve health data',
             'message': str(e)
         }), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/health/trends', methods=['GET'])
+@rate_limited(rate_limiter, 'health_read', key=user_or_ip)
+def get_health_trends():
+    """
+    Endpoint to retrieve a user's running vital-sign trends
+    Query parameter: userId
+    
+    Per metric: EWMA mean/std, last value and its z-score, anomaly flag,
+    sample count and p5/p50/p95 of the recent window; plus the recent
+    anomaly events.
+    """
+    try:
+        user_id = request.args.get('userId')
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Missing userId parameter'
+            }), 400
+        
+        trends = trend_engine.trends(user_id)
+        
+        if not trends:
+            return jsonify({
+                'success': False,
+                'error': 'No health data found for this user',
+                'message': 'User has not synced any health data yet'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': trends
+        }), 200
+        
+    except Exception as e:
+        logger.error("Error retrieving health trends: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve health trends',
+            'message': str(e)
+        }), 500
+
+@api.route('/api/health/history', methods=['GET'])
+@rate_limited(rate_limiter, 'health_read', key=user_or_ip)
+def get_health_history():
+    """
+    Endpoint to retrieve a user's synced health history as columns
+    Query parameters: userId, from (ms, optional), to (ms, optional),
+                      metrics (comma separated, optional)
+    """
+    try:
+        user_id = request.args.get('userId')
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Missing userId parameter'
+            }), 400
+        
+        start_ms = request.args.get('from', 0, type=int)
+        end_ms = request.args.get('to', type=int)
+        metrics = [m for m in request.args.get('metrics', '').split(',') if m]
+        
+        try:
+            history = health_store.range(user_id, start_ms, end_ms, metrics)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        if history is None:
+            return jsonify({
+                'success': False,
+                'error': 'No health data found for this user',
+                'message': 'User has not synced any health data yet'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': history
+        }), 200
+        
+    except Exception as e:
+        logger.error("Error retrieving health history: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve health history',
+            'message': str(e)
+        }), 500
+
+@api.route('/api/auth/login', methods=['POST'])
+@rate_limited(rate_limiter, 'login')
 def user_login():
     """
-    Simple authentication endpoint (replace with proper auth in production)
+    Authenticate against the users table and issue a signed access token
     
     Expected JSON body:
     {
         "email": "user@example.com",
         "password": "secure_password"
     }
+    
+    Send the token as "Authorization: Bearer <token>" on later requests.
     """
     try:
         data = request.get_json()
@@ -288,38 +755,78 @@ def user_login():
                 'error': 'Missing email or password'
             }), 400
         
-        email = data['email']
-        password = data['password']
-        
-        # Simple validation (replace with proper database auth)
-        # In production: hash password, check against database, generate JWT token
-        if len(password) < 6:
-            return jsonify({
-                'success': False,
-                'error': 'Password too short'
-            }), 400
+        email = str(data['email']).strip()
+        password = str(data['password'])
+        
+        if AUTH_DEV_LOGIN:
+            if len(password) < 6:
+                return jsonify({
+                    'success': False,
+                    'error': 'Password too short'
+                }), 400
+            # Same email, same userId, in every process
+            user_id = f"user_{hashlib.sha256(email.lower().encode('utf-8')).hexdigest()[:16]}"
+        elif not storage_configured():
+            # A configuration problem, not an outage: retrying cannot help
+            return _auth_error(501, 'No user store configured',
+                               'Set GAIA_STORAGE=sqlite or SUPABASE_URL / SUPABASE_KEY '
+                               '(or GAIA_AUTH_DEV_LOGIN=1 in development)')
+        else:
+            import supabase_client as db
+            
+            user = db.get_user_by_email(email)
+            stored_hash = user.get('password_hash') if user else None
+            # The KDF runs on the password pool; unknown emails take as long
+            if not password_hasher.verify(password, stored_hash):
+                return _auth_error(401, 'Invalid email or password')
+            user_id = str(user['id'])
+            
+            if password_hasher.needs_rehash(stored_hash):
+                db.update_user_profile(user_id, {'password_hash': password_hasher.hash(password)})
         
-        # Generate mock JWT token (replace with proper JWT library in production)
-        user_id = f"user_{hash(email) % 10000}"
-        token = f"mock_jwt_token_{user_id}"
+        token = token_signer.issue(user_id)
         
-        print(f"✅ User logged in: {email} (User ID: {user_id})")
+        logger.info("User logged in", extra={'fields': {'userId': user_id}})
         
         return jsonify({
             'success': True,
             'token': token,
             'userId': user_id,
-            'expiresIn': 86400  # 24 hours
+            'expiresIn': token_signer.ttl
         }), 200
         
+    except (Overloaded, StorageUnavailable) as e:
+        if isinstance(e, StorageUnavailable):
+            logger.error("Login error: %s", e)
+        response = _auth_error(503, 'Login temporarily unavailable, retry shortly')
+        response.headers['Retry-After'] = '1'
+        return response
     except Exception as e:
-        print(f"❌ Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         return jsonify({
             'success': False,
             'error': 'Login failed',
             'message': str(e)
         }), 500
 
+def create_app(config=None):
+    """
+    Application factory
+    
+    Used by the production server (see gunicorn.conf.py) and by tests;
+    `python server.py` runs the same app on the Werkzeug dev server.
+    """
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    if config:
+        app.config.update(config)
+    
+    CORS(app)  # Enable CORS for frontend communication
+    app.register_blueprint(api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     # NOTE (Windows): avoid emoji characters in console output to prevent
     # UnicodeEncodeError on cp1252 terminals.
@@ -327,4 +834,5 @@ if __name__ == '__main__':
     print("Server running on http://localhost:5000")
     print("AI-powered recommendations ready!")
     print("Mobile app sync endpoints available!")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print("Development server only - see gunicorn.conf.py for production")
+    app.run(debug=os.getenv('GAIA_DEBUG', '1') == '1', host='0.0.0.0', port=5000)
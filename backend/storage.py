@@ -0,0 +1,173 @@
+"""
+Storage backends for GAIA Backend
+supabase_client keeps the public API (caches, write buffer, error
+handling) and sends every query through a StorageBackend:
+
+    - SupabaseBackend (storage_supabase.py): the hosted database, default
+    - SQLiteBackend (storage_sqlite.py): a local file in WAL mode, for the
+      in-vehicle bench (often offline) and for tests
+
+Select with GAIA_STORAGE=supabase|sqlite (GAIA_SQLITE_PATH for the file).
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+class DuplicateKey(Exception):
+    """An insert hit a UNIQUE / PRIMARY KEY constraint"""
+
+
+class StorageUnavailable(Exception):
+    """The query failed (database unreachable or erroring), as opposed to finding nothing"""
+
+
+class StorageBackend(ABC):
+    """
+    Queries behind supabase_client, one method per round trip
+
+    Methods raise on errors; supabase_client decides what to log and
+    return. Timestamps of health rows are Unix milliseconds, other dates
+    ISO strings, as in supabase_schema.sql.
+    """
+
+    name = 'abstract'
+
+    # ---- users ----
+
+    @abstractmethod
+    def get_user(self, field: str, value: str) -> Optional[Dict]:
+        """users row where `field` ('id' or 'email') equals value"""
+
+    @abstractmethod
+    def insert_user(self, record: Dict) -> Optional[Dict]:
+        """Insert a users row (id generated); returns the stored row"""
+
+    @abstractmethod
+    def update_user(self, user_id: str, updates: Dict) -> None:
+        ...
+
+    # ---- health data / sync history ----
+
+    @abstractmethod
+    def insert_rows(self, table: str, rows: List[Dict]) -> None:
+        """
+        Bulk insert into health_data or sync_history
+
+        Rows whose idempotency_key is already stored are skipped, so a
+        retried batch is harmless.
+        """
+
+    @abstractmethod
+    def latest_health_row(self, user_id: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def iter_health_rows(self,
+                         user_id: str,
+                         since_ms: int,
+                         columns: Optional[Sequence[str]] = None,
+                         page_size: int = 1000) -> Iterator[Dict]:
+        """health_data rows with timestamp >= since_ms, oldest first"""
+
+    @abstractmethod
+    def fetch_rollups(self,
+                      user_id: str,
+                      resolution: str,
+                      start_ms: int,
+                      end_ms: int,
+                      metrics: Optional[Iterable[str]] = None) -> List[Dict]:
+        """health_rollups rows (ROLLUP_FIELDS) with start_ms <= bucket_start < end_ms"""
+
+    def rollups_ready(self) -> bool:
+        """True if health_rollups covers every health_data row (backfill done)"""
+        return True
+
+    @abstractmethod
+    def health_stats(self, user_id: str, since_ms: int) -> Dict:
+        """Per-column {avg, count, min, max} computed by the database"""
+
+    @abstractmethod
+    def last_sync_time(self, user_id: str) -> Optional[str]:
+        ...
+
+    # ---- recommendations ----
+
+    @abstractmethod
+    def users_needing_recommendations(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def upsert_recommendation(self, record: Dict) -> None:
+        ...
+
+    @abstractmethod
+    def get_recommendation(self, user_id: str) -> Optional[Dict]:
+        ...
+
+    # ---- pairing ----
+
+    @abstractmethod
+    def insert_pairing_code(self, record: Dict) -> None:
+        """Raises DuplicateKey if the code is taken"""
+
+    @abstractmethod
+    def delete_stale_pairing_code(self, code: str, now_iso: str) -> None:
+        """Delete the code if it is used or expired"""
+
+    @abstractmethod
+    def consume_pairing_code(self, code: str, now_iso: str) -> Optional[str]:
+        """Mark an unused, unexpired code used in one step; returns its user_id"""
+
+    # ---- misc ----
+
+    @abstractmethod
+    def ping(self) -> None:
+        """Cheap query; raises if the database is unreachable"""
+
+    def close(self) -> None:
+        pass
+
+
+def create_backend(kind: Optional[str] = None) -> StorageBackend:
+    """Backend named by `kind` or GAIA_STORAGE (default supabase)"""
+    kind = (kind or os.getenv('GAIA_STORAGE', 'supabase')).lower()
+    if kind == 'supabase':
+        from storage_supabase import SupabaseBackend
+        return SupabaseBackend()
+    if kind == 'sqlite':
+        from storage_sqlite import SQLiteBackend
+        return SQLiteBackend(os.getenv('GAIA_SQLITE_PATH', 'gaia.db'))
+    raise ValueError(f"Unknown GAIA_STORAGE {kind!r} (expected 'supabase' or 'sqlite')")
+
+
+def storage_configured(kind: Optional[str] = None) -> bool:
+    """True if create_backend(kind) has what it needs (a SQLite path, or Supabase credentials)"""
+    kind = (kind or os.getenv('GAIA_STORAGE', 'supabase')).lower()
+    if kind == 'sqlite':
+        return True
+    return kind == 'supabase' and bool(os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_KEY'))
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """Process-wide backend, created on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: StorageBackend) -> Optional[StorageBackend]:
+    """Swap the process-wide backend (tests, benchmarks); returns the previous one"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
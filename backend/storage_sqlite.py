@@ -0,0 +1,397 @@
+"""
+SQLite storage backend for GAIA Backend
+The tables of supabase_schema.sql in one local file, for the in-vehicle
+bench (often offline) and for tests:
+
+    - WAL journal: readers never block the writer and commits only append
+      to the log (synchronous=NORMAL: durable across crashes of the
+      process, at most the last commits lost on power loss)
+    - one fixed SQL text per query, so sqlite3's per-connection statement
+      cache prepares each of them once
+    - health_data indexed on (user_id, timestamp), bulk inserts in one
+      transaction with executemany
+    - health_rollups maintained in the same transaction as the raw rows,
+      standing in for the Postgres trigger
+
+Each thread gets its own connection (readers run concurrently); writes are
+serialized by a lock. ':memory:' uses a single shared connection.
+"""
+
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from health_rollups import ROLLUP_METRICS, SQLITE_SCHEMA as ROLLUP_SCHEMA, sqlite_add_rows, sqlite_fetch
+from health_schema import METRICS
+from storage import DuplicateKey, StorageBackend
+
+USER_COLUMNS = (
+    'id', 'email', 'password_hash', 'age', 'height', 'weight', 'gender',
+    'created_at', 'last_login', 'updated_at'
+)
+METRIC_COLUMNS = tuple(m.db for m in METRICS if m.db)
+HEALTH_COLUMNS = ('user_id', 'timestamp', 'synced_at', 'idempotency_key') + METRIC_COLUMNS
+SYNC_COLUMNS = ('user_id', 'sync_id', 'status', 'message', 'synced_at', 'idempotency_key')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    age INTEGER,
+    height INTEGER,
+    weight INTEGER,
+    gender TEXT,
+    created_at TEXT,
+    last_login TEXT,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS health_data (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    synced_at TEXT,
+    idempotency_key TEXT UNIQUE,
+    {', '.join(f"{m.db} {'NUMERIC' if m.numeric else 'TEXT'}" for m in METRICS if m.db)}
+);
+CREATE INDEX IF NOT EXISTS idx_health_data_user_timestamp ON health_data(user_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS sync_history (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    sync_id TEXT NOT NULL,
+    status TEXT,
+    message TEXT,
+    synced_at TEXT,
+    idempotency_key TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_sync_history_user_synced_at ON sync_history(user_id, synced_at);
+
+CREATE TABLE IF NOT EXISTS pairing_codes (
+    code TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    used INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS recommendations (
+    user_id TEXT PRIMARY KEY,
+    data_version INTEGER NOT NULL,
+    recommendations TEXT NOT NULL,
+    generated_at TEXT
+);
+{ROLLUP_SCHEMA}
+"""
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        "ON CONFLICT (idempotency_key) DO NOTHING"
+    )
+
+
+_INSERT_HEALTH = _insert_sql('health_data', HEALTH_COLUMNS)
+_INSERT_SYNC = _insert_sql('sync_history', SYNC_COLUMNS)
+_INSERT_USER = f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})"
+
+_HEALTH_STATS = "SELECT {} FROM health_data WHERE user_id = ? AND timestamp >= ?".format(
+    ', '.join(f"AVG({c}), COUNT({c}), MIN({c}), MAX({c})" for c in ROLLUP_METRICS)
+)
+
+_USERS_NEEDING_RECOMMENDATIONS = """
+SELECT h.user_id AS user_id, MAX(h.timestamp) AS data_version
+FROM health_data h
+LEFT JOIN recommendations r ON r.user_id = h.user_id
+GROUP BY h.user_id, r.data_version
+HAVING MAX(h.timestamp) > COALESCE(r.data_version, 0)
+"""
+
+_UPSERT_RECOMMENDATION = """
+INSERT INTO recommendations (user_id, data_version, recommendations, generated_at)
+VALUES (:user_id, :data_version, :recommendations, :generated_at)
+ON CONFLICT (user_id) DO UPDATE SET
+    data_version = excluded.data_version,
+    recommendations = excluded.recommendations,
+    generated_at = excluded.generated_at
+"""
+
+# Largest IN (...) list per query, below SQLITE_MAX_VARIABLE_NUMBER on old builds
+_KEY_CHUNK = 500
+
+
+def _select_columns(columns: Optional[Sequence[str]]) -> str:
+    if not columns:
+        return '*'
+    unknown = set(columns) - set(HEALTH_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown health_data columns: {sorted(unknown)}")
+    selected = ['user_id', 'timestamp']
+    selected += [c for c in columns if c not in selected]
+    return ', '.join(selected)
+
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: str = ':memory:', busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._shared: Optional[sqlite3.Connection] = None
+        if path == ':memory:':
+            self._shared = self._connect()
+
+        with self._write_lock:
+            self._thread_connection().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: autocommit reads, explicit BEGIN for writes
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=128
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        if self._shared is not None:
+            with self._write_lock:
+                yield self._shared
+            return
+        yield self._thread_connection()
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction; BEGIN IMMEDIATE takes the file lock up front"""
+        with self._write_lock:
+            conn = self._thread_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---- users ----
+
+    def get_user(self, field: str, value: str) -> Optional[Dict]:
+        if field not in ('id', 'email'):
+            raise ValueError(f"Cannot look users up by {field!r}")
+        with self._read() as conn:
+            row = conn.execute(f"SELECT * FROM users WHERE {field} = ?", (value,)).fetchone()
+        return dict(row) if row else None
+
+    def insert_user(self, record: Dict) -> Optional[Dict]:
+        record = {'id': str(uuid.uuid4()), **record}
+        unknown = set(record) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown users columns: {sorted(unknown)}")
+        try:
+            with self._write() as conn:
+                conn.execute(_INSERT_USER, [record.get(c) for c in USER_COLUMNS])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKey(record.get('email')) from e
+        return self.get_user('id', record['id'])
+
+    def update_user(self, user_id: str, updates: Dict) -> None:
+        unknown = set(updates) - set(USER_COLUMNS[1:])
+        if unknown:
+            raise ValueError(f"Unknown users columns: {sorted(unknown)}")
+        if not updates:
+            return
+        assignments = ', '.join(f"{column} = ?" for column in updates)
+        with self._write() as conn:
+            conn.execute(f"UPDATE users SET {assignments} WHERE id = ?", [*updates.values(), user_id])
+
+    # ---- health data / sync history ----
+
+    def insert_rows(self, table: str, rows: List[Dict]) -> None:
+        if table == 'health_data':
+            columns, sql = HEALTH_COLUMNS, _INSERT_HEALTH
+        elif table == 'sync_history':
+            columns, sql = SYNC_COLUMNS, _INSERT_SYNC
+        else:
+            raise ValueError(f"Bulk insert not supported for table {table!r}")
+        unknown = set().union(*rows) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+
+        with self._write() as conn:
+            if table == 'health_data':
+                # Only rows not stored yet may reach the rollups
+                rows = self._new_rows(conn, rows)
+            conn.executemany(sql, [[row.get(c) for c in columns] for row in rows])
+            if table == 'health_data':
+                sqlite_add_rows(conn, rows)
+
+    @staticmethod
+    def _new_rows(conn: sqlite3.Connection, rows: List[Dict]) -> List[Dict]:
+        """Drop rows whose idempotency_key is stored or repeated in the batch"""
+        keys = list({row['idempotency_key'] for row in rows if row.get('idempotency_key') is not None})
+        seen = set()
+        for start in range(0, len(keys), _KEY_CHUNK):
+            chunk = keys[start:start + _KEY_CHUNK]
+            cursor = conn.execute(
+                f"SELECT idempotency_key FROM health_data WHERE idempotency_key IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            seen.update(key for key, in cursor)
+
+        fresh = []
+        for row in rows:
+            key = row.get('idempotency_key')
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            fresh.append(row)
+        return fresh
+
+    def latest_health_row(self, user_id: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        with self._read() as conn:
+            row = conn.execute(
+                f"SELECT {_select_columns(columns)} FROM health_data "
+                "WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def iter_health_rows(self,
+                         user_id: str,
+                         since_ms: int,
+                         columns: Optional[Sequence[str]] = None,
+                         page_size: int = 1000) -> Iterator[Dict]:
+        # Keyset pages on (timestamp, id), so no connection or lock is held
+        # between yields and equal timestamps are never skipped
+        sql = (
+            f"SELECT {_select_columns(columns)}, id AS _row_id FROM health_data "
+            "WHERE user_id = ? AND (timestamp, id) > (?, ?) "
+            "ORDER BY timestamp, id LIMIT ?"
+        )
+        # Row ids are positive, so (since_ms, 0) is just below the first row at since_ms
+        last_timestamp, last_id = since_ms, 0
+        while True:
+            with self._read() as conn:
+                page = conn.execute(sql, (user_id, last_timestamp, last_id, page_size)).fetchall()
+            for row in page:
+                row = dict(row)
+                last_id = row.pop('_row_id')
+                yield row
+            if len(page) < page_size:
+                return
+            last_timestamp = page[-1]['timestamp']
+
+    def fetch_rollups(self,
+                      user_id: str,
+                      resolution: str,
+                      start_ms: int,
+                      end_ms: int,
+                      metrics: Optional[Iterable[str]] = None) -> List[Dict]:
+        with self._read() as conn:
+            return sqlite_fetch(conn, user_id, resolution, start_ms, end_ms, metrics)
+
+    def health_stats(self, user_id: str, since_ms: int) -> Dict:
+        with self._read() as conn:
+            row = conn.execute(_HEALTH_STATS, (user_id, since_ms)).fetchone()
+        stats = {}
+        for index, column in enumerate(ROLLUP_METRICS):
+            avg, count, low, high = row[4 * index:4 * index + 4]
+            if count:
+                stats[column] = {'avg': avg, 'count': count, 'min': low, 'max': high}
+        return stats
+
+    def last_sync_time(self, user_id: str) -> Optional[str]:
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT synced_at FROM sync_history WHERE user_id = ? AND status = 'success' "
+                "ORDER BY synced_at DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    # ---- recommendations ----
+
+    def users_needing_recommendations(self) -> List[Dict]:
+        with self._read() as conn:
+            return [dict(row) for row in conn.execute(_USERS_NEEDING_RECOMMENDATIONS)]
+
+    def upsert_recommendation(self, record: Dict) -> None:
+        with self._write() as conn:
+            conn.execute(_UPSERT_RECOMMENDATION, record)
+
+    def get_recommendation(self, user_id: str) -> Optional[Dict]:
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT data_version, recommendations, generated_at FROM recommendations WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    # ---- pairing ----
+
+    def insert_pairing_code(self, record: Dict) -> None:
+        try:
+            with self._write() as conn:
+                conn.execute(
+                    "INSERT INTO pairing_codes (code, user_id, used, created_at, expires_at) "
+                    "VALUES (:code, :user_id, :used, :created_at, :expires_at)",
+                    record
+                )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKey(record['code']) from e
+
+    def delete_stale_pairing_code(self, code: str, now_iso: str) -> None:
+        with self._write() as conn:
+            conn.execute(
+                "DELETE FROM pairing_codes WHERE code = ? AND (used = 1 OR expires_at <= ?)",
+                (code, now_iso)
+            )
+
+    def consume_pairing_code(self, code: str, now_iso: str) -> Optional[str]:
+        # UPDATE and read back in one write transaction (no RETURNING before SQLite 3.35)
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE pairing_codes SET used = 1 WHERE code = ? AND used = 0 AND expires_at > ?",
+                (code, now_iso)
+            )
+            if cursor.rowcount == 0:
+                return None
+            row = conn.execute("SELECT user_id FROM pairing_codes WHERE code = ?", (code,)).fetchone()
+        return row[0]
+
+    # ---- misc ----
+
+    def ping(self) -> None:
+        with self._read() as conn:
+            conn.execute("SELECT 1").fetchone()
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,220 @@
+"""
+Supabase storage backend for GAIA Backend
+PostgREST queries against the tables of supabase_schema.sql
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from health_rollups import ROLLUP_FIELDS
+from storage import DuplicateKey, StorageBackend
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# The SDK import and client construction are deferred to the first query,
+# so importing this module (server start, tests, worker fork) stays cheap
+_client: Optional['Client'] = None
+_client_lock = threading.Lock()
+
+
+def get_supabase() -> 'Client':
+    """Shared Supabase client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url = os.getenv('SUPABASE_URL')
+                key = os.getenv('SUPABASE_KEY')
+                if not url or not key:
+                    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+                from supabase import create_client
+                _client = create_client(url, key)
+    return _client
+
+
+def _select_columns(columns: Optional[Iterable[str]]) -> str:
+    """Build a PostgREST select list, always keeping the keyset columns"""
+    if not columns:
+        return '*'
+    selected = ['id', 'user_id', 'timestamp']
+    selected += [c for c in columns if c not in selected]
+    return ','.join(selected)
+
+
+class SupabaseBackend(StorageBackend):
+    name = 'supabase'
+
+    # ---- users ----
+
+    def get_user(self, field: str, value: str) -> Optional[Dict]:
+        response = get_supabase().table('users').select('*').eq(field, value).execute()
+        return response.data[0] if response.data else None
+
+    def insert_user(self, record: Dict) -> Optional[Dict]:
+        response = get_supabase().table('users').insert(record).execute()
+        return response.data[0] if response.data else None
+
+    def update_user(self, user_id: str, updates: Dict) -> None:
+        get_supabase().table('users').update(updates).eq('id', user_id).execute()
+
+    # ---- health data / sync history ----
+
+    def insert_rows(self, table: str, rows: List[Dict]) -> None:
+        # PostgREST bulk inserts need every row to share the same columns
+        columns = set().union(*rows)
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+
+        get_supabase().table(table) \
+            .upsert(rows, on_conflict='idempotency_key', ignore_duplicates=True) \
+            .execute()
+
+    def latest_health_row(self, user_id: str, columns: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        response = get_supabase().table('health_data') \
+            .select(_select_columns(columns)) \
+            .eq('user_id', user_id) \
+            .order('timestamp', desc=True) \
+            .limit(1) \
+            .execute()
+        return response.data[0] if response.data else None
+
+    def iter_health_rows(self,
+                         user_id: str,
+                         since_ms: int,
+                         columns: Optional[Sequence[str]] = None,
+                         page_size: int = 1000) -> Iterator[Dict]:
+        # Keyset pagination on (timestamp, id): one page in memory, deep pages
+        # as cheap as the first (idx_health_data_user_timestamp_id) and rows
+        # sharing a timestamp across a page boundary are not skipped
+        select = _select_columns(columns)
+        last = None
+
+        while True:
+            query = get_supabase().table('health_data') \
+                .select(select) \
+                .eq('user_id', user_id)
+
+            if last is None:
+                query = query.gte('timestamp', since_ms)
+            else:
+                last_timestamp, last_id = last
+                query = query.or_(
+                    f"timestamp.gt.{last_timestamp},"
+                    f"and(timestamp.eq.{last_timestamp},id.gt.{last_id})"
+                )
+
+            response = query \
+                .order('timestamp', desc=False) \
+                .order('id', desc=False) \
+                .limit(page_size) \
+                .execute()
+
+            page = response.data or []
+            yield from page
+
+            if len(page) < page_size:
+                return
+            last = (page[-1]['timestamp'], page[-1]['id'])
+
+    def fetch_rollups(self,
+                      user_id: str,
+                      resolution: str,
+                      start_ms: int,
+                      end_ms: int,
+                      metrics: Optional[Iterable[str]] = None,
+                      page_size: int = 1000) -> List[Dict]:
+        rows: List[Dict] = []
+        while True:
+            query = get_supabase().table('health_rollups')\
+                .select(','.join(ROLLUP_FIELDS))\
+                .eq('user_id', user_id)\
+                .eq('resolution', resolution)\
+                .gte('bucket_start', start_ms)\
+                .lt('bucket_start', end_ms)
+            if metrics:
+                query = query.in_('metric', list(metrics))
+            page = query.order('bucket_start').order('metric')\
+                .range(len(rows), len(rows) + page_size - 1)\
+                .execute().data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    def rollups_ready(self) -> bool:
+        # Row written by rebuild_health_rollups(), see supabase_schema.sql
+        response = get_supabase().table('health_rollups_backfill').select('completed_at').limit(1).execute()
+        return bool(response.data)
+
+    def health_stats(self, user_id: str, since_ms: int) -> Dict:
+        # get_health_stats Postgres function, see supabase_schema.sql
+        response = get_supabase().rpc('get_health_stats', {
+            'p_user_id': user_id,
+            'p_since': since_ms
+        }).execute()
+
+        stats = response.data or {}
+        if isinstance(stats, list):
+            stats = stats[0] if stats else {}
+        return stats
+
+    def last_sync_time(self, user_id: str) -> Optional[str]:
+        response = get_supabase().table('sync_history') \
+            .select('synced_at') \
+            .eq('user_id', user_id) \
+            .eq('status', 'success') \
+            .order('synced_at', desc=True) \
+            .limit(1) \
+            .execute()
+        return response.data[0]['synced_at'] if response.data else None
+
+    # ---- recommendations ----
+
+    def users_needing_recommendations(self) -> List[Dict]:
+        response = get_supabase().rpc('users_needing_recommendations', {}).execute()
+        return response.data or []
+
+    def upsert_recommendation(self, record: Dict) -> None:
+        get_supabase().table('recommendations').upsert(record, on_conflict='user_id').execute()
+
+    def get_recommendation(self, user_id: str) -> Optional[Dict]:
+        response = get_supabase().table('recommendations') \
+            .select('data_version,recommendations,generated_at') \
+            .eq('user_id', user_id) \
+            .limit(1) \
+            .execute()
+        return response.data[0] if response.data else None
+
+    # ---- pairing ----
+
+    def insert_pairing_code(self, record: Dict) -> None:
+        try:
+            get_supabase().table('pairing_codes').insert(record).execute()
+        except Exception as e:
+            # 23505: unique_violation on pairing_codes.code
+            if getattr(e, 'code', None) == '23505':
+                raise DuplicateKey(record['code']) from e
+            raise
+
+    def delete_stale_pairing_code(self, code: str, now_iso: str) -> None:
+        get_supabase().table('pairing_codes') \
+            .delete() \
+            .eq('code', code) \
+            .or_(f"used.eq.true,expires_at.lte.{now_iso}") \
+            .execute()
+
+    def consume_pairing_code(self, code: str, now_iso: str) -> Optional[str]:
+        # One conditional UPDATE ... RETURNING: concurrent redemptions of
+        # the same code cannot both succeed
+        response = get_supabase().table('pairing_codes') \
+            .update({'used': True}) \
+            .eq('code', code) \
+            .eq('used', False) \
+            .gt('expires_at', now_iso) \
+            .execute()
+        return response.data[0]['user_id'] if response.data else None
+
+    # ---- misc ----
+
+    def ping(self) -> None:
+        get_supabase().table('users').select('count').execute()
@@ -0,0 +1,122 @@
+"""
+Structured, non-blocking logging for GAIA Backend
+Request threads only enqueue log records; a background listener formats
+them as JSON lines and writes them out.
+
+Usage:
+    from structured_logging import get_logger, sampled
+    logger = get_logger(__name__)
+    logger.info("Health data synced", extra={'fields': {'userId': user_id}})
+    logger.debug("Received sync request: %s", data)        # formatted only if DEBUG
+    logger.info("Sync metrics", extra=sampled(0.01, hr=hr))  # ~1% of calls
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from typing import Dict
+
+LOG_LEVEL = os.getenv('GAIA_LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.getenv('GAIA_LOG_QUEUE_SIZE', '10000'))
+
+_stats = {'enqueued': 0, 'dropped': 0, 'sampled_out': 0}
+_setup_lock = threading.Lock()
+_listener = None
+
+
+def sampled(rate: float, **fields) -> Dict:
+    """`extra=` for a high-volume event kept with probability `rate`"""
+    return {'sample_rate': rate, 'fields': fields}
+
+
+class SamplingFilter(logging.Filter):
+    """Drops records whose `sample_rate` extra loses the coin toss"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        _stats['sampled_out'] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and never formats on the caller thread
+
+    The stock QueueHandler renders the message in prepare(); here the
+    record is enqueued as-is and formatting happens in the listener. When
+    the queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            _stats['enqueued'] += 1
+        except queue.Full:
+            _stats['dropped'] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus `fields` extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        # ensure_ascii keeps output safe on cp1252 Windows consoles
+        return json.dumps(entry, default=str)
+
+
+def _configure() -> None:
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+
+        handler = NonBlockingQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger('gaia')
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the 'gaia' hierarchy, wired to the async JSON handler"""
+    _configure()
+    return logging.getLogger(f"gaia.{name}")
+
+
+def get_log_stats() -> Dict:
+    """Counters: records enqueued, dropped (queue full) and sampled out"""
+    stats = dict(_stats)
+    stats['queued'] = _listener.queue.qsize() if _listener is not None else 0
+    return stats
@@ -1,44 +1,148 @@
 """
 Supabase Database Client for GAIA Backend
 Handles all database operations for user data, health metrics, and sync history
+
+Queries go through a storage backend (see storage.py): hosted Supabase by
+default, a local SQLite file with GAIA_STORAGE=sqlite.
 """
 
 import os
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from supabase import create_client, Client
+from typing import Dict, Iterable, Iterator, List, Optional, Any
 from dotenv import load_dotenv
 
+from health_rollups import rollup_series, rollup_stats
+from health_schema import db_row_to_frontend, nested_to_db_row
+from offline_queue import StoreAndForward, claim_directory
+from pairing_codes import PAIRING_CODE_TTL, generate_pairing_code
+from storage import DuplicateKey, StorageUnavailable, get_backend
+from storage_supabase import get_supabase
+from ttl_cache import TTLCache
+from write_buffer import WriteBuffer
+
 load_dotenv()
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_KEY')
+# ==================== CLIENT ====================
+
+def __getattr__(name: str):
+    # Backwards compatible `supabase_client.supabase` attribute
+    if name == 'supabase':
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ==================== WRITE BUFFER ====================
+
+def _bulk_insert(table: str, rows: List[Dict]) -> None:
+    """Insert a batch of rows, skipping ones already written by a previous attempt"""
+    get_backend().insert_rows(table, rows)
+
+    # A read between enqueue and flush may have cached a stale latest row
+    if table == 'health_data':
+        for user_id in {row['user_id'] for row in rows}:
+            latest_health_cache.invalidate(user_id)
+
+# With GAIA_OFFLINE_QUEUE_DIR set, rows are spooled to local disk and
+# forwarded whenever the database is reachable (see offline_queue.py);
+# otherwise they are buffered in memory and dropped after max_retries
+OFFLINE_QUEUE_DIR = os.getenv('GAIA_OFFLINE_QUEUE_DIR')
+
+if OFFLINE_QUEUE_DIR:
+    write_buffer = StoreAndForward(
+        claim_directory(OFFLINE_QUEUE_DIR),
+        _bulk_insert,
+        probe=lambda: get_backend().ping(),
+        batch_size=int(os.getenv('GAIA_WRITE_BATCH_SIZE', '500')),
+        max_delay=float(os.getenv('GAIA_OFFLINE_QUEUE_MAX_BACKOFF', '60')),
+        max_bytes=int(os.getenv('GAIA_OFFLINE_QUEUE_MAX_MB', '256')) * 1024 * 1024,
+        fsync=os.getenv('GAIA_OFFLINE_QUEUE_FSYNC', '1') == '1'
+    )
+else:
+    write_buffer = WriteBuffer(
+        _bulk_insert,
+        batch_size=int(os.getenv('GAIA_WRITE_BATCH_SIZE', '500')),
+        flush_interval=float(os.getenv('GAIA_WRITE_FLUSH_INTERVAL', '1.0')),
+        max_queue=int(os.getenv('GAIA_WRITE_MAX_QUEUE', '10000'))
+    )
+write_buffer.register_shutdown_flush()
+
+def flush_pending_writes() -> None:
+    """Write all buffered health_data / sync_history rows now"""
+    write_buffer.flush()
+
+def get_write_stats() -> Dict:
+    """Counters of the write buffer / offline queue"""
+    if isinstance(write_buffer, StoreAndForward):
+        return write_buffer.status()
+    return {**write_buffer.stats(), 'pending': write_buffer.pending()}
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
+# ==================== READ CACHE ====================
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Profiles change rarely; the latest snapshot is invalidated on every save
+user_cache = TTLCache(
+    maxsize=int(os.getenv('GAIA_USER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('GAIA_USER_CACHE_TTL', '300'))
+)
+latest_health_cache = TTLCache(
+    maxsize=int(os.getenv('GAIA_LATEST_CACHE_SIZE', '4096')),
+    ttl=float(os.getenv('GAIA_LATEST_CACHE_TTL', '30'))
+)
+
+def _cache_user(user: Dict) -> None:
+    user_cache.set(('id', user.get('id')), user)
+    user_cache.set(('email', user.get('email')), user)
+
+def _invalidate_user(user_id: str, emails: Iterable[str] = ()) -> None:
+    """Drop the id entry and the email entries of `emails` and of the cached row"""
+    cached = user_cache.pop(('id', user_id))
+    for email in {*emails, cached.get('email') if cached else None} - {None}:
+        user_cache.invalidate(('email', email))
+
+def get_cache_stats() -> Dict:
+    """Hit/miss counters for the read caches"""
+    return {
+        'users': user_cache.stats(),
+        'latestHealth': latest_health_cache.stats()
+    }
 
 # ==================== USER OPERATIONS ====================
 
 def get_user_by_id(user_id: str) -> Optional[Dict]:
     """Get user profile by ID"""
+    cached = user_cache.get(('id', user_id))
+    if cached is not None:
+        return dict(cached)
+
     try:
-        response = supabase.table('users').select('*').eq('id', user_id).execute()
-        return response.data[0] if response.data else None
+        user = get_backend().get_user('id', user_id)
+        if not user:
+            return None
+        _cache_user(user)
+        return dict(user)
     except Exception as e:
         print(f"Error fetching user: {e}")
         return None
 
 def get_user_by_email(email: str) -> Optional[Dict]:
-    """Get user by email"""
+    """
+    Get user by email (None if there is no such user)
+
+    Raises:
+        StorageUnavailable: if the query failed, so that login can answer
+            503 rather than reporting wrong credentials
+    """
+    cached = user_cache.get(('email', email))
+    if cached is not None:
+        return dict(cached)
+
     try:
-        response = supabase.table('users').select('*').eq('email', email).execute()
-        return response.data[0] if response.data else None
+        user = get_backend().get_user('email', email)
+        if not user:
+            return None
+        _cache_user(user)
+        return dict(user)
     except Exception as e:
-        print(f"Error fetching user by email: {e}")
-        return None
+        raise StorageUnavailable(f"Error fetching user by email: {e}") from e
 
 def create_user(email: str, password_hash: str, user_data: Dict) -> Optional[Dict]:
     """Create new user"""
@@ -53,8 +157,12 @@ def create_user(email: str, password_hash: str, user_data: Dict) -> Optional[Dic
             'created_at': datetime.utcnow().isoformat(),
             'last_login': datetime.utcnow().isoformat()
         }
-        response = supabase.table('users').insert(user_record).execute()
-        return response.data[0] if response.data else None
+        user_cache.invalidate(('email', email))
+        user = get_backend().insert_user(user_record)
+        if not user:
+            return None
+        _cache_user(user)
+        return dict(user)
     except Exception as e:
         print(f"Error creating user: {e}")
         return None
@@ -62,7 +170,15 @@ def create_user(email: str, password_hash: str, user_data: Dict) -> Optional[Dic
 def update_user_profile(user_id: str, updates: Dict) -> bool:
     """Update user profile"""
     try:
-        supabase.table('users').update(updates).eq('id', user_id).execute()
+        # The email entry outlives an evicted id entry: take the address from
+        # the row when needed (and the new one, if the update changes it)
+        current = user_cache.pop(('id', user_id)) or get_backend().get_user('id', user_id)
+        emails = {current.get('email')} if current else set()
+        if updates.get('email'):
+            emails.add(updates['email'])
+        _invalidate_user(user_id, emails)
+        get_backend().update_user(user_id, updates)
+        _invalidate_user(user_id, emails)
         return True
     except Exception as e:
         print(f"Error updating user: {e}")
@@ -70,133 +186,274 @@ def update_user_profile(user_id: str, updates: Dict) -> bool:
 
 # ==================== HEALTH DATA OPERATIONS ====================
 
+def _health_record(user_id: str, health_data: Dict, timestamp: Optional[int]) -> Dict:
+    timestamp = int(time.time() * 1000) if timestamp is None else int(timestamp)
+    return {
+        'user_id': user_id,
+        'timestamp': timestamp,
+        'synced_at': datetime.utcnow().isoformat(),
+        'idempotency_key': f"{user_id}:{timestamp}",
+        # Metric columns (None values dropped), see health_schema.METRICS
+        **nested_to_db_row(health_data)
+    }
+
 def save_health_data(user_id: str, health_data: Dict, timestamp: int) -> bool:
     """
     Save health data from mobile app sync
+
+    The row is queued on the write buffer (or the offline queue) and
+    inserted in bulk with other syncs; returns False only if the buffer
+    is full.
     
     Args:
         user_id: User UUID
         health_data: Dict with health metrics (heartRate, bloodPressure, etc.)
-        timestamp: Unix timestamp in milliseconds
+        timestamp: Unix timestamp in milliseconds (None: now)
     """
     try:
-        # Extract metrics from health_data
-        record = {
-            'user_id': user_id,
-            'timestamp': timestamp,
-            'synced_at': datetime.utcnow().isoformat(),
-            
-            # Core metrics (always present)
-            'heart_rate': health_data.get('heartRate', {}).get('value'),
-            'blood_pressure_systolic': health_data.get('bloodPressure', {}).get('systolic'),
-            'blood_pressure_diastolic': health_data.get('bloodPressure', {}).get('diastolic'),
-            'temperature': health_data.get('temperature', {}).get('value'),
-            'steps': health_data.get('steps', {}).get('value'),
-            
-            # Extended metrics from Samsung Health / Google Fit
-            'sleep_duration': health_data.get('sleep', {}).get('duration'),
-            'sleep_quality': health_data.get('sleep', {}).get('quality'),
-            'sleep_deep': health_data.get('sleep', {}).get('stages', {}).get('deep'),
-            'sleep_light': health_data.get('sleep', {}).get('stages', {}).get('light'),
-            'sleep_rem': health_data.get('sleep', {}).get('stages', {}).get('rem'),
-            
-            'oxygen_saturation': health_data.get('oxygenSaturation', {}).get('value'),
-            'stress_level': health_data.get('stressLevel', {}).get('value'),
-            'fatigue': health_data.get('fatigue', {}).get('value'),
-            'respiratory_rate': health_data.get('respiratoryRate', {}).get('value'),
-            
-            # Vehicle-specific metrics (if available from mobile sensors)
-            'ambient_noise': health_data.get('ambiance', {}).get('value'),
-        }
-        
-        # Remove None values
-        record = {k: v for k, v in record.items() if v is not None}
-        
-        response = supabase.table('health_data').insert(record).execute()
-        print(f"✅ Health data saved for user {user_id}")
+        record = _health_record(user_id, health_data, timestamp)
+
+        latest_health_cache.invalidate(user_id)
+
+        if not write_buffer.enqueue('health_data', record):
+            print(f"❌ Write buffer full, health data not queued for user {user_id}")
+            return False
         return True
         
     except Exception as e:
         print(f"❌ Error saving health data: {e}")
         return False
 
-def get_latest_health_data(user_id: str) -> Optional[Dict]:
-    """Get most recent health data for a user"""
+def save_health_data_many(samples: Iterable) -> List[bool]:
+    """
+    Save (user_id, timestamp, health_data) samples from a batch sync
+
+    Queued in one call, so the offline queue writes (and fsyncs) once.
+    Returns, per sample, whether it was queued (the write buffer queues
+    a batch all or none).
+    """
+    samples = list(samples)
+    try:
+        records = [_health_record(user_id, health_data, timestamp)
+                   for user_id, timestamp, health_data in samples]
+
+        for user_id in {record['user_id'] for record in records}:
+            latest_health_cache.invalidate(user_id)
+
+        if not write_buffer.enqueue_many(('health_data', record) for record in records):
+            print(f"❌ Write buffer full, {len(records)} health samples not queued")
+            return [False] * len(samples)
+        return [True] * len(samples)
+
+    except Exception as e:
+        print(f"❌ Error saving health data batch: {e}")
+        return [False] * len(samples)
+
+def get_latest_health_data(user_id: str, columns: Optional[Iterable[str]] = None) -> Optional[Dict]:
+    """
+    Get most recent health data for a user
+
+    Args:
+        user_id: User UUID
+        columns: Metric columns to fetch (default: all)
+    """
+    # Only full rows are cached; projected reads always go to the database
+    if columns is None:
+        cached = latest_health_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
     try:
-        response = supabase.table('health_data') \
-            .select('*') \
-            .eq('user_id', user_id) \
-            .order('timestamp', desc=True) \
-            .limit(1) \
-            .execute()
+        row = get_backend().latest_health_row(user_id, list(columns) if columns else None)
         
-        if response.data:
-            return response.data[0]
+        if row:
+            if columns is None:
+                latest_health_cache.set(user_id, row)
+            return dict(row)
         return None
         
     except Exception as e:
         print(f"Error fetching latest health data: {e}")
         return None
 
-def get_health_data_range(user_id: str, days: int = 7) -> List[Dict]:
+def iter_health_data_range(user_id: str,
+                           days: int = 7,
+                           columns: Optional[Iterable[str]] = None,
+                           page_size: int = 1000) -> Iterator[Dict]:
+    """
+    Stream health data for last N days, oldest first
+
+    Pages are fetched with keyset pagination on (user_id, timestamp), so
+    only one page is held in memory and deep pages stay as cheap as the
+    first one (served by idx_health_data_user_timestamp).
+
+    Raises on query errors so callers can tell a failed scan from an
+    empty one.
+    """
+    cutoff_time = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+    return get_backend().iter_health_rows(
+        user_id, cutoff_time, list(columns) if columns else None, page_size
+    )
+
+def get_health_data_range(user_id: str,
+                          days: int = 7,
+                          columns: Optional[Iterable[str]] = None) -> List[Dict]:
     """
     Get health data for last N days
     Used for calculating averages and trends
+
+    Loads the whole range into memory; prefer iter_health_data_range for
+    long ranges.
     """
     try:
-        cutoff_time = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
-        
-        response = supabase.table('health_data') \
-            .select('*') \
-            .eq('user_id', user_id) \
-            .gte('timestamp', cutoff_time) \
-            .order('timestamp', desc=False) \
-            .execute()
-        
-        return response.data if response.data else []
+        return list(iter_health_data_range(user_id, days, columns))
         
     except Exception as e:
         print(f"Error fetching health data range: {e}")
         return []
 
+# Metrics aggregated by get_health_averages / get_health_stats
+AVERAGE_METRICS = (
+    'heart_rate',
+    'blood_pressure_systolic',
+    'temperature',
+    'steps',
+    'sleep_duration',
+    'oxygen_saturation',
+    'stress_level',
+    'fatigue',
+    'respiratory_rate',
+)
+
+def aggregate_health_rows(rows: Iterable[Dict]) -> Dict:
+    """
+    Compute per-metric avg/count/min/max from raw health_data rows
+
+    Local equivalent of the get_health_stats Postgres function, used as a
+    fallback when the RPC is not deployed and for offline testing.
+    Consumes `rows` in a single pass, so it accepts a generator.
+    """
+    totals = {key: 0 for key in AVERAGE_METRICS}
+    counts = {key: 0 for key in AVERAGE_METRICS}
+    lows = {}
+    highs = {}
+
+    for record in rows:
+        for key in AVERAGE_METRICS:
+            value = record.get(key)
+            if value is None:
+                continue
+            totals[key] += value
+            counts[key] += 1
+            if key not in lows or value < lows[key]:
+                lows[key] = value
+            if key not in highs or value > highs[key]:
+                highs[key] = value
+
+    return {
+        key: {
+            'avg': totals[key] / counts[key],
+            'count': counts[key],
+            'min': lows[key],
+            'max': highs[key]
+        }
+        for key in AVERAGE_METRICS if counts[key] > 0
+    }
+
+def fetch_rollups(user_id: str,
+                  resolution: str,
+                  start_ms: int,
+                  end_ms: int,
+                  metrics: Optional[Iterable[str]] = None) -> List[Dict]:
+    """
+    health_rollups rows of one resolution with start_ms <= bucket_start < end_ms
+
+    Raises on errors so callers can fall back to raw rows.
+    """
+    return get_backend().fetch_rollups(user_id, resolution, start_ms, end_ms, metrics)
+
+# Rollups created on a database that already had health_data only cover
+# later rows until rebuild_health_rollups() has run; until the backend
+# reports the backfill done (rechecked every minute), stats skip them
+ROLLUPS_RECHECK_INTERVAL = 60.0
+_rollups_ready = False
+_rollups_checked_at: Optional[float] = None
+
+def rollups_ready() -> bool:
+    """True once health_rollups has been backfilled"""
+    global _rollups_ready, _rollups_checked_at
+    now = time.monotonic()
+    if not _rollups_ready and (_rollups_checked_at is None
+                               or now - _rollups_checked_at >= ROLLUPS_RECHECK_INTERVAL):
+        _rollups_checked_at = now
+        try:
+            _rollups_ready = get_backend().rollups_ready()
+        except Exception as e:
+            print(f"Could not check health_rollups backfill: {e}")
+    return _rollups_ready
+
+def get_health_stats(user_id: str, days: int = 7) -> Dict:
+    """
+    Get per-metric avg/count/min/max over last N days
+
+    Read from the health_rollups buckets (a few hundred rows for any
+    window, see health_rollups.cover_range) once they are backfilled. If
+    they are not, or are unavailable or empty, aggregation runs in the
+    database (get_health_stats RPC, see supabase_schema.sql, or one SQL
+    query on SQLite), and as a last resort raw rows are aggregated locally.
+    """
+    now_ms = int(time.time() * 1000)
+    cutoff_time = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+
+    if rollups_ready():
+        try:
+            stats = rollup_stats(fetch_rollups, user_id, cutoff_time, now_ms + 1, AVERAGE_METRICS)
+            if stats:
+                return stats
+        except Exception as e:
+            print(f"health_rollups unavailable, using get_health_stats RPC: {e}")
+
+    try:
+        stats = get_backend().health_stats(user_id, cutoff_time)
+
+        return {
+            key: value for key, value in stats.items()
+            if key in AVERAGE_METRICS and value and value.get('count')
+        }
+
+    except Exception as e:
+        print(f"get_health_stats RPC unavailable, aggregating locally: {e}")
+        return aggregate_health_rows(
+            iter_health_data_range(user_id, days, columns=AVERAGE_METRICS)
+        )
+
+def get_health_series(user_id: str, metric: str, days: int = 7, max_points: int = 500) -> Dict:
+    """
+    Chart series of one health_data metric over last N days, from rollups
+
+    The resolution (1m / 1h / 1d) is the finest that fits in max_points:
+    hourly for a week, daily for a month. Returns {resolution, timestamp,
+    avg, min, max, count}, or {} on error.
+    """
+    now_ms = int(time.time() * 1000)
+    cutoff_time = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+
+    try:
+        return rollup_series(fetch_rollups, user_id, metric, cutoff_time, now_ms + 1, max_points)
+    except Exception as e:
+        print(f"Error getting health series: {e}")
+        return {}
+
 def get_health_averages(user_id: str, days: int = 7) -> Dict:
     """Calculate average health metrics over last N days"""
     try:
-        data = get_health_data_range(user_id, days)
-        
-        if not data:
-            return {}
-        
-        # Calculate averages
-        totals = {
-            'heart_rate': 0,
-            'blood_pressure_systolic': 0,
-            'temperature': 0,
-            'steps': 0,
-            'sleep_duration': 0,
-            'oxygen_saturation': 0,
-            'stress_level': 0,
-            'fatigue': 0,
-            'respiratory_rate': 0
+        stats = get_health_stats(user_id, days)
+
+        return {
+            key: round(float(value['avg']), 1)
+            for key, value in stats.items()
         }
-        
-        counts = {k: 0 for k in totals.keys()}
-        
-        for record in data:
-            for key in totals.keys():
-                value = record.get(key)
-                if value is not None:
-                    totals[key] += value
-                    counts[key] += 1
-        
-        # Calculate averages
-        averages = {}
-        for key in totals.keys():
-            if counts[key] > 0:
-                averages[key] = round(totals[key] / counts[key], 1)
-        
-        return averages
-        
+
     except Exception as e:
         print(f"Error calculating averages: {e}")
         return {}
@@ -211,11 +468,11 @@ def log_sync(user_id: str, sync_id: str, status: str, message: str = None) -> bo
             'sync_id': sync_id,
             'status': status,
             'message': message,
-            'synced_at': datetime.utcnow().isoformat()
+            'synced_at': datetime.utcnow().isoformat(),
+            'idempotency_key': f"{sync_id}:{status}"
         }
         
-        supabase.table('sync_history').insert(record).execute()
-        return True
+        return write_buffer.enqueue('sync_history', record)
         
     except Exception as e:
         print(f"Error logging sync: {e}")
@@ -224,71 +481,100 @@ def log_sync(user_id: str, sync_id: str, status: str, message: str = None) -> bo
 def get_last_sync_time(user_id: str) -> Optional[str]:
     """Get timestamp of last successful sync"""
     try:
-        response = supabase.table('sync_history') \
-            .select('synced_at') \
-            .eq('user_id', user_id) \
-            .eq('status', 'success') \
-            .order('synced_at', desc=True) \
-            .limit(1) \
-            .execute()
-        
-        if response.data:
-            return response.data[0]['synced_at']
-        return None
+        return get_backend().last_sync_time(user_id)
         
     except Exception as e:
         print(f"Error fetching last sync time: {e}")
         return None
 
-# ==================== PAIRING OPERATIONS ====================
+# ==================== RECOMMENDATION OPERATIONS ====================
 
-def create_pairing_code(user_id: str) -> str:
-    """Generate a 6-digit pairing code for mobile app connection"""
-    import random
-    code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-    
+def get_users_needing_recommendations() -> List[Dict]:
+    """
+    Users whose latest health_data is newer than their stored recommendation
+
+    Returns rows of {user_id, data_version}, data_version being the
+    timestamp of the user's latest health_data row.
+    """
     try:
-        record = {
+        return get_backend().users_needing_recommendations()
+    except Exception as e:
+        print(f"Error listing users needing recommendations: {e}")
+        return []
+
+def save_recommendation(user_id: str, data_version: int, text: str) -> bool:
+    """Store precomputed recommendations for a user's data version"""
+    try:
+        get_backend().upsert_recommendation({
             'user_id': user_id,
-            'code': code,
-            'expires_at': (datetime.utcnow() + timedelta(minutes=10)).isoformat(),
-            'created_at': datetime.utcnow().isoformat(),
-            'used': False
-        }
-        
-        supabase.table('pairing_codes').insert(record).execute()
-        return code
-        
+            'data_version': data_version,
+            'recommendations': text,
+            'generated_at': datetime.utcnow().isoformat()
+        })
+        return True
+    except Exception as e:
+        print(f"Error saving recommendation: {e}")
+        return False
+
+def get_recommendation(user_id: str) -> Optional[Dict]:
+    """Get stored recommendations ({data_version, recommendations, generated_at})"""
+    try:
+        return get_backend().get_recommendation(user_id)
     except Exception as e:
-        print(f"Error creating pairing code: {e}")
+        print(f"Error fetching recommendation: {e}")
         return None
 
+# ==================== PAIRING OPERATIONS ====================
+
+def create_pairing_code(user_id: str, max_attempts: int = 5) -> Optional[str]:
+    """
+    Generate a 6-digit pairing code for mobile app connection
+
+    The code column is UNIQUE, so a collision surfaces as a unique
+    violation: a used or expired holder of the code is recycled and a new
+    code is drawn, up to max_attempts times.
+    """
+    for _ in range(max_attempts):
+        code = generate_pairing_code()
+        now = datetime.utcnow()
+
+        try:
+            record = {
+                'user_id': user_id,
+                'code': code,
+                'expires_at': (now + PAIRING_CODE_TTL).isoformat(),
+                'created_at': now.isoformat(),
+                'used': False
+            }
+            
+            get_backend().insert_pairing_code(record)
+            return code
+            
+        except DuplicateKey:
+            # Collision: free the code if its current holder is stale
+            try:
+                get_backend().delete_stale_pairing_code(code, now.isoformat())
+            except Exception as e:
+                print(f"Error creating pairing code: {e}")
+                return None
+
+        except Exception as e:
+            print(f"Error creating pairing code: {e}")
+            return None
+
+    print(f"Error creating pairing code: no free code after {max_attempts} attempts")
+    return None
+
 def validate_pairing_code(code: str) -> Optional[str]:
-    """Validate pairing code and return user_id if valid"""
+    """
+    Validate pairing code and return user_id if valid
+
+    Validation and consumption happen in one conditional UPDATE (one write
+    transaction on SQLite), so concurrent redemptions of the same code
+    cannot both succeed.
+    """
     try:
-        response = supabase.table('pairing_codes') \
-            .select('*') \
-            .eq('code', code) \
-            .eq('used', False) \
-            .execute()
-        
-        if not response.data:
-            return None
-        
-        pairing = response.data[0]
-        
-        # Check expiration
-        expires_at = datetime.fromisoformat(pairing['expires_at'])
-        if datetime.utcnow() > expires_at:
-            return None
-        
-        # Mark as used
-        supabase.table('pairing_codes') \
-            .update({'used': True}) \
-            .eq('code', code) \
-            .execute()
-        
-        return pairing['user_id']
+        return get_backend().consume_pairing_code(code, datetime.utcnow().isoformat())
         
     except Exception as e:
         print(f"Error validating pairing code: {e}")
@@ -298,36 +584,17 @@ def validate_pairing_code(code: str) -> Optional[str]:
 
 def format_health_data_for_frontend(db_record: Dict) -> Dict:
     """Convert database record to frontend-expected format"""
-    return {
-        'heartBeat': db_record.get('heart_rate', 72),
-        'tension': db_record.get('blood_pressure_systolic', 120),
-        'temperature': db_record.get('temperature', 36.5),
-        'fatigue': db_record.get('fatigue', 30),
-        'steps': db_record.get('steps', 0),
-        'sleep': {
-            'duration': db_record.get('sleep_duration', 0),
-            'quality': db_record.get('sleep_quality', 'unknown'),
-            'stages': {
-                'deep': db_record.get('sleep_deep', 0),
-                'light': db_record.get('sleep_light', 0),
-                'rem': db_record.get('sleep_rem', 0)
-            }
-        } if db_record.get('sleep_duration') else None,
-        'oxygenSaturation': db_record.get('oxygen_saturation', 98),
-        'stressLevel': db_record.get('stress_level', 30),
-        'respiratoryRate': db_record.get('respiratory_rate', 16),
-        'ambiance': db_record.get('ambient_noise', 45),
-        'lastUpdated': db_record.get('timestamp')
-    }
+    return db_row_to_frontend(db_record)
 
 def test_connection():
-    """Test Supabase connection"""
+    """Test the storage backend connection"""
+    backend = get_backend()
     try:
-        response = supabase.table('users').select('count').execute()
-        print("✅ Supabase connection successful!")
+        backend.ping()
+        print(f"✅ {backend.name} connection successful!")
         return True
     except Exception as e:
-        print(f"❌ Supabase connection failed: {e}")
+        print(f"❌ {backend.name} connection failed: {e}")
         return False
 
 if __name__ == '__main__':
@@ -24,6 +24,7 @@ CREATE TABLE IF NOT EXISTS health_data (
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     timestamp BIGINT NOT NULL, -- Unix timestamp in milliseconds
     synced_at TIMESTAMPTZ DEFAULT NOW(),
+    idempotency_key TEXT, -- "<user_id>:<timestamp>", dedups retried bulk inserts
     
     -- Core metrics (Samsung Health / Google Fit)
     heart_rate INTEGER, -- bpm
@@ -53,6 +54,14 @@ CREATE TABLE IF NOT EXISTS health_data (
 CREATE INDEX IF NOT EXISTS idx_health_data_user_id ON health_data(user_id);
 CREATE INDEX IF NOT EXISTS idx_health_data_timestamp ON health_data(timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_health_data_user_timestamp ON health_data(user_id, timestamp DESC);
+-- Keyset pages of iter_health_rows, ordered by (timestamp, id)
+CREATE INDEX IF NOT EXISTS idx_health_data_user_timestamp_id ON health_data(user_id, timestamp, id);
+
+-- Databases created before idempotency keys: CREATE TABLE IF NOT EXISTS
+-- leaves the existing table as is, so add the column and its unique index
+-- (the write buffer upserts on it)
+ALTER TABLE health_data ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_health_data_idempotency_key ON health_data(idempotency_key);
 
 -- ==================== SYNC HISTORY TABLE ====================
 CREATE TABLE IF NOT EXISTS sync_history (
@@ -61,13 +70,17 @@ CREATE TABLE IF NOT EXISTS sync_history (
     sync_id TEXT NOT NULL,
     status TEXT CHECK (status IN ('success', 'failure', 'pending')),
     message TEXT,
-    synced_at TIMESTAMPTZ DEFAULT NOW()
+    synced_at TIMESTAMPTZ DEFAULT NOW(),
+    idempotency_key TEXT -- "<sync_id>:<status>", dedups retried bulk inserts
 );
 
 -- Add indexes
 CREATE INDEX IF NOT EXISTS idx_sync_history_user_id ON sync_history(user_id);
 CREATE INDEX IF NOT EXISTS idx_sync_history_synced_at ON sync_history(synced_at DESC);
 
+ALTER TABLE sync_history ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_history_idempotency_key ON sync_history(idempotency_key);
+
 -- ==================== PAIRING CODES TABLE ====================
 CREATE TABLE IF NOT EXISTS pairing_codes (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -82,12 +95,49 @@ CREATE TABLE IF NOT EXISTS pairing_codes (
 CREATE INDEX IF NOT EXISTS idx_pairing_codes_code ON pairing_codes(code);
 CREATE INDEX IF NOT EXISTS idx_pairing_codes_user_id ON pairing_codes(user_id);
 
+-- ==================== RECOMMENDATIONS TABLE ====================
+-- Precomputed by recommendation_batch.py, one row per user
+CREATE TABLE IF NOT EXISTS recommendations (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    data_version BIGINT NOT NULL, -- timestamp of latest health_data row used
+    recommendations TEXT NOT NULL,
+    generated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- ==================== HEALTH ROLLUPS TABLE ====================
+-- 1-minute / 1-hour / 1-day aggregates per user and metric, maintained by
+-- the rollup_health_data trigger; read by supabase_client.get_health_stats
+-- and get_health_series (see health_rollups.py)
+CREATE TABLE IF NOT EXISTS health_rollups (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL, -- health_data column name
+    resolution TEXT NOT NULL CHECK (resolution IN ('1m', '1h', '1d')),
+    bucket_start BIGINT NOT NULL, -- ms, aligned to the resolution (UTC)
+    sample_count INTEGER NOT NULL,
+    value_sum DOUBLE PRECISION NOT NULL,
+    value_min DOUBLE PRECISION NOT NULL,
+    value_max DOUBLE PRECISION NOT NULL,
+    value_last DOUBLE PRECISION NOT NULL,
+    last_timestamp BIGINT NOT NULL,
+    PRIMARY KEY (user_id, resolution, metric, bucket_start)
+);
+
+-- One row once rebuild_health_rollups() has folded the health_data rows
+-- that predate the trigger; until then the backend does not read rollups
+CREATE TABLE IF NOT EXISTS health_rollups_backfill (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    completed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
 -- ==================== ROW LEVEL SECURITY (RLS) ====================
 -- Enable RLS on all tables
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE health_data ENABLE ROW LEVEL SECURITY;
 ALTER TABLE sync_history ENABLE ROW LEVEL SECURITY;
 ALTER TABLE pairing_codes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE recommendations ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE health_rollups_backfill ENABLE ROW LEVEL SECURITY;
 
 -- Policies for users table (users can only read/update their own data)
 CREATE POLICY "Users can view own profile"
@@ -125,6 +175,20 @@ CREATE POLICY "Users can insert own pairing codes"
     ON pairing_codes FOR INSERT
     WITH CHECK (auth.uid() = user_id);
 
+-- Policies for recommendations (written by the batch job with the service key)
+CREATE POLICY "Users can view own recommendations"
+    ON recommendations FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Policies for health_rollups (written by the rollup trigger only)
+CREATE POLICY "Users can view own health rollups"
+    ON health_rollups FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Anyone can view the rollup backfill state"
+    ON health_rollups_backfill FOR SELECT
+    USING (TRUE);
+
 -- ==================== FUNCTIONS & TRIGGERS ====================
 
 -- Function to update updated_at timestamp
@@ -142,6 +206,180 @@ CREATE TRIGGER update_users_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Per-metric aggregates over a time window, computed server-side
+-- Returns one JSONB object: { "heart_rate": {"avg", "count", "min", "max"}, ... }
+-- Called from supabase_client.get_health_stats via supabase.rpc()
+CREATE OR REPLACE FUNCTION get_health_stats(p_user_id UUID, p_since BIGINT)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'heart_rate', jsonb_build_object(
+            'avg', AVG(heart_rate), 'count', COUNT(heart_rate),
+            'min', MIN(heart_rate), 'max', MAX(heart_rate)),
+        'blood_pressure_systolic', jsonb_build_object(
+            'avg', AVG(blood_pressure_systolic), 'count', COUNT(blood_pressure_systolic),
+            'min', MIN(blood_pressure_systolic), 'max', MAX(blood_pressure_systolic)),
+        'temperature', jsonb_build_object(
+            'avg', AVG(temperature), 'count', COUNT(temperature),
+            'min', MIN(temperature), 'max', MAX(temperature)),
+        'steps', jsonb_build_object(
+            'avg', AVG(steps), 'count', COUNT(steps),
+            'min', MIN(steps), 'max', MAX(steps)),
+        'sleep_duration', jsonb_build_object(
+            'avg', AVG(sleep_duration), 'count', COUNT(sleep_duration),
+            'min', MIN(sleep_duration), 'max', MAX(sleep_duration)),
+        'oxygen_saturation', jsonb_build_object(
+            'avg', AVG(oxygen_saturation), 'count', COUNT(oxygen_saturation),
+            'min', MIN(oxygen_saturation), 'max', MAX(oxygen_saturation)),
+        'stress_level', jsonb_build_object(
+            'avg', AVG(stress_level), 'count', COUNT(stress_level),
+            'min', MIN(stress_level), 'max', MAX(stress_level)),
+        'fatigue', jsonb_build_object(
+            'avg', AVG(fatigue), 'count', COUNT(fatigue),
+            'min', MIN(fatigue), 'max', MAX(fatigue)),
+        'respiratory_rate', jsonb_build_object(
+            'avg', AVG(respiratory_rate), 'count', COUNT(respiratory_rate),
+            'min', MIN(respiratory_rate), 'max', MAX(respiratory_rate))
+    )
+    FROM health_data
+    WHERE user_id = p_user_id
+      AND timestamp >= p_since;
+$$ LANGUAGE sql STABLE;
+
+-- Fold each INSERT statement's new health_data rows into health_rollups
+-- (one set-based upsert per statement, so bulk inserts stay cheap).
+-- Rows skipped by ON CONFLICT DO NOTHING are not in new_rows.
+CREATE OR REPLACE FUNCTION rollup_health_data()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO health_rollups AS h (
+        user_id, metric, resolution, bucket_start, sample_count,
+        value_sum, value_min, value_max, value_last, last_timestamp
+    )
+    SELECT
+        n.user_id,
+        m.metric,
+        r.resolution,
+        n.timestamp - n.timestamp % r.width,
+        COUNT(*),
+        SUM(m.value),
+        MIN(m.value),
+        MAX(m.value),
+        (ARRAY_AGG(m.value ORDER BY n.timestamp DESC))[1],
+        MAX(n.timestamp)
+    FROM new_rows n
+    CROSS JOIN LATERAL (VALUES
+        ('heart_rate', n.heart_rate::DOUBLE PRECISION),
+        ('blood_pressure_systolic', n.blood_pressure_systolic::DOUBLE PRECISION),
+        ('blood_pressure_diastolic', n.blood_pressure_diastolic::DOUBLE PRECISION),
+        ('temperature', n.temperature::DOUBLE PRECISION),
+        ('steps', n.steps::DOUBLE PRECISION),
+        ('sleep_duration', n.sleep_duration::DOUBLE PRECISION),
+        ('sleep_deep', n.sleep_deep::DOUBLE PRECISION),
+        ('sleep_light', n.sleep_light::DOUBLE PRECISION),
+        ('sleep_rem', n.sleep_rem::DOUBLE PRECISION),
+        ('oxygen_saturation', n.oxygen_saturation::DOUBLE PRECISION),
+        ('stress_level', n.stress_level::DOUBLE PRECISION),
+        ('fatigue', n.fatigue::DOUBLE PRECISION),
+        ('respiratory_rate', n.respiratory_rate::DOUBLE PRECISION),
+        ('ambient_noise', n.ambient_noise::DOUBLE PRECISION)
+    ) AS m(metric, value)
+    CROSS JOIN (VALUES
+        ('1m', 60000::BIGINT),
+        ('1h', 3600000::BIGINT),
+        ('1d', 86400000::BIGINT)
+    ) AS r(resolution, width)
+    WHERE m.value IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (user_id, resolution, metric, bucket_start) DO UPDATE SET
+        sample_count = h.sample_count + EXCLUDED.sample_count,
+        value_sum = h.value_sum + EXCLUDED.value_sum,
+        value_min = LEAST(h.value_min, EXCLUDED.value_min),
+        value_max = GREATEST(h.value_max, EXCLUDED.value_max),
+        value_last = CASE WHEN EXCLUDED.last_timestamp >= h.last_timestamp
+                          THEN EXCLUDED.value_last ELSE h.value_last END,
+        last_timestamp = GREATEST(h.last_timestamp, EXCLUDED.last_timestamp);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER health_data_rollup
+    AFTER INSERT ON health_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION rollup_health_data();
+
+-- Rebuild health_rollups from scratch from health_data (run below on the
+-- first migration; run again by hand to repair drift):
+--   SELECT rebuild_health_rollups();
+CREATE OR REPLACE FUNCTION rebuild_health_rollups()
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM health_rollups;
+    INSERT INTO health_rollups (
+        user_id, metric, resolution, bucket_start, sample_count,
+        value_sum, value_min, value_max, value_last, last_timestamp
+    )
+    SELECT
+        d.user_id,
+        m.metric,
+        r.resolution,
+        d.timestamp - d.timestamp % r.width,
+        COUNT(*),
+        SUM(m.value),
+        MIN(m.value),
+        MAX(m.value),
+        (ARRAY_AGG(m.value ORDER BY d.timestamp DESC))[1],
+        MAX(d.timestamp)
+    FROM health_data d
+    CROSS JOIN LATERAL (VALUES
+        ('heart_rate', d.heart_rate::DOUBLE PRECISION),
+        ('blood_pressure_systolic', d.blood_pressure_systolic::DOUBLE PRECISION),
+        ('blood_pressure_diastolic', d.blood_pressure_diastolic::DOUBLE PRECISION),
+        ('temperature', d.temperature::DOUBLE PRECISION),
+        ('steps', d.steps::DOUBLE PRECISION),
+        ('sleep_duration', d.sleep_duration::DOUBLE PRECISION),
+        ('sleep_deep', d.sleep_deep::DOUBLE PRECISION),
+        ('sleep_light', d.sleep_light::DOUBLE PRECISION),
+        ('sleep_rem', d.sleep_rem::DOUBLE PRECISION),
+        ('oxygen_saturation', d.oxygen_saturation::DOUBLE PRECISION),
+        ('stress_level', d.stress_level::DOUBLE PRECISION),
+        ('fatigue', d.fatigue::DOUBLE PRECISION),
+        ('respiratory_rate', d.respiratory_rate::DOUBLE PRECISION),
+        ('ambient_noise', d.ambient_noise::DOUBLE PRECISION)
+    ) AS m(metric, value)
+    CROSS JOIN (VALUES
+        ('1m', 60000::BIGINT),
+        ('1h', 3600000::BIGINT),
+        ('1d', 86400000::BIGINT)
+    ) AS r(resolution, width)
+    WHERE m.value IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    INSERT INTO health_rollups_backfill (id) VALUES (TRUE)
+    ON CONFLICT (id) DO UPDATE SET completed_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Backfill once: rows inserted before the trigger existed
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM health_rollups_backfill) THEN
+        PERFORM rebuild_health_rollups();
+    END IF;
+END;
+$$;
+
+-- Users with health_data newer than their stored recommendations
+-- Called from supabase_client.get_users_needing_recommendations
+CREATE OR REPLACE FUNCTION users_needing_recommendations()
+RETURNS TABLE (user_id UUID, data_version BIGINT) AS $$
+    SELECT h.user_id, MAX(h.timestamp) AS data_version
+    FROM health_data h
+    LEFT JOIN recommendations r ON r.user_id = h.user_id
+    GROUP BY h.user_id, r.data_version
+    HAVING MAX(h.timestamp) > COALESCE(r.data_version, 0);
+$$ LANGUAGE sql STABLE;
+
 -- ==================== SAMPLE DATA (for testing) ====================
 
 -- Insert test user (password: 'test123' hashed with bcrypt)
@@ -209,6 +447,9 @@ ORDER BY date DESC;
 -- ==================== CLEANUP (if needed) ====================
 
 -- To drop all tables (USE WITH CAUTION):
+-- DROP TABLE IF EXISTS health_rollups_backfill CASCADE;
+-- DROP TABLE IF EXISTS health_rollups CASCADE;
+-- DROP TABLE IF EXISTS recommendations CASCADE;
 -- DROP TABLE IF EXISTS pairing_codes CASCADE;
 -- DROP TABLE IF EXISTS sync_history CASCADE;
 -- DROP TABLE IF EXISTS health_data CASCADE;
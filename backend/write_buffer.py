@@ -0,0 +1,199 @@
+"""
+Write-behind buffer for GAIA Backend
+Coalesces single-row inserts from many users into bulk inserts per table
+"""
+
+import atexit
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class WriteBuffer:
+    """
+    Bounded write-behind queue flushed by a background thread
+
+    Rows are grouped per table and handed to `insert_fn(table, rows)` in
+    batches of at most `batch_size`, either when a batch fills up or when
+    `flush_interval` seconds have passed since the oldest queued row.
+    Every row carries an `idempotency_key`, so retried batches can be
+    written with an upsert that ignores rows that already made it.
+    """
+
+    def __init__(self,
+                 insert_fn: Callable[[str, List[Dict]], None],
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 max_queue: int = 10000,
+                 max_retries: int = 5,
+                 retry_base_delay: float = 0.5):
+        self.insert_fn = insert_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        self._queue: "queue.Queue[Tuple[str, Dict]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # Updated by request threads and the flush thread
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'retries': 0
+        }
+
+    def _count(self, **deltas: int):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of the counters"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    # ==================== PRODUCER SIDE ====================
+
+    def enqueue(self, table: str, row: Dict, timeout: float = 0.05) -> bool:
+        """
+        Queue a row for bulk insert
+
+        Blocks for at most `timeout` seconds when the queue is full
+        (backpressure) and returns False if the row could not be queued.
+        """
+        if 'idempotency_key' not in row:
+            raise ValueError("row must carry an idempotency_key")
+
+        self._ensure_started()
+
+        try:
+            self._queue.put((table, row), timeout=timeout)
+        except queue.Full:
+            self._count(rejected=1)
+            return False
+
+        self._count(enqueued=1)
+        return True
+
+    def enqueue_many(self, items, timeout: float = 0.05) -> bool:
+        """
+        Queue (table, row) pairs, all or none
+
+        Waits at most `timeout` seconds in total for room for the whole
+        batch and returns False (nothing queued) if it did not free up.
+        """
+        items = list(items)
+        for _, row in items:
+            if 'idempotency_key' not in row:
+                raise ValueError("row must carry an idempotency_key")
+        if not items:
+            return True
+
+        self._ensure_started()
+        deadline = time.monotonic() + timeout
+
+        # queue.Queue has no bulk put: same protocol as Queue.put, for all rows at once
+        q = self._queue
+        with q.not_full:
+            while q.maxsize > 0 and q.maxsize - len(q.queue) < len(items):
+                remaining = deadline - time.monotonic()
+                if len(items) > q.maxsize or remaining <= 0:
+                    self._count(rejected=len(items))
+                    return False
+                q.not_full.wait(remaining)
+            q.queue.extend(items)
+            q.unfinished_tasks += len(items)
+            q.not_empty.notify()
+
+        self._count(enqueued=len(items))
+        return True
+
+    def pending(self) -> int:
+        """Number of rows waiting to be written"""
+        return self._queue.qsize()
+
+    # ==================== CONSUMER SIDE ====================
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='gaia-write-buffer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batches = self._collect(self.flush_interval)
+            if batches:
+                self._write(batches)
+
+    def _collect(self, wait: float) -> Dict[str, List[Dict]]:
+        """Drain up to batch_size rows, waiting at most `wait` seconds"""
+        batches: Dict[str, List[Dict]] = {}
+        count = 0
+        deadline = time.monotonic() + wait
+
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    table, row = self._queue.get(timeout=remaining)
+                else:
+                    table, row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batches.setdefault(table, []).append(row)
+            count += 1
+
+        return batches
+
+    def _write(self, batches: Dict[str, List[Dict]]):
+        for table, rows in batches.items():
+            attempt = 0
+            while True:
+                try:
+                    self.insert_fn(table, rows)
+                    self._count(written=len(rows), batches=1)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        self._count(failed=len(rows))
+                        print(f"❌ Dropping {len(rows)} rows for {table} after {self.max_retries} retries: {e}")
+                        break
+                    self._count(retries=1)
+                    delay = self.retry_base_delay * (2 ** (attempt - 1))
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        while True:
+            batches = self._collect(0)
+            if not batches:
+                return
+            self._write(batches)
+
+    def close(self, timeout: float = 10.0):
+        """Stop the background thread and flush remaining rows"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def register_shutdown_flush(self):
+        """Flush pending rows when the interpreter exits"""
+        atexit.register(self.close)
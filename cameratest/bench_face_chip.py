@@ -0,0 +1,123 @@
+"""
+Face chip benchmark
+Per-frame cost of the robust verification stages (quality check, LBP
+texture embedding and, when face_recognition is installed, the dlib
+encoding) with separate crops of the frame versus one shared
+landmark-aligned chip per frame.
+
+Frames are synthetic 1280x720 camera frames with a fixed face, or the
+images of --images (faces found with YuNet).
+
+Usage:
+    python bench_face_chip.py [--frames 300] [--images faces/]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from faceid_service import FaceIDService
+
+YUNET_MODEL = os.path.join(os.path.dirname(__file__), 'face_detection_yunet.onnx')
+
+
+def synthetic_frames(count, seed=3):
+    rng = np.random.default_rng(seed)
+    landmarks = {
+        'right_eye': (590, 300), 'left_eye': (690, 302), 'nose': (640, 360),
+        'right_mouth': (600, 420), 'left_mouth': (680, 421)
+    }
+    bbox = (540, 200, 200, 260)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8), (5, 5), 0)
+    for _ in range(count):
+        noise = rng.integers(-8, 8, base.shape, dtype=np.int16)
+        yield np.clip(base + noise, 0, 255).astype(np.uint8), bbox, landmarks
+
+
+def image_frames(root, count):
+    detector = cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320), 0.5, 0.3)
+    produced = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            frame = cv2.imread(os.path.join(dirpath, filename))
+            if frame is None:
+                continue
+            h, w = frame.shape[:2]
+            detector.setInputSize((w, h))
+            _, faces = detector.detect(frame)
+            if faces is None or len(faces) == 0:
+                continue
+            face = max(faces, key=lambda f: f[14])
+            landmarks = {
+                'right_eye': (int(face[4]), int(face[5])),
+                'left_eye': (int(face[6]), int(face[7])),
+                'nose': (int(face[8]), int(face[9])),
+                'right_mouth': (int(face[10]), int(face[11])),
+                'left_mouth': (int(face[12]), int(face[13]))
+            }
+            yield frame, tuple(int(v) for v in face[:4]), landmarks
+            produced += 1
+            if produced >= count:
+                return
+
+
+def run(frames, service):
+    lbp = service.backends['lbp']
+    dlib = service.backends['dlib'] if service.backends['dlib'].available() else None
+    legacy = {'quality': 0.0, 'lbp': 0.0, 'dlib': 0.0}
+    shared = {'chip': 0.0, 'quality': 0.0, 'lbp': 0.0, 'dlib': 0.0}
+
+    for seq, (frame, bbox, landmarks) in enumerate(frames, start=1):
+        # Each stage crops / converts / aligns the frame on its own
+        start = time.perf_counter()
+        service.check_image_quality(frame, bbox)
+        legacy['quality'] += time.perf_counter() - start
+        start = time.perf_counter()
+        lbp.extract(frame, bbox, landmarks)
+        legacy['lbp'] += time.perf_counter() - start
+        if dlib:
+            start = time.perf_counter()
+            dlib.extract(frame, bbox, landmarks)
+            legacy['dlib'] += time.perf_counter() - start
+
+        # One aligned chip per frame sequence number, shared by every stage
+        start = time.perf_counter()
+        chip = service.face_chip(frame, landmarks, seq)
+        shared['chip'] += time.perf_counter() - start
+        start = time.perf_counter()
+        service.check_image_quality(frame, bbox, landmarks, seq)
+        shared['quality'] += time.perf_counter() - start
+        start = time.perf_counter()
+        lbp.extract(frame, bbox, landmarks, chip=chip)
+        shared['lbp'] += time.perf_counter() - start
+        if dlib:
+            start = time.perf_counter()
+            dlib.extract(frame, bbox, landmarks, chip=chip)
+            shared['dlib'] += time.perf_counter() - start
+
+    count = seq
+    legacy_ms = sum(legacy.values()) / count * 1000
+    shared_ms = sum(shared.values()) / count * 1000
+    print(f"{count} frames{'' if dlib else ' (dlib not installed: quality + LBP only)'}")
+    print("  separate crops: " + " | ".join(
+        f"{name} {total / count * 1000:6.3f} ms" for name, total in legacy.items() if dlib or name != 'dlib'))
+    print("  shared chip:    " + " | ".join(
+        f"{name} {total / count * 1000:6.3f} ms" for name, total in shared.items() if dlib or name != 'dlib'))
+    print(f"  per frame: {legacy_ms:.3f} ms -> {shared_ms:.3f} ms "
+          f"(saves {legacy_ms - shared_ms:.3f} ms, {1 - shared_ms / legacy_ms:.0%})")
+    print(f"  chip cache: {service.chips.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Face chip benchmark')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--images', help='directory of face images instead of synthetic frames')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        service = FaceIDService(storage_path=os.path.join(directory, 'faceid_data.json'))
+        frames = image_frames(args.images, args.frames) if args.images else synthetic_frames(args.frames)
+        run(frames, service)
@@ -0,0 +1,164 @@
+"""
+FaceID embedding backend benchmark
+Latency and verification accuracy of each embedding backend on a local
+test set laid out as one directory per person:
+
+    faces/
+        alice/001.jpg 002.jpg ...
+        bob/001.jpg ...
+
+Faces are detected and aligned into a face chip once per image with YuNet
+(as the DMS does), then every backend embeds the same detections and chips. Genuine pairs are all same-person image
+pairs, impostor pairs are sampled to the same count (capped by --pairs).
+Accuracy, FAR and FRR are at each backend's default threshold; EER is the
+point where FAR == FRR over all thresholds.
+
+Usage:
+    python bench_faceid.py faces/ [--backends dlib,sface,lbp] [--pairs 5000]
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+from face_chip import align_face_chip
+from faceid_backends import create_backends
+
+YUNET_MODEL = os.path.join(os.path.dirname(__file__), 'face_detection_yunet.onnx')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def detect_faces(root):
+    """[(person, frame, bbox, landmarks, chip)] for the best YuNet face of every image"""
+    detector = cv2.FaceDetectorYN.create(YUNET_MODEL, "", (320, 320), 0.5, 0.3)
+    samples = []
+    skipped = 0
+    for person in sorted(os.listdir(root)):
+        directory = os.path.join(root, person)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            frame = cv2.imread(os.path.join(directory, filename))
+            if frame is None:
+                continue
+            h, w = frame.shape[:2]
+            detector.setInputSize((w, h))
+            _, faces = detector.detect(frame)
+            if faces is None or len(faces) == 0:
+                skipped += 1
+                continue
+            face = max(faces, key=lambda f: f[14])
+            bbox = tuple(int(v) for v in face[:4])
+            landmarks = {
+                'right_eye': (int(face[4]), int(face[5])),
+                'left_eye': (int(face[6]), int(face[7])),
+                'nose': (int(face[8]), int(face[9])),
+                'right_mouth': (int(face[10]), int(face[11])),
+                'left_mouth': (int(face[12]), int(face[13]))
+            }
+            samples.append((person, frame, bbox, landmarks, align_face_chip(frame, landmarks)))
+    print(f"{len(samples)} faces from {len({s[0] for s in samples})} people ({skipped} images without a face)")
+    return samples
+
+
+def make_pairs(samples, max_pairs, seed=7):
+    genuine = [(i, j) for i, j in itertools.combinations(range(len(samples)), 2)
+               if samples[i][0] == samples[j][0]]
+    rng = random.Random(seed)
+    rng.shuffle(genuine)
+    genuine = genuine[:max_pairs]
+
+    impostor = set()
+    attempts = 0
+    while len(impostor) < len(genuine) and attempts < 50 * max_pairs:
+        attempts += 1
+        i, j = sorted(rng.sample(range(len(samples)), 2))
+        if samples[i][0] != samples[j][0]:
+            impostor.add((i, j))
+    return genuine, sorted(impostor)
+
+
+def equal_error_rate(genuine_scores, impostor_scores):
+    """EER over all thresholds (scores: higher = more similar)"""
+    genuine_scores = np.asarray(genuine_scores)
+    impostor_scores = np.asarray(impostor_scores)
+    best = (1.0, None)
+    for threshold in np.unique(np.concatenate([genuine_scores, impostor_scores])):
+        far = np.mean(impostor_scores >= threshold)
+        frr = np.mean(genuine_scores < threshold)
+        gap = abs(far - frr)
+        if best[1] is None or gap < best[1]:
+            best = ((far + frr) / 2, gap)
+    return best[0]
+
+
+def _extract(backend, sample):
+    _, frame, bbox, landmarks, chip = sample
+    return backend.extract(frame, bbox, landmarks, chip=chip)
+
+
+def bench_backend(backend, samples, genuine, impostor):
+    embeddings = []
+    latencies = []
+    _extract(backend, samples[0])  # warm-up (model load)
+    for sample in samples:
+        start = time.perf_counter()
+        embeddings.append(_extract(backend, sample))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    failed = sum(1 for emb in embeddings if emb is None)
+    threshold = backend.default_threshold
+
+    def evaluate(pairs):
+        verified, scores = [], []
+        for i, j in pairs:
+            if embeddings[i] is None or embeddings[j] is None:
+                continue
+            result = backend.match(embeddings[i], embeddings[j], threshold)
+            verified.append(result['verified'])
+            scores.append(-result['distance'] if 'distance' in result else result['similarity'])
+        return np.array(verified, dtype=bool), scores
+
+    genuine_ok, genuine_scores = evaluate(genuine)
+    impostor_ok, impostor_scores = evaluate(impostor)
+    frr = 1 - genuine_ok.mean() if len(genuine_ok) else float('nan')
+    far = impostor_ok.mean() if len(impostor_ok) else float('nan')
+    total = len(genuine_ok) + len(impostor_ok)
+    accuracy = (genuine_ok.sum() + (~impostor_ok).sum()) / total if total else float('nan')
+    eer = equal_error_rate(genuine_scores, impostor_scores) if genuine_scores and impostor_scores else float('nan')
+
+    print(f"[{backend.name} v{backend.version}] threshold {threshold} ({backend.metric})")
+    print(f"  embed latency: mean {np.mean(latencies):7.2f} ms | p95 {np.percentile(latencies, 95):7.2f} ms"
+          f" | failed {failed}/{len(samples)}")
+    print(f"  {len(genuine_ok)} genuine / {len(impostor_ok)} impostor pairs: "
+          f"accuracy {accuracy:.2%} | FAR {far:.2%} | FRR {frr:.2%} | EER {eer:.2%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FaceID embedding backend benchmark')
+    parser.add_argument('dataset', help='directory with one sub-directory of images per person')
+    parser.add_argument('--backends', default='dlib,sface,lbp')
+    parser.add_argument('--pairs', type=int, default=5000, help='max genuine (and impostor) pairs')
+    parser.add_argument('--sface-model', help='path to face_recognition_sface_2021dec.onnx')
+    args = parser.parse_args()
+
+    samples = detect_faces(args.dataset)
+    if len(samples) < 2:
+        raise SystemExit("Need at least two detected faces")
+    genuine, impostor = make_pairs(samples, args.pairs)
+
+    backends = create_backends(args.sface_model)
+    for name in args.backends.split(','):
+        backend = backends.get(name.strip())
+        if backend is None:
+            print(f"[{name}] unknown backend")
+        elif not backend.available():
+            print(f"[{name}] skipped: not available (missing dependency or model)")
+        else:
+            bench_backend(backend, samples, genuine, impostor)
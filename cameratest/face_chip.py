@@ -0,0 +1,124 @@
+"""
+Landmark-aligned face chips
+One 150x150 face chip per frame, aligned with the 5 YuNet landmarks by a
+similarity transform, shared by the quality checks, the LBP texture
+embedding and the dlib encoder instead of each cropping, converting and
+resizing the frame on its own.
+
+The chip uses dlib's face chip framing (get_face_chip_details, size 150,
+padding 0.25), so dlib can encode it directly without running its shape
+predictor on the full frame.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+# dlib mean face (eye centers, nose tip, mouth corners of the 68-point model)
+# mapped into a 150x150 chip with 0.25 padding, in YuNet landmark order
+CHIP_TEMPLATE = np.array([
+    [47.55, 46.60],   # right_eye
+    [100.48, 46.60],  # left_eye
+    [74.01, 76.56],   # nose
+    [50.41, 103.02],  # right_mouth
+    [97.61, 103.02],  # left_mouth
+], dtype=np.float32)
+
+LANDMARK_ORDER = ('right_eye', 'left_eye', 'nose', 'right_mouth', 'left_mouth')
+
+
+class FaceChip:
+    """Aligned BGR chip with its grayscale (and, on demand, RGB) versions"""
+
+    def __init__(self, bgr):
+        self.bgr = bgr
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        self._rgb = None
+
+    @property
+    def face_gray(self):
+        """Grayscale chip without the padding (the face box dlib would detect)"""
+        size = self.gray.shape[0]
+        pad = int(round(size * CHIP_PADDING / (1 + 2 * CHIP_PADDING)))
+        return self.gray[pad:size - pad, pad:size - pad]
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = np.ascontiguousarray(self.bgr[:, :, ::-1])
+        return self._rgb
+
+
+def align_face_chip(frame_bgr, landmarks, size=CHIP_SIZE):
+    """
+    Warp the face described by YuNet landmarks into a size x size chip.
+    Returns a FaceChip, or None if the landmarks are missing or degenerate.
+    """
+    if frame_bgr is None or not landmarks:
+        return None
+    try:
+        points = np.array([landmarks[name] for name in LANDMARK_ORDER], dtype=np.float32)
+    except KeyError:
+        return None
+
+    template = CHIP_TEMPLATE * (size / CHIP_SIZE)
+    transform, _ = cv2.estimateAffinePartial2D(points, template, method=cv2.LMEDS)
+    if transform is None:
+        return None
+
+    chip = cv2.warpAffine(frame_bgr, transform, (size, size),
+                          flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return FaceChip(chip)
+
+
+class FaceChipCache:
+    """
+    Last few face chips, keyed by frame sequence number and landmarks
+    (a frame can be aligned on the landmarks of another detection).
+
+    Callers that have no sequence number share chips per frame object
+    (the entry keeps a reference to the frame and is only reused for that
+    same array). One face per frame: the driver.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._chips = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame_bgr, landmarks, frame_seq=None):
+        """Chip of frame_bgr (aligned on landmarks), computed once per frame"""
+        if frame_bgr is None or not landmarks:
+            return None
+
+        try:
+            digest = tuple(float(v) for name in LANDMARK_ORDER for v in landmarks[name])
+        except KeyError:
+            return None
+        key = ('seq', frame_seq, digest) if frame_seq is not None else ('frame', id(frame_bgr), digest)
+        with self._lock:
+            entry = self._chips.get(key)
+            if entry is not None and (frame_seq is not None or entry[0] is frame_bgr):
+                self._chips.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        chip = align_face_chip(frame_bgr, landmarks)
+        with self._lock:
+            # Keep the frame only when it is the key (identity check above)
+            self._chips[key] = (None if frame_seq is not None else frame_bgr, chip)
+            self._chips.move_to_end(key)
+            while len(self._chips) > self.maxsize:
+                self._chips.popitem(last=False)
+        return chip
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._chips), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,451 @@
+"""
+FaceID embedding backends
+Each backend turns a detected face (BGR frame + YuNet bbox and 5 landmarks)
+into a fixed-size embedding and knows how to compare two of them.
+Enrollments are stored per backend (see FaceIDService), so switching
+backend never compares vectors from different models.
+
+    name   version  dim   metric     model
+    dlib   v5       128   euclidean  face_recognition ResNet (dlib), aligned chip
+                                     (v3: dlib's own alignment, for builds that
+                                     cannot encode a pre-aligned chip)
+    sface  v4       128   cosine     OpenCV FaceRecognizerSF (ONNX, CPU)
+    lbp    v3       288   cosine     landmark geometry + LBP histogram
+                                     (32D geometry only without a frame = v1)
+
+Select with FACEID_BACKEND=dlib|sface|lbp. The SFace model is not bundled:
+download face_recognition_sface_2021dec.onnx from the OpenCV model zoo next
+to this file, or point FACEID_SFACE_MODEL at it.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from face_chip import CHIP_SIZE, LANDMARK_ORDER, align_face_chip
+
+# Try to import face_recognition (dlib-based deep learning)
+try:
+    import face_recognition
+    DLIB_AVAILABLE = True
+    print("[FaceID] ✓ face_recognition (dlib) loaded - deep learning embeddings available")
+except ImportError:
+    DLIB_AVAILABLE = False
+    print("[FaceID] ⚠ face_recognition not available")
+
+SFACE_MODEL_PATH = os.getenv('FACEID_SFACE_MODEL') or os.path.join(
+    os.path.dirname(__file__), 'face_recognition_sface_2021dec.onnx'
+)
+
+def cosine_similarity(emb1, emb2):
+    """Cosine similarity between two embeddings (0.0 if either is empty)"""
+    if emb1 is None or emb2 is None:
+        return 0.0
+    norm1 = np.linalg.norm(emb1)
+    norm2 = np.linalg.norm(emb2)
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return float(np.dot(emb1, emb2) / (norm1 * norm2))
+
+
+class EmbeddingBackend:
+    """
+    Base class for face embedding backends.
+
+    Subclasses set `name`, `version` (bumped whenever embeddings stop being
+    comparable with stored ones), `metric` and `default_threshold`, and
+    implement `extract`.
+    """
+    name = None
+    version = 0
+    metric = 'cosine'
+    default_threshold = 0.0
+
+    def available(self):
+        """True if the backend's dependencies / model are present"""
+        return True
+
+    def accepts(self, version):
+        """True if stored embeddings of this version are comparable with ours"""
+        return version == self.version
+
+    def extract(self, frame_bgr, bbox, landmarks=None, enrollment=False, chip=None):
+        """
+        Embedding of the face at bbox, or None if it cannot be computed.
+
+        Args:
+            frame_bgr: BGR image from OpenCV (may be None for geometry-only backends)
+            bbox: (x, y, w, h) from YuNet
+            landmarks: YuNet landmark dict (right_eye, left_eye, nose, right_mouth, left_mouth)
+            enrollment: True for enrollment samples (slower, higher quality settings)
+            chip: landmark-aligned face_chip.FaceChip of this frame, if any
+        """
+        raise NotImplementedError
+
+    def match(self, embedding, enrolled, threshold):
+        """Compare an embedding with an enrolled one -> verify() result fields"""
+        similarity = cosine_similarity(embedding, enrolled)
+        return {
+            'verified': bool(similarity >= threshold),
+            'similarity': float(similarity),
+            'threshold': float(threshold),
+        }
+
+
+class DlibBackend(EmbeddingBackend):
+    """
+    128D face_recognition (dlib ResNet) encodings, compared by euclidean
+    distance.
+
+    v5 encodes the 150x150 chip aligned on the YuNet landmarks (the shared
+    chip, or one aligned here from `landmarks`). dlib builds that cannot
+    encode a pre-aligned chip are detected once, before any template is
+    loaded, and stay on v3 for the whole process: dlib aligns the face
+    itself, in the YuNet bbox when valid or wherever its HOG detector finds
+    one. The two alignments give different vectors, so their templates are
+    never compared with each other.
+    """
+    name = 'dlib'
+    CHIP_VERSION = 5
+    FRAME_VERSION = 3
+    metric = 'euclidean'
+    default_threshold = 0.45  # Strict threshold for security (dlib recommends 0.6)
+
+    def __init__(self):
+        self._chip_encoding = None
+
+    def available(self):
+        return DLIB_AVAILABLE
+
+    @property
+    def chip_encoding(self):
+        """True if this dlib build encodes pre-aligned chips (checked once)"""
+        if self._chip_encoding is None:
+            self._chip_encoding = False
+            if DLIB_AVAILABLE:
+                try:
+                    face_recognition.api.face_encoder.compute_face_descriptor(
+                        np.zeros((CHIP_SIZE, CHIP_SIZE, 3), dtype=np.uint8), 1
+                    )
+                    self._chip_encoding = True
+                except (AttributeError, TypeError, RuntimeError) as e:
+                    print(f"[FaceID] dlib chip encoding unavailable ({e}), using dlib v{self.FRAME_VERSION}")
+        return self._chip_encoding
+
+    @property
+    def version(self):
+        return self.CHIP_VERSION if self.chip_encoding else self.FRAME_VERSION
+
+    def extract(self, frame_bgr, bbox, landmarks=None, enrollment=False, chip=None,
+                use_dlib_detection=False):
+        """
+        use_dlib_detection: diagnostics only, runs dlib's own detection and
+        alignment (v3 vectors, not comparable with v5 templates)
+        """
+        if not DLIB_AVAILABLE or frame_bgr is None:
+            return None
+
+        if self.chip_encoding and not use_dlib_detection:
+            if chip is None:
+                chip = align_face_chip(frame_bgr, landmarks)
+            if chip is None:
+                return None
+            try:
+                # The chip already has dlib's 150x150 framing: skip detection and shape prediction
+                descriptor = face_recognition.api.face_encoder.compute_face_descriptor(
+                    chip.rgb, 3 if enrollment else 1
+                )
+                return np.array(descriptor, dtype=np.float32)
+            except RuntimeError as e:
+                print(f"[FaceID] Error extracting dlib embedding: {e}")
+                return None
+
+        # Convert BGR to RGB (face_recognition uses RGB)
+        rgb_frame = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+        face_locations = None
+        min_size = 30 if enrollment else 20
+
+        # If bbox provided and not forcing dlib detection, use it
+        if bbox is not None and not use_dlib_detection:
+            x, y, w, h = [int(v) for v in bbox]  # Ensure native int
+            img_h, img_w = rgb_frame.shape[:2]
+            if x >= 0 and y >= 0 and w > min_size and h > min_size and x + w <= img_w and y + h <= img_h:
+                # face_recognition uses (top, right, bottom, left) format
+                face_locations = [(y, x + w, y + h, x)]
+
+        # If no valid bbox or forcing dlib detection, use dlib's HOG detector
+        if face_locations is None:
+            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+
+        if not face_locations:
+            return None
+
+        try:
+            # Real-time: 1 jitter + 5-point model; enrollment: 3 jitters + 68-point model
+            encodings = face_recognition.face_encodings(
+                rgb_frame,
+                known_face_locations=face_locations,
+                num_jitters=3 if enrollment else 1,
+                model="large" if enrollment else "small"
+            )
+            if encodings:
+                return np.array(encodings[0], dtype=np.float32)
+        except Exception as e:
+            print(f"[FaceID] Error extracting dlib embedding: {e}")
+
+        return None
+
+    def match(self, embedding, enrolled, threshold):
+        # Euclidean distance (lower = better match)
+        distance = float(np.linalg.norm(embedding - enrolled))
+        return {
+            'verified': bool(distance <= threshold),
+            # Convert distance to similarity-like score (0-1, higher = better)
+            'similarity': float(max(0.0, 1.0 - distance)),
+            'distance': distance,
+            'threshold': float(threshold),
+        }
+
+
+class SFaceBackend(EmbeddingBackend):
+    """
+    128D OpenCV FaceRecognizerSF (SFace, ONNX) features.
+
+    The face is aligned with the YuNet 5 landmarks by alignCrop, so no second
+    detector runs. Features are L2-normalized; 0.363 is the cosine threshold
+    published with the model. The network is loaded on first use and shared,
+    inference is serialized (cv2.dnn nets are not safe to run concurrently).
+    """
+    name = 'sface'
+    version = 4
+    metric = 'cosine'
+    default_threshold = 0.363
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or SFACE_MODEL_PATH
+        self._recognizer = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return hasattr(cv2, 'FaceRecognizerSF') and os.path.exists(self.model_path)
+
+    def _face_row(self, bbox, landmarks):
+        """YuNet detection row (x, y, w, h, 5 x landmark, score) for alignCrop"""
+        row = [float(v) for v in bbox[:4]]
+        for name in LANDMARK_ORDER:
+            row.extend(float(v) for v in landmarks[name])
+        row.append(1.0)
+        return np.array(row, dtype=np.float32)
+
+    def extract(self, frame_bgr, bbox, landmarks=None, enrollment=False, chip=None):
+        # alignCrop uses SFace's own 112x112 framing, not the shared chip
+        if frame_bgr is None or bbox is None or not landmarks:
+            return None
+
+        try:
+            with self._lock:
+                if self._recognizer is None:
+                    self._recognizer = cv2.FaceRecognizerSF.create(self.model_path, "")
+                aligned = self._recognizer.alignCrop(frame_bgr, self._face_row(bbox, landmarks))
+                feature = self._recognizer.feature(aligned).reshape(-1).astype(np.float32)
+        except (cv2.error, KeyError) as e:
+            print(f"[FaceID] Error extracting SFace embedding: {e}")
+            return None
+
+        norm = np.linalg.norm(feature)
+        return feature / norm if norm > 0 else None
+
+
+class LBPBackend(EmbeddingBackend):
+    """
+    32D landmark geometry + 256D LBP texture histogram (288D), no model
+    needed. Without a frame only the geometry is available (32D, v1).
+    v3 takes the texture from the aligned face chip (v2 used a padded bbox
+    crop, so v2 templates are not comparable).
+    """
+    name = 'lbp'
+    version = 3
+    metric = 'cosine'
+    default_threshold = 0.90
+
+    def accepts(self, version):
+        # v1 (geometry only) is what extract returns without a frame
+        return version in (1, 3)
+
+    def _lbp_histogram(self, gray):
+        """
+        Compute a simple 8-neighbor LBP histogram (256 bins), normalized.
+        This is lightweight and helps discriminate identities better than
+        pure geometric landmark ratios.
+        """
+        if gray is None or gray.size == 0:
+            return None
+
+        img = gray.astype(np.uint8)
+        if img.shape[0] < 3 or img.shape[1] < 3:
+            return None
+
+        c = img[1:-1, 1:-1]
+        lbp = (
+            ((img[:-2, :-2] >= c).astype(np.uint8) << 7) |
+            ((img[:-2, 1:-1] >= c).astype(np.uint8) << 6) |
+            ((img[:-2, 2:] >= c).astype(np.uint8) << 5) |
+            ((img[1:-1, 2:] >= c).astype(np.uint8) << 4) |
+            ((img[2:, 2:] >= c).astype(np.uint8) << 3) |
+            ((img[2:, 1:-1] >= c).astype(np.uint8) << 2) |
+            ((img[2:, :-2] >= c).astype(np.uint8) << 1) |
+            ((img[1:-1, :-2] >= c).astype(np.uint8) << 0)
+        )
+
+        hist = np.bincount(lbp.reshape(-1), minlength=256).astype(np.float32)
+        hist /= (hist.sum() + 1e-6)
+        return hist
+
+    def _extract_texture_embedding(self, frame_bgr, bbox, chip=None):
+        """LBP histogram embedding (256D) of the aligned chip, or of a padded bbox crop."""
+        if chip is not None:
+            gray = cv2.resize(chip.gray, (96, 96), interpolation=cv2.INTER_AREA)
+            return self._lbp_histogram(cv2.equalizeHist(gray))
+
+        if frame_bgr is None or bbox is None:
+            return None
+        x, y, fw, fh = bbox
+        if fw <= 0 or fh <= 0:
+            return None
+
+        h, w = frame_bgr.shape[:2]
+        pad_x = int(fw * 0.20)
+        pad_y = int(fh * 0.25)
+        x0 = max(0, x - pad_x)
+        y0 = max(0, y - pad_y)
+        x1 = min(w, x + fw + pad_x)
+        y1 = min(h, y + fh + pad_y)
+        crop = frame_bgr[y0:y1, x0:x1]
+        if crop.size < 1000:
+            return None
+
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, (96, 96), interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(gray)
+        return self._lbp_histogram(gray)
+
+    def extract(self, frame_bgr, bbox, landmarks=None, enrollment=False, chip=None):
+        if not landmarks or not bbox:
+            return None
+
+        x, y, fw, fh = bbox
+
+        # Get landmark points
+        points = {name: np.array(landmarks[name]) for name in LANDMARK_ORDER}
+
+        # Normalize points to face bounding box (0-1 range)
+        normalized = {}
+        for name, pt in points.items():
+            normalized[name] = np.array([
+                (pt[0] - x) / fw if fw > 0 else 0,
+                (pt[1] - y) / fh if fh > 0 else 0
+            ])
+
+        # Build embedding from geometric features
+        embedding = []
+
+        # 1. Normalized landmark positions (10 values)
+        for name in LANDMARK_ORDER:
+            embedding.extend(normalized[name].tolist())
+
+        # 2. Inter-eye distance
+        eye_dist = np.linalg.norm(points['left_eye'] - points['right_eye']) / fw
+        embedding.append(eye_dist)
+
+        # 3. Eye-nose distances
+        nose_to_left = np.linalg.norm(points['nose'] - points['left_eye']) / fw
+        nose_to_right = np.linalg.norm(points['nose'] - points['right_eye']) / fw
+        embedding.extend([nose_to_left, nose_to_right])
+
+        # 4. Mouth width
+        mouth_width = np.linalg.norm(points['left_mouth'] - points['right_mouth']) / fw
+        embedding.append(mouth_width)
+
+        # 5. Nose to mouth distance
+        mouth_center = (points['left_mouth'] + points['right_mouth']) / 2
+        nose_to_mouth = np.linalg.norm(mouth_center - points['nose']) / fh
+        embedding.append(nose_to_mouth)
+
+        # 6. Eye line angle
+        eye_vector = points['left_eye'] - points['right_eye']
+        eye_angle = np.arctan2(eye_vector[1], eye_vector[0])
+        embedding.append(eye_angle)
+
+        # 7. Nose position relative to eye line
+        eye_center = (points['left_eye'] + points['right_eye']) / 2
+        nose_offset = (points['nose'] - eye_center) / np.array([fw, fh])
+        embedding.extend(nose_offset.tolist())
+
+        # 8. Mouth center position relative to nose
+        mouth_offset = (mouth_center - points['nose']) / np.array([fw, fh])
+        embedding.extend(mouth_offset.tolist())
+
+        # 9. Face aspect ratio
+        aspect_ratio = fw / fh if fh > 0 else 1
+        embedding.append(aspect_ratio)
+
+        # 10. Additional geometric ratios
+        # Eye to nose to mouth ratios
+        eye_to_nose = np.linalg.norm(eye_center - points['nose'])
+        nose_to_mouth_dist = np.linalg.norm(points['nose'] - mouth_center)
+        ratio = eye_to_nose / (nose_to_mouth_dist + 0.001)
+        embedding.append(ratio)
+
+        # 11. Face symmetry features
+        left_face = np.linalg.norm(points['left_eye'] - points['left_mouth'])
+        right_face = np.linalg.norm(points['right_eye'] - points['right_mouth'])
+        symmetry = left_face / (right_face + 0.001)
+        embedding.append(symmetry)
+
+        # Pad to 32 dimensions for consistency
+        while len(embedding) < 32:
+            embedding.append(0)
+
+        geo = np.array(embedding[:32], dtype=np.float32)
+
+        # Optional texture embedding (LBP histogram)
+        tex = self._extract_texture_embedding(frame_bgr, bbox, chip) if frame_bgr is not None else None
+        if tex is None:
+            # v1 fallback
+            norm = np.linalg.norm(geo)
+            if norm > 0:
+                geo = geo / norm
+            return geo
+
+        combined = np.concatenate([geo, tex], axis=0).astype(np.float32)
+
+        # Normalize to unit vector
+        norm = np.linalg.norm(combined)
+        if norm > 0:
+            combined = combined / norm
+        return combined
+
+
+def create_backends(sface_model_path=None):
+    """All backends by name, in default preference order (dlib, sface, lbp)"""
+    backends = [DlibBackend(), SFaceBackend(sface_model_path), LBPBackend()]
+    return {backend.name: backend for backend in backends}
+
+
+def select_backend(backends, name=None):
+    """
+    Backend to verify with: `name` (or FACEID_BACKEND) if available,
+    otherwise the first available in preference order.
+    """
+    name = name or os.getenv('FACEID_BACKEND')
+    if name:
+        backend = backends.get(name)
+        if backend is not None and backend.available():
+            return backend
+        print(f"[FaceID] ⚠ Embedding backend '{name}' not available, using default")
+    for backend in backends.values():
+        if backend.available():
+            return backend
+    return backends['lbp']
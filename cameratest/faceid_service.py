@@ -1,63 +1,99 @@
 """
 FaceID Service - Face Recognition for Driver Verification
-Uses dlib's deep learning face recognition (via face_recognition library).
-Provides 99.38% accuracy on LFW benchmark with 128D embeddings.
+Embeddings come from a pluggable backend (see faceid_backends.py): dlib's
+deep learning model (via face_recognition, 99.38% on LFW), OpenCV's SFace
+ONNX recognizer (CPU only, no dlib needed) or, as a last resort, LBP
+texture + landmark geometry. Each driver keeps one template per backend.
 """
 import cv2
 import numpy as np
 import json
 import os
-from collections import deque
 import threading
 
-# Try to import face_recognition (dlib-based deep learning)
-try:
-    import face_recognition
-    DLIB_AVAILABLE = True
-    print("[FaceID] ✓ face_recognition (dlib) loaded - using deep learning embeddings")
-except ImportError:
-    DLIB_AVAILABLE = False
-    print("[FaceID] ⚠ face_recognition not available - falling back to LBP embeddings")
+from face_chip import FaceChipCache
+from faceid_backends import DLIB_AVAILABLE, create_backends, select_backend
+
+# Backend of enrollments saved before templates were stored per backend
+LEGACY_BACKENDS = {1: 'lbp', 2: 'lbp', 3: 'dlib'}
 
 
 class FaceIDService:
     """
-    Face recognition using dlib's deep learning model (via face_recognition library).
-    Uses 128D face encodings from a ResNet trained on millions of faces.
-    Achieves 99.38% accuracy on Labeled Faces in the Wild benchmark.
-    Falls back to LBP if face_recognition is not available.
+    Face recognition for driver verification.
+    Verification uses one embedding backend (FACEID_BACKEND, or the best
+    available: dlib, then SFace, then LBP) and falls back to LBP when it
+    cannot embed a frame. Enrollment stores a template for every available
+    backend, so switching backend does not require re-enrolling.
     """
     
-    def __init__(self, storage_path=None):
+    def __init__(self, storage_path=None, backend=None, sface_model_path=None):
         self.storage_path = storage_path or os.path.join(
             os.path.dirname(__file__), 'faceid_data.json'
         )
-        self.enrolled_drivers = {}  # driver_id -> embedding (np.ndarray)
+        self.backends = create_backends(sface_model_path)
+        self.backend = select_backend(self.backends, backend)
         
-        # Use dlib's recommended threshold (distance-based)
-        # 0.6 is typical, 0.5 is stricter (less false positives)
-        # We use distance, not similarity: lower = more similar
-        self.distance_threshold = 0.45  # Strict threshold for security
+        # Per-backend thresholds:
+        # dlib uses distance (lower = more similar), 0.6 is typical, 0.45 is strict
+        # sface / lbp use cosine similarity (higher = more similar)
+        self.thresholds = {name: b.default_threshold for name, b in self.backends.items()}
         
-        # Legacy threshold for v2 embeddings (cosine similarity)
-        self.recognition_threshold = 0.90
+        self.enrolled_drivers = {}  # driver_id -> {backend name: embedding (np.ndarray)}
+        self.outdated_templates = {}  # driver_id -> {backend name: stored entry}, kept on save
         
         self.enrollment_samples = 5  # Number of samples needed for enrollment
-        self.temp_embeddings = []  # Temporary storage during enrollment
+        self.temp_embeddings = {}  # backend name -> samples, during enrollment
         self.lock = threading.Lock()
         
+        # Landmark-aligned face chips, shared by quality checks and embeddings
+        self.chips = FaceChipCache()
+        
         # Embedding versions:
         # v1: 32D geometric only (obsolete)
-        # v2: 288D geometric + LBP (obsolete)
-        # v3: 128D dlib deep learning (current)
-        self.embedding_version = 3 if DLIB_AVAILABLE else 2
+        # v2: 288D geometric + LBP of a bbox crop (obsolete)
+        # v3: 288D geometric + LBP of the aligned chip (lbp backend)
+        # v3: 128D dlib deep learning, dlib's own alignment (dlib builds without chip encoding)
+        # v4: 128D SFace ONNX (sface backend)
+        # v5: 128D dlib deep learning of the aligned chip (dlib backend)
         self.embedding_dim_v3 = 128
         self.embedding_dim_v2 = 288
         self.embedding_dim_v1 = 32
+        print(f"[FaceID] Using {self.backend.name} embeddings (v{self.backend.version})")
         
         # Load existing enrollments
         self._load_enrollments()
     
+    @property
+    def embedding_version(self):
+        """Version of the embeddings produced by the active backend"""
+        return self.backend.version
+    
+    @property
+    def distance_threshold(self):
+        """dlib euclidean distance threshold"""
+        return self.thresholds['dlib']
+    
+    @distance_threshold.setter
+    def distance_threshold(self, value):
+        self.thresholds['dlib'] = value
+    
+    @property
+    def recognition_threshold(self):
+        """Cosine similarity threshold of legacy (LBP) embeddings"""
+        return self.thresholds['lbp']
+    
+    @recognition_threshold.setter
+    def recognition_threshold(self, value):
+        self.thresholds['lbp'] = value
+    
+    def similarity_threshold(self, backend=None):
+        """Cosine similarity threshold applied to verify_single_embedding scores"""
+        backend = backend or self.backend
+        if backend.metric == 'cosine':
+            return self.thresholds[backend.name]
+        return self.recognition_threshold
+    
     def _load_enrollments(self):
         """Load enrolled drivers from storage"""
         try:
@@ -65,150 +101,78 @@ class FaceIDService:
                 with open(self.storage_path, 'r') as f:
                     data = json.load(f)
                     enrolled = {}
+                    outdated = {}
                     for driver_id, payload in (data or {}).items():
                         # Backward compatible formats:
                         # - v1: { "driver": [..32 floats..] }
-                        # - v2: { "driver": { "v": 2, "emb": [..288 floats..] } }
+                        # - v2/v3: { "driver": { "v": 3, "emb": [..128 floats..] } }
+                        # - per backend: { "driver": { "dlib": { "v": 3, "emb": [..] }, "sface": {..} } }
                         if isinstance(payload, dict) and "emb" in payload:
-                            emb = np.array(payload["emb"], dtype=np.float32)
+                            entries = {LEGACY_BACKENDS.get(payload.get("v"), 'lbp'): payload}
+                        elif isinstance(payload, dict):
+                            entries = payload
                         else:
-                            emb = np.array(payload, dtype=np.float32)
-                        enrolled[driver_id] = emb
+                            entries = {'lbp': {"v": 1, "emb": payload}}
+                        
+                        templates = {}
+                        for name, entry in entries.items():
+                            backend = self.backends.get(name)
+                            if backend is None or not backend.accepts(entry.get("v")):
+                                # Kept as stored (another build may still use it) until re-enrollment
+                                current = f" v{backend.version}" if backend is not None else ""
+                                print(f"[FaceID] Ignoring {name} v{entry.get('v')} template of {driver_id}: "
+                                      f"re-enroll for {name}{current}")
+                                outdated.setdefault(driver_id, {})[name] = entry
+                                continue
+                            templates[name] = np.array(entry["emb"], dtype=np.float32)
+                        enrolled[driver_id] = templates
                     self.enrolled_drivers = enrolled
+                    self.outdated_templates = outdated
                 print(f"[FaceID] Loaded {len(self.enrolled_drivers)} enrolled drivers")
         except Exception as e:
             print(f"[FaceID] Error loading enrollments: {e}")
             self.enrolled_drivers = {}
+            self.outdated_templates = {}
     
     def _save_enrollments(self):
         """Save enrolled drivers to storage"""
         try:
-            # Always save in v2 format (keeps backward compatibility in loader)
+            # One versioned template per backend (the loader still reads older formats)
             data = {}
-            for driver_id, emb in self.enrolled_drivers.items():
+            for driver_id, templates in self.enrolled_drivers.items():
                 data[driver_id] = {
-                    "v": int(self.embedding_version),
-                    "emb": np.asarray(emb, dtype=np.float32).tolist(),
+                    name: entry for name, entry in self.outdated_templates.get(driver_id, {}).items()
+                    if name not in templates
                 }
+                data[driver_id].update({
+                    name: {
+                        "v": int(self.backends[name].version),
+                        "emb": np.asarray(emb, dtype=np.float32).tolist(),
+                    }
+                    for name, emb in templates.items()
+                })
             with open(self.storage_path, 'w') as f:
                 json.dump(data, f)
             print(f"[FaceID] Saved {len(self.enrolled_drivers)} enrollments")
         except Exception as e:
             print(f"[FaceID] Error saving enrollments: {e}")
     
-    def _lbp_histogram(self, gray):
-        """
-        Compute a simple 8-neighbor LBP histogram (256 bins), normalized.
-        This is lightweight and helps discriminate identities better than
-        pure geometric landmark ratios.
-        """
-        if gray is None or gray.size == 0:
-            return None
-
-        img = gray.astype(np.uint8)
-        if img.shape[0] < 3 or img.shape[1] < 3:
-            return None
-
-        c = img[1:-1, 1:-1]
-        lbp = (
-            ((img[:-2, :-2] >= c).astype(np.uint8) << 7) |
-            ((img[:-2, 1:-1] >= c).astype(np.uint8) << 6) |
-            ((img[:-2, 2:] >= c).astype(np.uint8) << 5) |
-            ((img[1:-1, 2:] >= c).astype(np.uint8) << 4) |
-            ((img[2:, 2:] >= c).astype(np.uint8) << 3) |
-            ((img[2:, 1:-1] >= c).astype(np.uint8) << 2) |
-            ((img[2:, :-2] >= c).astype(np.uint8) << 1) |
-            ((img[1:-1, :-2] >= c).astype(np.uint8) << 0)
-        )
-
-        hist = np.bincount(lbp.reshape(-1), minlength=256).astype(np.float32)
-        hist /= (hist.sum() + 1e-6)
-        return hist
-
-    def _extract_texture_embedding(self, frame_bgr, bbox):
-        """Crop face ROI and compute LBP histogram embedding (256D)."""
-        if frame_bgr is None or bbox is None:
-            return None
-        x, y, fw, fh = bbox
-        if fw <= 0 or fh <= 0:
-            return None
-
-        h, w = frame_bgr.shape[:2]
-        pad_x = int(fw * 0.20)
-        pad_y = int(fh * 0.25)
-        x0 = max(0, x - pad_x)
-        y0 = max(0, y - pad_y)
-        x1 = min(w, x + fw + pad_x)
-        y1 = min(h, y + fh + pad_y)
-        crop = frame_bgr[y0:y1, x0:x1]
-        if crop.size < 1000:
-            return None
-
-        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-        gray = cv2.resize(gray, (96, 96), interpolation=cv2.INTER_AREA)
-        gray = cv2.equalizeHist(gray)
-        return self._lbp_histogram(gray)
-
-    def extract_embedding_dlib(self, frame_bgr, bbox=None, use_dlib_detection=False):
+    def extract_embedding_dlib(self, frame_bgr, bbox=None, use_dlib_detection=False, landmarks=None):
         """
         Extract 128D face embedding using dlib's deep learning model.
-        This is the most accurate method (99.38% on LFW benchmark).
         
         Args:
             frame_bgr: BGR image from OpenCV
             bbox: Optional (x, y, w, h) bounding box to focus on specific face
-            use_dlib_detection: If True, always use dlib's own face detection (more accurate)
+            use_dlib_detection: If True, always use dlib's own face detection
+                (v3 alignment, diagnostics only)
+            landmarks: YuNet landmarks the chip is aligned on (needed by dlib v5)
             
         Returns:
             128D numpy array or None if no face found
         """
-        if not DLIB_AVAILABLE:
-            return None
-            
-        if frame_bgr is None:
-            return None
-        
-        # Convert BGR to RGB (face_recognition uses RGB)
-        rgb_frame = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        
-        face_locations = None
-        
-        # If bbox provided and not forcing dlib detection, use it
-        if bbox is not None and not use_dlib_detection:
-            x, y, w, h = [int(v) for v in bbox]  # Ensure native int
-            # Validate bbox
-            img_h, img_w = rgb_frame.shape[:2]
-            if x >= 0 and y >= 0 and w > 20 and h > 20 and x + w <= img_w and y + h <= img_h:
-                # face_recognition uses (top, right, bottom, left) format
-                face_locations = [(y, x + w, y + h, x)]
-        
-        # If no valid bbox or forcing dlib detection, use dlib's HOG detector
-        if face_locations is None:
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-            # Only log if detection was needed (no bbox provided)
-            # if face_locations:
-            #     print(f"[FaceID] dlib HOG detected {len(face_locations)} face(s)")
-            
-        if not face_locations:
-            return None
-        
-        # Get encoding for the first face (or the one specified by bbox)
-        try:
-            # FAST settings for real-time verification
-            # num_jitters=1 is fastest, model="small" is faster
-            encodings = face_recognition.face_encodings(
-                rgb_frame, 
-                known_face_locations=face_locations,
-                num_jitters=1,   # Fast for real-time
-                model="small"    # Faster model for verification
-            )
-            
-            if encodings:
-                return np.array(encodings[0], dtype=np.float32)
-        except Exception as e:
-            print(f"[FaceID] Error extracting dlib embedding: {e}")
-            
-        return None
+        return self.backends['dlib'].extract(frame_bgr, bbox, landmarks,
+                                             use_dlib_detection=use_dlib_detection)
 
     def face_distance(self, emb1, emb2):
         """
@@ -220,124 +184,35 @@ class FaceIDService:
             return float('inf')
         return np.linalg.norm(emb1 - emb2)
 
-    def extract_embedding(self, landmarks, bbox, frame_shape, frame_bgr=None):
+    def face_chip(self, frame_bgr, landmarks, frame_seq=None):
         """
-        Extract a face embedding.
-        v3: 128D dlib deep learning (preferred if available)
-        v2: 32D geometric + 256D texture embedding (LBP) = 288D (fallback)
-        v1: 32D geometric only (obsolete)
+        150x150 landmark-aligned chip of the face, computed once per frame
+        (per frame_seq, or per frame array when no sequence number is given).
         """
-        # Try dlib deep learning first (v3 - most accurate)
-        if DLIB_AVAILABLE and frame_bgr is not None:
-            dlib_emb = self.extract_embedding_dlib(frame_bgr, bbox)
-            if dlib_emb is not None:
-                return dlib_emb
-        
-        # Fallback to v2 geometric + LBP
-        if not landmarks or not bbox:
-            return None
-        
-        h, w = frame_shape[:2]
-        x, y, fw, fh = bbox
-        
-        # Get landmark points
-        points = {
-            'right_eye': np.array(landmarks['right_eye']),
-            'left_eye': np.array(landmarks['left_eye']),
-            'nose': np.array(landmarks['nose']),
-            'right_mouth': np.array(landmarks['right_mouth']),
-            'left_mouth': np.array(landmarks['left_mouth'])
-        }
-        
-        # Calculate center of face
-        center = np.array([x + fw/2, y + fh/2])
-        
-        # Normalize points to face bounding box (0-1 range)
-        normalized = {}
-        for name, pt in points.items():
-            normalized[name] = np.array([
-                (pt[0] - x) / fw if fw > 0 else 0,
-                (pt[1] - y) / fh if fh > 0 else 0
-            ])
-        
-        # Build embedding from geometric features
-        embedding = []
-        
-        # 1. Normalized landmark positions (10 values)
-        for name in ['right_eye', 'left_eye', 'nose', 'right_mouth', 'left_mouth']:
-            embedding.extend(normalized[name].tolist())
-        
-        # 2. Inter-eye distance
-        eye_dist = np.linalg.norm(points['left_eye'] - points['right_eye']) / fw
-        embedding.append(eye_dist)
-        
-        # 3. Eye-nose distances
-        nose_to_left = np.linalg.norm(points['nose'] - points['left_eye']) / fw
-        nose_to_right = np.linalg.norm(points['nose'] - points['right_eye']) / fw
-        embedding.extend([nose_to_left, nose_to_right])
-        
-        # 4. Mouth width
-        mouth_width = np.linalg.norm(points['left_mouth'] - points['right_mouth']) / fw
-        embedding.append(mouth_width)
-        
-        # 5. Nose to mouth distance
-        mouth_center = (points['left_mouth'] + points['right_mouth']) / 2
-        nose_to_mouth = np.linalg.norm(mouth_center - points['nose']) / fh
-        embedding.append(nose_to_mouth)
-        
-        # 6. Eye line angle
-        eye_vector = points['left_eye'] - points['right_eye']
-        eye_angle = np.arctan2(eye_vector[1], eye_vector[0])
-        embedding.append(eye_angle)
-        
-        # 7. Nose position relative to eye line
-        eye_center = (points['left_eye'] + points['right_eye']) / 2
-        nose_offset = (points['nose'] - eye_center) / np.array([fw, fh])
-        embedding.extend(nose_offset.tolist())
-        
-        # 8. Mouth center position relative to nose
-        mouth_offset = (mouth_center - points['nose']) / np.array([fw, fh])
-        embedding.extend(mouth_offset.tolist())
-        
-        # 9. Face aspect ratio
-        aspect_ratio = fw / fh if fh > 0 else 1
-        embedding.append(aspect_ratio)
-        
-        # 10. Additional geometric ratios
-        # Eye to nose to mouth ratios
-        eye_to_nose = np.linalg.norm(eye_center - points['nose'])
-        nose_to_mouth_dist = np.linalg.norm(points['nose'] - mouth_center)
-        ratio = eye_to_nose / (nose_to_mouth_dist + 0.001)
-        embedding.append(ratio)
-        
-        # 11. Face symmetry features
-        left_face = np.linalg.norm(points['left_eye'] - points['left_mouth'])
-        right_face = np.linalg.norm(points['right_eye'] - points['right_mouth'])
-        symmetry = left_face / (right_face + 0.001)
-        embedding.append(symmetry)
-        
-        # Pad to 32 dimensions for consistency
-        while len(embedding) < 32:
-            embedding.append(0)
-        
-        geo = np.array(embedding[:32], dtype=np.float32)
+        return self.chips.get(frame_bgr, landmarks, frame_seq)
 
-        # Optional texture embedding (LBP histogram)
-        tex = self._extract_texture_embedding(frame_bgr, bbox) if frame_bgr is not None else None
-        if tex is None:
-            # v1 fallback
-            norm = np.linalg.norm(geo)
-            if norm > 0:
-                geo = geo / norm
-            return geo
-
-        combined = np.concatenate([geo, tex], axis=0).astype(np.float32)
+    def embed(self, landmarks, bbox, frame_shape, frame_bgr=None, frame_seq=None):
+        """
+        Embed a face with the active backend, falling back to LBP.
+        Returns (backend, embedding); embedding is None if no backend could.
+        """
+        chip = self.face_chip(frame_bgr, landmarks, frame_seq)
+        if self.backend.name != 'lbp':
+            embedding = self.backend.extract(frame_bgr, bbox, landmarks, chip=chip)
+            if embedding is not None:
+                return self.backend, embedding
+        
+        lbp = self.backends['lbp']
+        return lbp, lbp.extract(frame_bgr, bbox, landmarks, chip=chip)
 
-        # Normalize to unit vector
-        norm = np.linalg.norm(combined)
-        if norm > 0:
-            combined = combined / norm
-        return combined
+    def extract_embedding(self, landmarks, bbox, frame_shape, frame_bgr=None, frame_seq=None):
+        """
+        Extract a face embedding with the active backend (see embed).
+        v4: 128D SFace / v3: 128D dlib deep learning
+        lbp v3: 32D geometric + 256D texture embedding (LBP) = 288D (fallback)
+        v1: 32D geometric only (no frame)
+        """
+        return self.embed(landmarks, bbox, frame_shape, frame_bgr=frame_bgr, frame_seq=frame_seq)[1]
     
     def cosine_similarity(self, emb1, emb2):
         """Calculate cosine similarity between two embeddings"""
@@ -353,72 +228,36 @@ class FaceIDService:
         
         return dot / (norm1 * norm2)
     
-    def extract_embedding_for_enrollment(self, frame_bgr, bbox=None):
-        """
-        Extract embedding with higher quality settings for enrollment.
-        Uses more jitters for better accuracy.
-        """
-        if not DLIB_AVAILABLE or frame_bgr is None:
-            return None
-        
-        rgb_frame = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        
-        face_locations = None
-        if bbox is not None:
-            x, y, w, h = [int(v) for v in bbox]
-            img_h, img_w = rgb_frame.shape[:2]
-            if x >= 0 and y >= 0 and w > 30 and h > 30 and x + w <= img_w and y + h <= img_h:
-                face_locations = [(y, x + w, y + h, x)]
-        
-        if face_locations is None:
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-        
-        if not face_locations:
-            return None
-        
-        try:
-            # Higher quality for enrollment (but not too slow)
-            encodings = face_recognition.face_encodings(
-                rgb_frame,
-                known_face_locations=face_locations,
-                num_jitters=3,  # Good quality for enrollment
-                model="large"   # Accurate model for enrollment
-            )
-            
-            if encodings:
-                print(f"[FaceID] ✓ Enrollment embedding extracted (high quality)")
-                return np.array(encodings[0], dtype=np.float32)
-        except Exception as e:
-            print(f"[FaceID] Error in enrollment embedding: {e}")
-        
-        return None
-    
     def start_enrollment(self):
         """Start the enrollment process"""
         with self.lock:
-            self.temp_embeddings = []
+            self.temp_embeddings = {}
         print("[FaceID] Starting enrollment...")
         return {'status': 'started', 'samples_needed': self.enrollment_samples}
     
-    def add_enrollment_sample(self, landmarks, bbox, frame_shape, frame_bgr=None):
-        """Add a face sample during enrollment"""
-        # Use high-quality extraction for enrollment
-        if DLIB_AVAILABLE and frame_bgr is not None:
-            embedding = self.extract_embedding_for_enrollment(frame_bgr, bbox)
-        else:
-            embedding = self.extract_embedding(landmarks, bbox, frame_shape, frame_bgr=frame_bgr)
-        
-        if embedding is None:
+    def add_enrollment_sample(self, landmarks, bbox, frame_shape, frame_bgr=None, frame_seq=None):
+        """Add a face sample during enrollment (one embedding per available backend)"""
+        # High-quality extraction for enrollment
+        chip = self.face_chip(frame_bgr, landmarks, frame_seq)
+        samples = {}
+        for name, backend in self.backends.items():
+            if backend.available():
+                embedding = backend.extract(frame_bgr, bbox, landmarks, enrollment=True, chip=chip)
+                if embedding is not None:
+                    samples[name] = embedding
+        
+        if self.backend.name not in samples:
             return {
                 'status': 'error',
                 'message': 'Could not extract face features',
-                'samples_collected': len(self.temp_embeddings),
+                'samples_collected': len(self.temp_embeddings.get(self.backend.name, [])),
                 'samples_needed': self.enrollment_samples
             }
         
         with self.lock:
-            self.temp_embeddings.append(embedding)
-            collected = len(self.temp_embeddings)
+            for name, embedding in samples.items():
+                self.temp_embeddings.setdefault(name, []).append(embedding)
+            collected = len(self.temp_embeddings[self.backend.name])
             print(f"[FaceID] Enrollment sample {collected}/{self.enrollment_samples} added")
         
         return {
@@ -431,44 +270,61 @@ class FaceIDService:
     def complete_enrollment(self, driver_id):
         """Complete enrollment and save the driver"""
         with self.lock:
-            if len(self.temp_embeddings) < self.enrollment_samples:
+            collected = len(self.temp_embeddings.get(self.backend.name, []))
+            if collected < self.enrollment_samples:
                 return {
                     'status': 'error',
-                    'message': f'Need {self.enrollment_samples} samples, got {len(self.temp_embeddings)}'
+                    'message': f'Need {self.enrollment_samples} samples, got {collected}'
                 }
             
-            # Average the embeddings for stability
-            avg_embedding = np.mean(self.temp_embeddings, axis=0)
-            
-            # Normalize
-            norm = np.linalg.norm(avg_embedding)
-            if norm > 0:
-                avg_embedding = avg_embedding / norm
+            templates = {}
+            for name, samples in self.temp_embeddings.items():
+                # Skip backends that missed some samples
+                if len(samples) < self.enrollment_samples:
+                    continue
+                
+                # Average the embeddings for stability
+                avg_embedding = np.mean(samples, axis=0)
+                
+                # Normalize
+                norm = np.linalg.norm(avg_embedding)
+                if norm > 0:
+                    avg_embedding = avg_embedding / norm
+                templates[name] = avg_embedding
             
-            self.enrolled_drivers[driver_id] = avg_embedding
-            self.temp_embeddings = []
+            self.enrolled_drivers[driver_id] = templates
+            self.temp_embeddings = {}
             
             self._save_enrollments()
         
         return {
             'status': 'success',
             'driver_id': driver_id,
+            'backends': sorted(templates),
             'message': 'Driver enrolled successfully'
         }
     
     def cancel_enrollment(self):
         """Cancel ongoing enrollment"""
         with self.lock:
-            self.temp_embeddings = []
+            self.temp_embeddings = {}
         return {'status': 'cancelled'}
     
-    def verify(self, landmarks, bbox, frame_shape, driver_id=None, frame_bgr=None):
+    def _template(self, driver_id, backend, embedding):
+        """Enrolled embedding of driver_id comparable with embedding, or None"""
+        enrolled_emb = self.enrolled_drivers[driver_id].get(backend.name)
+        if enrolled_emb is None or enrolled_emb.shape[0] != getattr(embedding, "shape", (0,))[0]:
+            return None
+        return enrolled_emb
+    
+    def verify(self, landmarks, bbox, frame_shape, driver_id=None, frame_bgr=None, frame_seq=None):
         """
         Verify a face against enrolled drivers.
         If driver_id is provided, verify against specific driver.
         Otherwise, try to identify against all enrolled drivers.
         """
-        embedding = self.extract_embedding(landmarks, bbox, frame_shape, frame_bgr=frame_bgr)
+        backend, embedding = self.embed(landmarks, bbox, frame_shape, frame_bgr=frame_bgr,
+                                        frame_seq=frame_seq)
         
         if embedding is None:
             return {
@@ -477,6 +333,8 @@ class FaceIDService:
                 'message': 'Could not extract face features'
             }
         
+        threshold = self.thresholds[backend.name]
+        
         with self.lock:
             if not self.enrolled_drivers:
                 return {
@@ -494,103 +352,63 @@ class FaceIDService:
                         'message': f'Driver {driver_id} not enrolled'
                     }
                 
-                enrolled_emb = self.enrolled_drivers[driver_id]
-                emb_dim = getattr(embedding, "shape", (0,))[0]
-                enrolled_dim = getattr(enrolled_emb, "shape", (0,))[0]
-                
-                if enrolled_dim != emb_dim:
+                enrolled_emb = self._template(driver_id, backend, embedding)
+                if enrolled_emb is None:
                     return {
                         'status': 'error',
                         'verified': False,
-                        'message': 'Driver enrolled with an older FaceID model. Please re-enroll.',
+                        'message': f'Driver not enrolled with the current FaceID model ({backend.name}). Please re-enroll.',
                         'driver_id': driver_id
                     }
                 
-                # Use distance for v3 (128D dlib), similarity for v2
-                is_v3 = (emb_dim == self.embedding_dim_v3)
-                
-                if is_v3:
-                    # Euclidean distance (lower = better match)
-                    distance = self.face_distance(embedding, enrolled_emb)
-                    verified = bool(distance <= self.distance_threshold)
-                    # Convert distance to similarity-like score (0-1, higher = better)
-                    similarity = max(0, 1 - distance)
-                    return {
-                        'status': 'success',
-                        'verified': verified,
-                        'similarity': float(similarity),
-                        'distance': float(distance),
-                        'threshold': float(self.distance_threshold),
-                        'driver_id': driver_id,
-                        'embedding_version': 3
-                    }
-                else:
-                    # Cosine similarity for legacy embeddings
-                    similarity = self.cosine_similarity(embedding, enrolled_emb)
-                    return {
-                        'status': 'success',
-                        'verified': bool(similarity >= self.recognition_threshold),
-                        'similarity': float(similarity),
-                        'threshold': float(self.recognition_threshold),
-                        'driver_id': driver_id,
-                        'embedding_version': 2
-                    }
+                return {
+                    'status': 'success',
+                    **backend.match(embedding, enrolled_emb, threshold),
+                    'driver_id': driver_id,
+                    'embedding_version': backend.version,
+                    'backend': backend.name
+                }
             else:
                 # Identify against all enrolled drivers
                 best_match = None
-                best_distance = float('inf')
-                best_similarity = 0
-                is_v3 = (getattr(embedding, "shape", (0,))[0] == self.embedding_dim_v3)
+                best_result = None
+                best_score = float('-inf')
                 
-                for did, enrolled_emb in self.enrolled_drivers.items():
-                    enrolled_dim = getattr(enrolled_emb, "shape", (0,))[0]
-                    emb_dim = getattr(embedding, "shape", (0,))[0]
-                    
-                    if enrolled_dim != emb_dim:
+                for did in self.enrolled_drivers:
+                    enrolled_emb = self._template(did, backend, embedding)
+                    if enrolled_emb is None:
                         # Skip incompatible embeddings
                         continue
                     
-                    if is_v3:
-                        distance = self.face_distance(embedding, enrolled_emb)
-                        if distance < best_distance:
-                            best_distance = distance
-                            best_match = did
-                    else:
-                        similarity = self.cosine_similarity(embedding, enrolled_emb)
-                        if similarity > best_similarity:
-                            best_similarity = similarity
-                            best_match = did
+                    result = backend.match(embedding, enrolled_emb, threshold)
+                    # Rank by raw distance when there is one (similarity is clamped)
+                    score = -result['distance'] if 'distance' in result else result['similarity']
+                    if score > best_score:
+                        best_score = score
+                        best_result = result
+                        best_match = did
                 
-                if is_v3:
-                    verified = bool(best_distance <= self.distance_threshold)
-                    similarity_score = max(0, 1 - best_distance)
-                    return {
-                        'status': 'success',
-                        'verified': verified,
-                        'similarity': float(similarity_score),
-                        'distance': float(best_distance),
-                        'threshold': float(self.distance_threshold),
-                        'driver_id': best_match if verified else None,
-                        'message': 'Driver recognized' if verified else 'Driver not recognized',
-                        'embedding_version': 3
-                    }
-                else:
-                    verified = bool(best_similarity >= self.recognition_threshold)
-                    return {
-                        'status': 'success',
-                        'verified': verified,
-                        'similarity': float(best_similarity),
-                        'threshold': float(self.recognition_threshold),
-                        'driver_id': best_match if verified else None,
-                        'message': 'Driver recognized' if verified else 'Driver not recognized',
-                        'embedding_version': 2
-                    }
+                if best_result is None:
+                    best_result = {'verified': False, 'similarity': 0.0, 'threshold': float(threshold)}
+                    if backend.metric == 'euclidean':
+                        best_result['distance'] = float('inf')
+                
+                verified = best_result['verified']
+                return {
+                    'status': 'success',
+                    **best_result,
+                    'driver_id': best_match if verified else None,
+                    'message': 'Driver recognized' if verified else 'Driver not recognized',
+                    'embedding_version': backend.version,
+                    'backend': backend.name
+                }
     
     def delete_driver(self, driver_id):
         """Delete an enrolled driver"""
         with self.lock:
             if driver_id in self.enrolled_drivers:
                 del self.enrolled_drivers[driver_id]
+                self.outdated_templates.pop(driver_id, None)
                 self._save_enrollments()
                 return {'status': 'success', 'message': f'Driver {driver_id} deleted'}
             return {'status': 'error', 'message': f'Driver {driver_id} not found'}
@@ -610,9 +428,11 @@ class FaceIDService:
         self.recognition_threshold = max(0.5, min(0.95, threshold))
         return {'threshold': float(self.recognition_threshold)}
     
-    def check_image_quality(self, frame_bgr, bbox):
+    def check_image_quality(self, frame_bgr, bbox, landmarks=None, frame_seq=None):
         """
         Check if the face image has good quality for recognition.
+        Brightness, contrast and blur are measured on the aligned face chip
+        when landmarks are given, on the bbox crop otherwise.
         Returns (is_good, quality_score, issues)
         """
         if frame_bgr is None or bbox is None:
@@ -636,17 +456,21 @@ class FaceIDService:
             score -= 15
         
         # Extract face region
-        x0 = max(0, x)
-        y0 = max(0, y)
-        x1 = min(w, x + fw)
-        y1 = min(h, y + fh)
-        face_crop = frame_bgr[y0:y1, x0:x1]
-        
-        if face_crop.size < 100:
-            return False, 0, ['invalid_crop']
+        chip = self.face_chip(frame_bgr, landmarks, frame_seq)
+        if chip is not None:
+            gray = chip.face_gray
+        else:
+            x0 = max(0, x)
+            y0 = max(0, y)
+            x1 = min(w, x + fw)
+            y1 = min(h, y + fh)
+            face_crop = frame_bgr[y0:y1, x0:x1]
+            
+            if face_crop.size < 100:
+                return False, 0, ['invalid_crop']
+            gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
         
         # Check brightness
-        gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
         brightness = np.mean(gray)
         if brightness < 40:
             issues.append('too_dark')
@@ -673,18 +497,19 @@ class FaceIDService:
         
         return is_good, score, issues
     
-    def verify_single_embedding(self, embedding, driver_id=None):
-        """Verify a single embedding against enrolled drivers."""
+    def verify_single_embedding(self, embedding, driver_id=None, backend=None):
+        """Verify a single embedding (from `backend`, default active) against enrolled drivers."""
         if embedding is None:
             return None, 0, None
+        backend = backend or self.backend
         
         with self.lock:
             if not self.enrolled_drivers:
                 return None, 0, None
             
             if driver_id and driver_id in self.enrolled_drivers:
-                enrolled_emb = self.enrolled_drivers[driver_id]
-                if getattr(enrolled_emb, "shape", (0,))[0] != getattr(embedding, "shape", (0,))[0]:
+                enrolled_emb = self._template(driver_id, backend, embedding)
+                if enrolled_emb is None:
                     return None, 0, None
                 similarity = self.cosine_similarity(embedding, enrolled_emb)
                 return driver_id, similarity, None
@@ -693,8 +518,9 @@ class FaceIDService:
                 best_similarity = 0
                 all_similarities = {}
                 
-                for did, enrolled_emb in self.enrolled_drivers.items():
-                    if getattr(enrolled_emb, "shape", (0,))[0] != getattr(embedding, "shape", (0,))[0]:
+                for did in self.enrolled_drivers:
+                    enrolled_emb = self._template(did, backend, embedding)
+                    if enrolled_emb is None:
                         continue
                     similarity = self.cosine_similarity(embedding, enrolled_emb)
                     all_similarities[did] = similarity
@@ -735,9 +561,10 @@ class RobustVerification:
             'min_good_frames': self.min_good_frames
         }
     
-    def add_frame(self, landmarks, bbox, frame_shape, frame_bgr, driver_id=None):
+    def add_frame(self, landmarks, bbox, frame_shape, frame_bgr, driver_id=None, frame_seq=None):
         """
         Add a frame to the verification session.
+        The quality check and the embedding share one aligned face chip.
         Returns progress and intermediate results.
         """
         with self.lock:
@@ -750,7 +577,7 @@ class RobustVerification:
             current_frame = len(self.results) + 1
         
         # Check image quality
-        is_good, quality_score, issues = self.faceid.check_image_quality(frame_bgr, bbox)
+        is_good, quality_score, issues = self.faceid.check_image_quality(frame_bgr, bbox, landmarks, frame_seq)
         
         result = {
             'frame': current_frame,
@@ -761,9 +588,10 @@ class RobustVerification:
         
         if is_good:
             # Extract embedding and verify
-            embedding = self.faceid.extract_embedding(landmarks, bbox, frame_shape, frame_bgr=frame_bgr)
+            backend, embedding = self.faceid.embed(landmarks, bbox, frame_shape, frame_bgr=frame_bgr,
+                                                   frame_seq=frame_seq)
             if embedding is not None:
-                match_id, similarity, all_sims = self.faceid.verify_single_embedding(embedding, driver_id)
+                match_id, similarity, all_sims = self.faceid.verify_single_embedding(embedding, driver_id, backend)
                 result['embedding_ok'] = True
                 result['similarity'] = float(similarity) if similarity else 0
                 result['matched_driver'] = match_id
@@ -825,7 +653,7 @@ class RobustVerification:
                         'verified': True,
                         'driver_id': r['matched_driver'],
                         'similarity': float(r['similarity']),
-                        'threshold': float(self.faceid.recognition_threshold),
+                        'threshold': float(self.faceid.similarity_threshold()),
                         'consistency': 1.0,
                         'frames_analyzed': len(self.results),
                         'good_frames': 1,
@@ -879,7 +707,7 @@ class RobustVerification:
                 consistency = matching_frames / len(good_results)
             
             # Final decision - more permissive with high similarity
-            threshold = self.faceid.recognition_threshold
+            threshold = self.faceid.similarity_threshold()
             
             # Accept if:
             # - High similarity (>= 95%) with at least 2 good frames
@@ -40,6 +40,7 @@ def after_request(response):
 # Global variables
 camera = None
 output_frame = None
+output_frame_seq = 0  # Camera frame sequence number of output_frame (keys FaceID face chips)
 lock = threading.Lock()
 metrics = {}
 
@@ -306,7 +307,7 @@ class DMSProcessor:
         # Last known good pose (for when face is temporarily lost)
         self.last_pose = {'pitch': 0, 'yaw': 0, 'roll': 0}
         
-    def process(self, frame):
+    def process(self, frame, frame_seq=None):
         global metrics, faceid_service
         h, w = frame.shape[:2]
         
@@ -344,7 +345,8 @@ class DMSProcessor:
             if self.faceid_enabled and self.frame_count % self.faceid_verify_interval == 0:
                 if self.face_stabilizer.is_stable():
                     bbox_tuple = (x, y, fw, fh)
-                    result = faceid_service.verify(landmarks, bbox_tuple, frame.shape, driver_id=None, frame_bgr=frame)
+                    result = faceid_service.verify(landmarks, bbox_tuple, frame.shape, driver_id=None,
+                                                   frame_bgr=frame, frame_seq=frame_seq)
                     
                     if result['status'] == 'success':
                         self.driver_recognized = result['verified']
@@ -506,8 +508,9 @@ def init_camera():
 
 
 def process_frames():
-    global output_frame, camera, dms_processor
+    global output_frame, output_frame_seq, camera, dms_processor
     
+    frame_seq = 0
     while True:
         if camera is None:
             time.sleep(0.1)
@@ -518,12 +521,14 @@ def process_frames():
             continue
         
         frame = cv2.flip(frame, 1)
+        frame_seq += 1
         
         if dms_processor:
-            frame, _ = dms_processor.process(frame)
+            frame, _ = dms_processor.process(frame, frame_seq)
         
         with lock:
             output_frame = frame.copy()
+            output_frame_seq = frame_seq
 
 
 def generate_frames():
@@ -646,6 +651,7 @@ def faceid_enroll_sample():
         if output_frame is None:
             return jsonify({'status': 'error', 'message': 'No camera frame available'})
         frame = output_frame.copy()
+        frame_seq = output_frame_seq
     
     # Detect face in current frame
     if dms_processor:
@@ -655,7 +661,8 @@ def faceid_enroll_sample():
             bbox = tuple(face['bbox'].tolist())
             landmarks = face['landmarks']
             
-            result = faceid_service.add_enrollment_sample(landmarks, bbox, frame.shape, frame_bgr=frame)
+            result = faceid_service.add_enrollment_sample(landmarks, bbox, frame.shape, frame_bgr=frame,
+                                                          frame_seq=frame_seq)
             return jsonify(result)
     
     return jsonify({
@@ -693,6 +700,7 @@ def faceid_verify():
         if output_frame is None:
             return jsonify({'status': 'error', 'verified': False, 'message': 'No camera frame'})
         frame = output_frame.copy()
+        frame_seq = output_frame_seq
     
     if dms_processor:
         faces = dms_processor.face_detector.detect(frame)
@@ -701,7 +709,8 @@ def faceid_verify():
             bbox = tuple(face['bbox'].tolist())
             landmarks = face['landmarks']
             
-            result = faceid_service.verify(landmarks, bbox, frame.shape, driver_id, frame_bgr=frame)
+            result = faceid_service.verify(landmarks, bbox, frame.shape, driver_id, frame_bgr=frame,
+                                           frame_seq=frame_seq)
             return jsonify(result)
     
     return jsonify({
@@ -765,6 +774,7 @@ def faceid_robust_frame():
                 'message': 'No camera frame available'
             })
         frame = output_frame.copy()
+        frame_seq = output_frame_seq
     
     if dms_processor:
         faces = dms_processor.face_detector.detect(frame)
@@ -774,7 +784,7 @@ def faceid_robust_frame():
             landmarks = face['landmarks']
             
             result = robust_verifier.add_frame(
-                landmarks, bbox, frame.shape, frame, driver_id
+                landmarks, bbox, frame.shape, frame, driver_id, frame_seq=frame_seq
             )
             return jsonify(result)
     
@@ -827,6 +837,7 @@ def faceid_robust_auto():
             if output_frame is None:
                 continue
             frame = output_frame.copy()
+            frame_seq = output_frame_seq
         
         if dms_processor:
             faces = dms_processor.face_detector.detect(frame)
@@ -836,7 +847,7 @@ def faceid_robust_auto():
                 landmarks = face['landmarks']
                 
                 progress = robust_verifier.add_frame(
-                    landmarks, bbox, frame.shape, frame, driver_id
+                    landmarks, bbox, frame.shape, frame, driver_id, frame_seq=frame_seq
                 )
                 
                 frames_captured = progress.get('frames_captured', 0)
@@ -867,6 +878,7 @@ def faceid_debug():
     
     results = {
         'dlib_available': DLIB_OK,
+        'embedding_backend': faceid_service.backend.name,
         'yunet_detection': None,
         'dlib_detection': None,
         'embedding_extraction': None,
@@ -898,20 +910,20 @@ def faceid_debug():
         bbox = tuple(yunet_faces[0]['bbox'])
         landmarks = yunet_faces[0]['landmarks']
         
-        # Try with YuNet bbox
-        emb_yunet = faceid_service.extract_embedding_dlib(frame, bbox)
+        # Try with YuNet bbox and landmarks
+        emb_yunet = faceid_service.extract_embedding_dlib(frame, bbox, landmarks=landmarks)
         results['embedding_extraction'] = {
             'with_yunet_bbox': emb_yunet is not None,
             'embedding_dim': len(emb_yunet) if emb_yunet is not None else 0
         }
         
         # Try with dlib detection only
-        emb_dlib = faceid_service.extract_embedding_dlib(frame, bbox=None)
+        emb_dlib = faceid_service.extract_embedding_dlib(frame, bbox=None, use_dlib_detection=True)
         results['embedding_extraction']['with_dlib_detection'] = emb_dlib is not None
         
     elif dlib_locs:
         # Use dlib detection
-        emb_dlib = faceid_service.extract_embedding_dlib(frame, bbox=None)
+        emb_dlib = faceid_service.extract_embedding_dlib(frame, bbox=None, use_dlib_detection=True)
         results['embedding_extraction'] = {
             'with_yunet_bbox': False,
             'with_dlib_detection': emb_dlib is not None,